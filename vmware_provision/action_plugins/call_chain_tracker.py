@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Action Plugin: Call Chain Tracker
+
+Controller-side call chain tracking for the call_stack_manager role. Each
+frame is appended to a per-session JSON-lines log in O(1); only the stack of
+open frames (bounded by the maximum stack depth) is kept in a small state
+file. Tasks receive a compact handle (session id + frame id) as a fact and
+the full chain is rebuilt from the log on demand for reports.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import datetime
+import fcntl
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+
+
+def _utc_now() -> str:
+    """Current UTC time in the ISO 8601 format used by the roles"""
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class CallChainLog:
+    """Append-only call chain log for one session"""
+
+    def __init__(self, log_dir: str, session_id: str):
+        """Initialize the log paths for a session"""
+        self.log_dir = log_dir
+        self.session_id = session_id
+        safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', session_id)
+        self.log_path = os.path.join(log_dir, "call_chain_%s.jsonl" % safe_id)
+        self.state_path = os.path.join(log_dir, "call_chain_%s.state.json" % safe_id)
+
+    @contextmanager
+    def _locked(self):
+        """Serialize writers of the same session"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(self.state_path + ".lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_state(self) -> Optional[Dict[str, Any]]:
+        """Read the open-frame state, None when the session is new"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_state(self, state: Dict[str, Any]) -> None:
+        """Atomically replace the open-frame state"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.log_dir, prefix=".call_chain_")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        """Append one record to the session log"""
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, separators=(',', ':'), default=str) + "\n")
+
+    def _ensure_session(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the session state, writing the session header on first use"""
+        state = self._read_state()
+        if state is None:
+            state = {"session_id": self.session_id, "next_frame": 0, "stack": [], "status": "initialized"}
+            self._append({"event": "session", "session_id": self.session_id,
+                          "timestamp": _utc_now(), "time": time.time(), "context": context})
+        return state
+
+    def start(self, component: str, max_depth: int, context: Dict[str, Any],
+              metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Open a frame for a component as a child of the innermost open frame"""
+        with self._locked():
+            state = self._ensure_session(context)
+            stack = state["stack"]
+            depth = len(stack)
+            if depth >= max_depth:
+                raise AnsibleActionFail(
+                    "Call stack depth exceeded maximum allowed depth of %d" % max_depth)
+            frame = {
+                "event": "start",
+                "frame_id": state["next_frame"],
+                "parent_id": stack[-1][0] if stack else None,
+                "depth": depth,
+                "component": component,
+                "timestamp": _utc_now(),
+                "time": time.time(),
+                "metadata": metadata,
+            }
+            self._append(frame)
+            stack.append([frame["frame_id"], component])
+            state["next_frame"] += 1
+            state["status"] = "active"
+            self._write_state(state)
+        return {"frame": frame, "depth": len(stack), "frames_recorded": state["next_frame"]}
+
+    def end(self, frame_id: Optional[int], component: Optional[str], status: str) -> Dict[str, Any]:
+        """Close an open frame, by id or by the innermost frame of a component"""
+        with self._locked():
+            state = self._read_state()
+            if state is None:
+                raise AnsibleActionFail("Unknown call chain session %s" % self.session_id)
+            stack = state["stack"]
+            if frame_id is None:
+                candidates = [entry for entry in stack if component is None or entry[1] == component]
+                frame_id = candidates[-1][0] if candidates else None
+            open_ids = [entry[0] for entry in stack]
+            if frame_id is not None and frame_id in open_ids:
+                del stack[open_ids.index(frame_id)]
+                self._append({"event": "end", "frame_id": frame_id, "status": status,
+                              "timestamp": _utc_now(), "time": time.time()})
+            if status == "error":
+                state["status"] = "error"
+            self._write_state(state)
+        return {"frame_id": frame_id, "depth": len(stack), "frames_recorded": state["next_frame"]}
+
+    def _records(self):
+        """Iterate the session log"""
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (IOError, OSError):
+            return
+
+    def finalize(self, status: str) -> Dict[str, Any]:
+        """Close every open frame and mark the session finished"""
+        with self._locked():
+            state = self._read_state()
+            if state is None:
+                raise AnsibleActionFail("Unknown call chain session %s" % self.session_id)
+            now, timestamp = time.time(), _utc_now()
+            for frame_id, _ in reversed(state["stack"]):
+                self._append({"event": "end", "frame_id": frame_id, "status": status,
+                              "timestamp": timestamp, "time": now})
+            self._append({"event": "finalize", "status": status, "timestamp": timestamp, "time": now})
+            state["stack"] = []
+            state["status"] = status
+            self._write_state(state)
+        return {"frame_id": None, "depth": 0, "frames_recorded": state["next_frame"]}
+
+    def build_report(self, max_depth: int) -> Dict[str, Any]:
+        """Rebuild the full call chain from the log in one pass"""
+        state = self._read_state() or {"stack": [], "status": "unknown"}
+        report = {
+            "session_id": self.session_id,
+            "start_time": None,
+            "end_time": None,
+            "deployment_context": {},
+            "call_chain": [],
+            "current_depth": len(state["stack"]),
+            "max_depth": max_depth,
+            "status": state["status"],
+        }
+        frames = report["call_chain"]
+        for record in self._records():
+            event = record["event"]
+            if event == "session":
+                report["start_time"] = record["timestamp"]
+                report["deployment_context"] = record.get("context", {})
+            elif event == "start":
+                frame = {key: value for key, value in record.items() if key != "event"}
+                frame.update(status="started", children=[])
+                frames.append(frame)
+                if frame["parent_id"] is not None:
+                    frames[frame["parent_id"]]["children"].append(frame["frame_id"])
+            elif event == "end":
+                frame = frames[record["frame_id"]]
+                frame["status"] = record["status"]
+                frame["end_time"] = record["timestamp"]
+                frame["duration"] = round(record["time"] - frame["time"], 6)
+            elif event == "finalize":
+                report["end_time"] = record["timestamp"]
+        return report
+
+
+class ActionModule(ActionBase):
+    """Record call chain frames on the controller"""
+
+    TRANSFERS_FILES = False
+    _requires_connection = False
+
+    argument_spec = dict(
+        operation=dict(type='str', default='start',
+                       choices=['start', 'end', 'finalize', 'report']),
+        session_id=dict(type='str', required=True),
+        component=dict(type='str'),
+        frame_id=dict(type='int'),
+        status=dict(type='str', default='completed'),
+        log_dir=dict(type='str', default='/tmp/ansible_call_chain'),
+        max_depth=dict(type='int', default=10),
+        context=dict(type='dict', default={}),
+        metadata=dict(type='dict', default={}),
+        dest=dict(type='path'),
+    )
+
+    def run(self, tmp=None, task_vars=None):
+        """Execute the requested tracker operation"""
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        _, args = self.validate_argument_spec(argument_spec=self.argument_spec)
+        log = CallChainLog(args['log_dir'], args['session_id'])
+        operation = args['operation']
+
+        if operation == 'start':
+            if not args['component']:
+                raise AnsibleActionFail("component is required when operation is start")
+            outcome = log.start(args['component'], args['max_depth'], args['context'], args['metadata'])
+            frame = outcome["frame"]
+            frame_id = frame["frame_id"]
+            result['changed'] = True
+            result['ansible_facts'] = {
+                'call_stack_handle': {'session_id': args['session_id'], 'frame_id': frame_id},
+                'call_chain_id': "%s_%d_%s" % (args['session_id'], outcome["depth"], args['component']),
+                'call_stack_depth': outcome["depth"],
+            }
+            result['parent_id'] = frame["parent_id"]
+        elif operation == 'end':
+            outcome = log.end(args['frame_id'], args['component'], args['status'])
+            result['changed'] = outcome["frame_id"] is not None
+            result['ansible_facts'] = {'call_stack_depth': outcome["depth"]}
+        elif operation == 'finalize':
+            outcome = log.finalize(args['status'])
+            result['changed'] = True
+            result['ansible_facts'] = {'call_stack_depth': 0}
+        else:
+            outcome = {"depth": None, "frames_recorded": None}
+
+        if operation in ('finalize', 'report'):
+            report = log.build_report(args['max_depth'])
+            outcome["frames_recorded"] = len(report["call_chain"])
+            if args['dest']:
+                os.makedirs(os.path.dirname(args['dest']) or '.', exist_ok=True)
+                with open(args['dest'], 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2, default=str)
+                result['dest'] = args['dest']
+            else:
+                result['report'] = report
+
+        result['session_id'] = args['session_id']
+        result['log_path'] = log.log_path
+        result['frames_recorded'] = outcome["frames_recorded"]
+        return result
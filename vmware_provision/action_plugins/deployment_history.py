@@ -0,0 +1,565 @@
+# -*- coding: utf-8 -*-
+"""
+Action Plugin: Deployment History
+
+Controller-side SQLite history of deployments. status_tracking records each
+deployment with its step timings, retry_manager operations and errors in one
+transaction; output_manager records the size and validation status of every
+component output. Fleet questions (recent failures per environment, slowest
+steps, retry hot spots, error messages) are indexed queries instead of a
+glob over report files. Compaction rolls deployments older than the
+retention period into per-day totals and deletes their detail rows.
+
+tools/history_query.py runs the same queries from the command line.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import datetime
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+
+SCHEMA_VERSION = 1
+DEFAULT_DB_PATH = '/tmp/ansible_history/deployments.db'
+DEFAULT_LIMIT = 50
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS deployments (
+    id INTEGER PRIMARY KEY,
+    deployment_key TEXT NOT NULL UNIQUE,
+    vm_name TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    location TEXT NOT NULL,
+    os_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    succeeded INTEGER NOT NULL,
+    started_at REAL,
+    finished_at REAL NOT NULL,
+    duration_seconds REAL,
+    retry_count INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    job_id TEXT,
+    artifact_path TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS deployments_env_finished ON deployments (environment, finished_at);
+CREATE INDEX IF NOT EXISTS deployments_failed_finished ON deployments (succeeded, finished_at);
+CREATE INDEX IF NOT EXISTS deployments_vm_finished ON deployments (vm_name, finished_at);
+CREATE INDEX IF NOT EXISTS deployments_finished ON deployments (finished_at);
+
+CREATE TABLE IF NOT EXISTS steps (
+    deployment_id INTEGER NOT NULL REFERENCES deployments (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    duration_seconds REAL,
+    PRIMARY KEY (deployment_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS retries (
+    deployment_id INTEGER NOT NULL REFERENCES deployments (id) ON DELETE CASCADE,
+    operation TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    duration_seconds REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS retries_deployment ON retries (deployment_id);
+
+CREATE TABLE IF NOT EXISTS errors (
+    deployment_id INTEGER NOT NULL REFERENCES deployments (id) ON DELETE CASCADE,
+    step TEXT,
+    occurred_at REAL NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS errors_deployment ON errors (deployment_id);
+CREATE INDEX IF NOT EXISTS errors_occurred ON errors (occurred_at);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    component TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    validation_status TEXT NOT NULL,
+    environment TEXT,
+    location TEXT,
+    os_type TEXT
+);
+CREATE INDEX IF NOT EXISTS outputs_component_recorded ON outputs (component, recorded_at);
+CREATE INDEX IF NOT EXISTS outputs_recorded ON outputs (recorded_at);
+
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    day TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    location TEXT NOT NULL,
+    os_type TEXT NOT NULL,
+    succeeded INTEGER NOT NULL,
+    deployments INTEGER NOT NULL,
+    total_duration_seconds REAL NOT NULL,
+    max_duration_seconds REAL,
+    retries INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    PRIMARY KEY (day, environment, location, os_type, succeeded)
+);
+'''
+
+# Filters accepted by the queries: name -> (SQL column, comparison)
+DEPLOYMENT_FILTERS = {
+    'environment': ('d.environment', '='),
+    'location': ('d.location', '='),
+    'os_type': ('d.os_type', '='),
+    'vm_name': ('d.vm_name', '='),
+    'status': ('d.status', '='),
+    'since': ('d.finished_at', '>='),
+    'until': ('d.finished_at', '<'),
+}
+
+QUERIES = ('recent', 'failures', 'summary', 'steps', 'retries', 'errors', 'deployment', 'outputs')
+
+_RELATIVE_TIME = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*$')
+_UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def to_epoch(value: Any, now: Optional[float] = None) -> Optional[float]:
+    """Epoch seconds of an ISO 8601 timestamp, epoch number or relative age such as '7d'"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    match = _RELATIVE_TIME.match(text)
+    if match:
+        return (now if now is not None else time.time()) - float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError("Unrecognized time '%s' (use ISO 8601, epoch seconds or an age like 7d)" % value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def to_iso(epoch: Optional[float]) -> Optional[str]:
+    """ISO 8601 UTC timestamp in the format used by the roles"""
+    if epoch is None:
+        return None
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class HistoryStore:
+    """SQLite deployment history shared by concurrent playbook runs"""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        """Open (and create or migrate) the database"""
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        # WAL lets queries run while another run writes; writers wait up to timeout
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version < SCHEMA_VERSION:
+            # executescript manages its own transaction; every statement is idempotent
+            self.connection.executescript('BEGIN IMMEDIATE;\n%s\nPRAGMA user_version=%d;\nCOMMIT;'
+                                          % (SCHEMA, SCHEMA_VERSION))
+        elif version > SCHEMA_VERSION:
+            raise ValueError("%s has schema version %d, newer than this plugin (%d)" % (path, version, SCHEMA_VERSION))
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """One write transaction, taking the write lock up front"""
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    # Writes
+
+    def record_deployment(self, deployment: Dict[str, Any], steps: List[Any], retries: List[Dict[str, Any]],
+                          errors: List[Any], step_times: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Insert or replace one deployment with its steps, retries and errors"""
+        finished_at = to_epoch(deployment.get('finished_at')) or time.time()
+        started_at = to_epoch(deployment.get('started_at'))
+        step_rows = self._step_rows(steps, step_times or {}, started_at)
+        retry_rows = [self._retry_row(retry, finished_at) for retry in retries if isinstance(retry, dict)]
+        error_rows = [self._error_row(error, finished_at) for error in errors if error]
+        error_rows.extend((row[0], row[4], row[5]) for row in retry_rows if row[5])
+        retry_rows = [row[:5] for row in retry_rows]
+        key = deployment.get('deployment_key') or '%s/%s/%s/%s' % (
+            deployment['environment'], deployment['location'], deployment['vm_name'],
+            to_iso(started_at) if started_at is not None else to_iso(finished_at))
+        details = deployment.get('details')
+
+        with self._transaction() as db:
+            db.execute('DELETE FROM deployments WHERE deployment_key = ?', (key,))
+            cursor = db.execute(
+                'INSERT INTO deployments (deployment_key, vm_name, environment, location, os_type, status, '
+                'succeeded, started_at, finished_at, duration_seconds, retry_count, error_count, job_id, '
+                'artifact_path, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, deployment['vm_name'], deployment['environment'], deployment['location'],
+                 deployment.get('os_type') or '', deployment['status'], int(bool(deployment['succeeded'])),
+                 started_at, finished_at, finished_at - started_at if started_at is not None else None,
+                 sum(max(row[1] - 1, 0) for row in retry_rows), len(error_rows),
+                 str(deployment['job_id']) if deployment.get('job_id') not in (None, '') else None,
+                 deployment.get('artifact_path'),
+                 json.dumps(details, separators=(',', ':'), default=str) if details else None))
+            deployment_id = cursor.lastrowid
+            db.executemany('INSERT INTO steps (deployment_id, position, name, status, started_at, finished_at, '
+                           'duration_seconds) VALUES (%d, ?, ?, ?, ?, ?, ?)' % deployment_id, step_rows)
+            db.executemany('INSERT INTO retries (deployment_id, operation, attempts, status, duration_seconds, '
+                           'finished_at) VALUES (%d, ?, ?, ?, ?, ?)' % deployment_id, retry_rows)
+            db.executemany('INSERT INTO errors (deployment_id, step, occurred_at, message) '
+                           'VALUES (%d, ?, ?, ?)' % deployment_id, error_rows)
+        return {'deployment_id': deployment_id, 'deployment_key': key, 'steps': len(step_rows),
+                'retries': len(retry_rows), 'errors': len(error_rows)}
+
+    @staticmethod
+    def _step_rows(steps: List[Any], step_times: Dict[str, Any], started_at: Optional[float]) -> List[Tuple]:
+        """(position, name, status, start, end, duration) per step; a step starts when the previous one ended"""
+        rows = []
+        previous_end = started_at
+        for position, step in enumerate(steps):
+            if not isinstance(step, dict):
+                step = {'name': str(step), 'finished_at': step_times.get(str(step))}
+            end = to_epoch(step.get('finished_at'))
+            start = to_epoch(step.get('started_at'))
+            if start is None:
+                start = previous_end
+            duration = step.get('duration_seconds')
+            if duration is None and start is not None and end is not None:
+                duration = max(end - start, 0.0)
+            rows.append((position, step['name'], step.get('status') or 'completed', start, end,
+                         float(duration) if duration is not None else None))
+            if end is not None:
+                previous_end = end
+        return rows
+
+    @staticmethod
+    def _retry_row(retry: Dict[str, Any], finished_at: float) -> Tuple:
+        """retry_manager operation record -> (operation, attempts, status, duration, end, error)"""
+        error = retry.get('error_details') or retry.get('error')
+        if error is not None and not isinstance(error, str):
+            error = (error.get('msg') if isinstance(error, dict) else None) or json.dumps(error, default=str)
+        return (retry.get('operation_name') or retry.get('operation') or 'unknown',
+                int(retry.get('attempt_count') or retry.get('attempts') or 1),
+                retry.get('status') or 'completed',
+                float(retry['execution_time']) if retry.get('execution_time') not in (None, '') else None,
+                to_epoch(retry.get('end_time')) or finished_at,
+                error[:4000] if error else None)
+
+    @staticmethod
+    def _error_row(error: Any, finished_at: float) -> Tuple:
+        if not isinstance(error, dict):
+            return (None, finished_at, str(error)[:4000])
+        message = error.get('message') or error.get('msg') or json.dumps(error, default=str)
+        return (error.get('step'), to_epoch(error.get('occurred_at') or error.get('timestamp')) or finished_at,
+                str(message)[:4000])
+
+    def record_output(self, session_id: str, component: str, record: Dict[str, Any],
+                      context: Dict[str, Any]) -> int:
+        """One output_manager component record"""
+        with self._transaction() as db:
+            cursor = db.execute(
+                'INSERT INTO outputs (session_id, component, recorded_at, size_bytes, validation_status, '
+                'environment, location, os_type) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (session_id, component, to_epoch(record.get('timestamp')) or time.time(),
+                 int(record.get('size_bytes') or 0), record.get('validation_status') or 'valid',
+                 context.get('environment'), context.get('location'), context.get('vm_os') or context.get('os_type')))
+        return cursor.lastrowid
+
+    def compact(self, retention_days: float, vacuum: bool = False, now: Optional[float] = None) -> Dict[str, Any]:
+        """Roll deployments older than retention_days into daily totals and delete their details"""
+        cutoff = (now if now is not None else time.time()) - retention_days * 86400
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO daily_rollup (day, environment, location, os_type, succeeded, deployments, "
+                "total_duration_seconds, max_duration_seconds, retries, errors) "
+                "SELECT date(finished_at, 'unixepoch'), environment, location, os_type, succeeded, COUNT(*), "
+                "COALESCE(SUM(duration_seconds), 0), MAX(duration_seconds), SUM(retry_count), SUM(error_count) "
+                "FROM deployments WHERE finished_at < ? "
+                "GROUP BY date(finished_at, 'unixepoch'), environment, location, os_type, succeeded "
+                "ON CONFLICT (day, environment, location, os_type, succeeded) DO UPDATE SET "
+                "deployments = deployments + excluded.deployments, "
+                "total_duration_seconds = total_duration_seconds + excluded.total_duration_seconds, "
+                "max_duration_seconds = MAX(COALESCE(max_duration_seconds, 0), "
+                "COALESCE(excluded.max_duration_seconds, 0)), "
+                "retries = retries + excluded.retries, errors = errors + excluded.errors", (cutoff,))
+            deleted = db.execute('DELETE FROM deployments WHERE finished_at < ?', (cutoff,)).rowcount
+            outputs = db.execute('DELETE FROM outputs WHERE recorded_at < ?', (cutoff,)).rowcount
+        if vacuum:
+            self.connection.execute('VACUUM')
+        return {'cutoff': to_iso(cutoff), 'deployments_compacted': deleted, 'outputs_deleted': outputs,
+                'vacuumed': vacuum}
+
+    # Queries
+
+    def query(self, name: str, filters: Optional[Dict[str, Any]] = None, limit: int = DEFAULT_LIMIT,
+              now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Run a named fleet query; every query is served by an index on its time or key column"""
+        if name not in QUERIES:
+            raise ValueError("Unknown query '%s' (choose from %s)" % (name, ', '.join(QUERIES)))
+        filters = {key: value for key, value in (filters or {}).items() if value not in (None, '')}
+        for key in ('since', 'until'):
+            if key in filters:
+                filters[key] = to_epoch(filters[key], now)
+        return getattr(self, '_query_' + name)(filters, limit)
+
+    @staticmethod
+    def _where(filters: Dict[str, Any], extra: Tuple[str, ...] = ()) -> Tuple[str, List[Any]]:
+        clauses = list(extra)
+        params = []
+        for key, (column, operator) in DEPLOYMENT_FILTERS.items():
+            if key in filters:
+                clauses.append('%s %s ?' % (column, operator))
+                params.append(filters[key])
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def _rows(self, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    @staticmethod
+    def _with_times(rows: List[Dict[str, Any]], *columns: str) -> List[Dict[str, Any]]:
+        for row in rows:
+            for column in columns:
+                if column in row:
+                    row[column] = to_iso(row[column])
+        return rows
+
+    _DEPLOYMENT_COLUMNS = ('d.vm_name, d.environment, d.location, d.os_type, d.status, d.succeeded, d.started_at, '
+                           'd.finished_at, d.duration_seconds, d.retry_count, d.error_count, d.job_id, '
+                           'd.artifact_path')
+
+    def _query_recent(self, filters: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        where, params = self._where(filters)
+        rows = self._rows('SELECT %s FROM deployments d%s ORDER BY d.finished_at DESC LIMIT ?'
+                          % (self._DEPLOYMENT_COLUMNS, where), params + [limit])
+        return self._with_times(rows, 'started_at', 'finished_at')
+
+    def _query_failures(self, filters: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        where, params = self._where(filters, ('d.succeeded = 0',))
+        rows = self._rows(
+            'SELECT %s, (SELECT e.message FROM errors e WHERE e.deployment_id = d.id '
+            'ORDER BY e.occurred_at DESC LIMIT 1) AS last_error, '
+            '(SELECT s.name FROM steps s WHERE s.deployment_id = d.id ORDER BY s.position DESC LIMIT 1) '
+            'AS last_step FROM deployments d%s ORDER BY d.finished_at DESC LIMIT ?'
+            % (self._DEPLOYMENT_COLUMNS, where), params + [limit])
+        return self._with_times(rows, 'started_at', 'finished_at')
+
+    def _query_summary(self, filters: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        where, params = self._where(filters)
+        live = self._rows(
+            'SELECT d.environment, COUNT(*) AS deployments, SUM(d.succeeded) AS succeeded, '
+            'COALESCE(SUM(d.duration_seconds), 0) AS total_duration_seconds, '
+            'MAX(d.duration_seconds) AS max_duration_seconds, SUM(d.retry_count) AS retries, '
+            'SUM(d.error_count) AS errors FROM deployments d%s GROUP BY d.environment' % where, params)
+        # Compacted days count too, at day granularity
+        clauses, rollup_params = [], []
+        for key in ('environment', 'location', 'os_type'):
+            if key in filters:
+                clauses.append('%s = ?' % key)
+                rollup_params.append(filters[key])
+        if 'since' in filters:
+            clauses.append("day >= date(?, 'unixepoch')")
+            rollup_params.append(filters['since'])
+        if 'until' in filters:
+            clauses.append("day < date(?, 'unixepoch')")
+            rollup_params.append(filters['until'])
+        rolled = [] if 'vm_name' in filters or 'status' in filters else self._rows(
+            'SELECT environment, SUM(deployments) AS deployments, SUM(succeeded * deployments) AS succeeded, '
+            'SUM(total_duration_seconds) AS total_duration_seconds, MAX(max_duration_seconds) AS '
+            'max_duration_seconds, SUM(retries) AS retries, SUM(errors) AS errors FROM daily_rollup%s '
+            'GROUP BY environment' % ((' WHERE ' + ' AND '.join(clauses)) if clauses else ''), rollup_params)
+
+        totals: Dict[str, Dict[str, Any]] = {}
+        for row in live + rolled:
+            total = totals.setdefault(row['environment'], {
+                'environment': row['environment'], 'deployments': 0, 'succeeded': 0,
+                'total_duration_seconds': 0.0, 'max_duration_seconds': None, 'retries': 0, 'errors': 0})
+            for key in ('deployments', 'succeeded', 'total_duration_seconds', 'retries', 'errors'):
+                total[key] += row[key] or 0
+            if row['max_duration_seconds'] is not None:
+                total['max_duration_seconds'] = max(total['max_duration_seconds'] or 0, row['max_duration_seconds'])
+        summary = []
+        for total in sorted(totals.values(), key=lambda item: item['environment'])[:limit]:
+            count = total['deployments']
+            summary.append({
+                'environment': total['environment'], 'deployments': count, 'succeeded': total['succeeded'],
+                'failed': count - total['succeeded'],
+                'success_rate': round(total['succeeded'] * 100.0 / count, 1) if count else None,
+                'mean_duration_seconds': round(total['total_duration_seconds'] / count, 1) if count else None,
+                'max_duration_seconds': total['max_duration_seconds'], 'retries': total['retries'],
+                'errors': total['errors']})
+        return summary
+
+    def _query_steps(self, filters: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        where, params = self._where(filters)
+        if 'step' in filters:
+            where += (' AND ' if where else ' WHERE ') + 's.name = ?'
+            params.append(filters['step'])
+        return self._rows(
+            "SELECT s.name AS step, COUNT(*) AS runs, SUM(s.status NOT IN ('completed', 'ok', 'success')) "
+            "AS failures, ROUND(AVG(s.duration_seconds), 1) AS mean_seconds, "
+            "ROUND(MAX(s.duration_seconds), 1) AS max_seconds FROM deployments d "
+            "CROSS JOIN steps s ON s.deployment_id = d.id%s GROUP BY s.name ORDER BY mean_seconds DESC LIMIT ?"
+            % where, params + [limit])
+
+    def _query_retries(self, filters: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        where, params = self._where(filters)
+        return self._rows(
+            "SELECT r.operation, COUNT(*) AS operations, SUM(r.attempts > 1) AS retried, "
+            "SUM(r.attempts - 1) AS extra_attempts, MAX(r.attempts) AS max_attempts, "
+            "SUM(r.status = 'failed') AS failed FROM deployments d "
+            "CROSS JOIN retries r ON r.deployment_id = d.id%s GROUP BY r.operation "
+            "ORDER BY extra_attempts DESC LIMIT ?" % where, params + [limit])
+
+    def _query_errors(self, filters: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        where, params = self._where(filters)
+        rows = self._rows(
+            'SELECT e.occurred_at, d.vm_name, d.environment, d.location, e.step, e.message FROM errors e '
+            'JOIN deployments d ON d.id = e.deployment_id%s ORDER BY e.occurred_at DESC LIMIT ?' % where,
+            params + [limit])
+        return self._with_times(rows, 'occurred_at')
+
+    def _query_deployment(self, filters: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        if 'vm_name' not in filters:
+            raise ValueError("The deployment query needs a vm_name filter")
+        where, params = self._where(filters)
+        rows = self._rows('SELECT d.id, %s, d.details FROM deployments d%s ORDER BY d.finished_at DESC LIMIT ?'
+                          % (self._DEPLOYMENT_COLUMNS, where), params + [limit])
+        for row in rows:
+            deployment_id = row.pop('id')
+            row['details'] = json.loads(row['details']) if row['details'] else {}
+            row['steps'] = self._with_times(self._rows(
+                'SELECT name, status, started_at, finished_at, duration_seconds FROM steps '
+                'WHERE deployment_id = ? ORDER BY position', [deployment_id]), 'started_at', 'finished_at')
+            row['retries'] = self._with_times(self._rows(
+                'SELECT operation, attempts, status, duration_seconds, finished_at FROM retries '
+                'WHERE deployment_id = ?', [deployment_id]), 'finished_at')
+            row['errors'] = self._with_times(self._rows(
+                'SELECT step, occurred_at, message FROM errors WHERE deployment_id = ? ORDER BY occurred_at',
+                [deployment_id]), 'occurred_at')
+        return self._with_times(rows, 'started_at', 'finished_at')
+
+    def _query_outputs(self, filters: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        for key in ('environment', 'location', 'os_type'):
+            if key in filters:
+                clauses.append('%s = ?' % key)
+                params.append(filters[key])
+        if 'since' in filters:
+            clauses.append('recorded_at >= ?')
+            params.append(filters['since'])
+        if 'until' in filters:
+            clauses.append('recorded_at < ?')
+            params.append(filters['until'])
+        return self._rows(
+            "SELECT component, COUNT(*) AS records, SUM(size_bytes) AS total_bytes, "
+            "MAX(size_bytes) AS max_bytes, SUM(validation_status = 'invalid') AS invalid, "
+            "COUNT(DISTINCT session_id) AS sessions FROM outputs%s GROUP BY component "
+            "ORDER BY total_bytes DESC LIMIT ?" % ((' WHERE ' + ' AND '.join(clauses)) if clauses else ''),
+            params + [limit])
+
+
+class ActionModule(ActionBase):
+    """Record deployments and outputs in the history store and query it"""
+
+    TRANSFERS_FILES = False
+    _requires_connection = False
+
+    argument_spec = dict(
+        operation=dict(type='str', default='record',
+                       choices=['record', 'record_output', 'query', 'compact']),
+        db_path=dict(type='path', default=DEFAULT_DB_PATH),
+        deployment=dict(type='dict'),
+        steps=dict(type='list', elements='raw', default=[]),
+        step_times=dict(type='dict', default={}),
+        retries=dict(type='list', elements='raw', default=[]),
+        errors=dict(type='list', elements='raw', default=[]),
+        session_id=dict(type='str'),
+        component=dict(type='str', default='output_manager'),
+        record=dict(type='dict', default={}),
+        context=dict(type='dict', default={}),
+        query=dict(type='str', choices=list(QUERIES)),
+        filters=dict(type='dict', default={}),
+        limit=dict(type='int', default=DEFAULT_LIMIT),
+        retention_days=dict(type='float'),
+        vacuum=dict(type='bool', default=False),
+    )
+
+    def run(self, tmp=None, task_vars=None):
+        """Execute the requested history operation"""
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        _, args = self.validate_argument_spec(argument_spec=self.argument_spec)
+        operation = args['operation']
+        try:
+            store = HistoryStore(args['db_path'])
+        except (sqlite3.Error, OSError, ValueError) as e:
+            raise AnsibleActionFail("Cannot open deployment history %s: %s" % (args['db_path'], e))
+
+        try:
+            if operation == 'record':
+                deployment = args['deployment'] or {}
+                missing = [key for key in ('vm_name', 'environment', 'location', 'status', 'succeeded')
+                           if deployment.get(key) in (None, '')]
+                if missing:
+                    raise AnsibleActionFail("deployment is missing %s" % ", ".join(missing))
+                result.update(store.record_deployment(deployment, args['steps'], args['retries'], args['errors'],
+                                                     args['step_times']))
+                result['changed'] = True
+            elif operation == 'record_output':
+                if not args['session_id']:
+                    raise AnsibleActionFail("record_output needs session_id")
+                result['output_id'] = store.record_output(args['session_id'], args['component'], args['record'],
+                                                          args['context'])
+                result['changed'] = True
+            elif operation == 'query':
+                if not args['query']:
+                    raise AnsibleActionFail("operation query needs query")
+                started = time.perf_counter()
+                result['rows'] = store.query(args['query'], args['filters'], args['limit'])
+                result['query_ms'] = round((time.perf_counter() - started) * 1000, 3)
+                result['changed'] = False
+            else:
+                if args['retention_days'] is None or args['retention_days'] < 0:
+                    raise AnsibleActionFail("compact needs a non-negative retention_days")
+                result.update(store.compact(args['retention_days'], args['vacuum']))
+                result['changed'] = result['deployments_compacted'] > 0 or result['outputs_deleted'] > 0
+        except (sqlite3.Error, ValueError) as e:
+            raise AnsibleActionFail("Deployment history %s failed: %s" % (operation, e))
+        finally:
+            store.close()
+
+        result['db_path'] = args['db_path']
+        return result
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Action Plugin: Output Sink
+
+Controller-side writer for the output_manager role. Component records are
+appended to a per-session pending JSON-lines buffer in O(1); once the buffer
+holds batch_size records it is flushed as one block to the session's
+append-only output stream (one gzip member per batch when compression is
+enabled). Finalize streams the records once and writes the consolidated
+JSON, YAML, HTML and XML reports together, so the cost of each component
+report stays flat however many components have reported before it.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import datetime
+import fcntl
+import gzip
+import html
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from xml.sax.saxutils import escape as xml_escape
+
+import yaml
+
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+
+REPORT_FORMATS = ('json', 'yaml', 'html', 'xml')
+
+
+def _utc_now() -> str:
+    """Current UTC time in the ISO 8601 format used by the roles"""
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class Sanitizer:
+    """Redacts sensitive keys and values in component data"""
+
+    def __init__(self, redact_fields: List[str], password_pattern: Optional[str],
+                 redaction_text: str = '[REDACTED]'):
+        """Compile the redaction rules once per task"""
+        self.redact_fields = [field.lower() for field in redact_fields]
+        self.pattern = re.compile(password_pattern, re.IGNORECASE) if password_pattern else None
+        self.redaction_text = redaction_text
+
+    def _sensitive(self, key: str) -> bool:
+        """Whether a key names sensitive data"""
+        key = key.lower()
+        return any(field in key for field in self.redact_fields)
+
+    def apply(self, value: Any) -> Any:
+        """Return a redacted copy of a JSON-compatible value"""
+        if isinstance(value, dict):
+            return {key: self.redaction_text if self._sensitive(str(key)) else self.apply(item)
+                    for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.apply(item) for item in value]
+        if isinstance(value, str) and self.pattern is not None:
+            return self.pattern.sub(self.redaction_text, value)
+        return value
+
+
+class OutputSink:
+    """Batched, append-only component output store for one session"""
+
+    def __init__(self, output_dir: str, session_id: str, compress: bool = True):
+        """Initialize the file paths for a session"""
+        self.output_dir = output_dir
+        self.session_id = session_id
+        self.compress = compress
+        safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', session_id)
+        self.file_prefix = os.path.join(output_dir, safe_id)
+        self.pending_path = self.file_prefix + "_outputs.pending.jsonl"
+        self.stream_path = self.file_prefix + ("_outputs.jsonl.gz" if compress else "_outputs.jsonl")
+        self.state_path = self.file_prefix + "_outputs.state.json"
+
+    @contextmanager
+    def _locked(self):
+        """Serialize writers of the same session"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self.state_path + ".lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_state(self) -> Optional[Dict[str, Any]]:
+        """Read the session counters, None when the session is new"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_state(self, state: Dict[str, Any]) -> None:
+        """Atomically replace the session counters"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, prefix=".output_sink_")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _new_state(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Counters and header of a new session"""
+        return {
+            "session_id": self.session_id,
+            "timestamp": _utc_now(),
+            "context": context,
+            "status": "initialized",
+            "pending": 0,
+            "total_outputs": 0,
+            "total_size_bytes": 0,
+            "batches_flushed": 0,
+            "validation": {"valid": 0, "invalid": 0},
+            "components": [],
+        }
+
+    def _flush(self, state: Dict[str, Any]) -> bool:
+        """Move the pending buffer to the output stream as one batch"""
+        if not state["pending"]:
+            return False
+        with open(self.pending_path, 'rb') as pending:
+            block = pending.read()
+        if self.compress:
+            with gzip.open(self.stream_path, 'ab') as stream:
+                stream.write(block)
+        else:
+            with open(self.stream_path, 'ab') as stream:
+                stream.write(block)
+        os.unlink(self.pending_path)
+        state["pending"] = 0
+        state["batches_flushed"] += 1
+        return True
+
+    def append(self, component: str, data: Any, data_format: str, batch_size: int,
+               context: Dict[str, Any]) -> Dict[str, Any]:
+        """Buffer one component record, flushing a full batch"""
+        try:
+            serialized = json.dumps(data, separators=(',', ':'))
+            validation_status = 'valid'
+        except (TypeError, ValueError):
+            serialized = json.dumps(data, separators=(',', ':'), default=str)
+            validation_status = 'invalid'
+        record = {
+            "component": component,
+            "timestamp": _utc_now(),
+            "format": data_format,
+            "status": "processed",
+            "size_bytes": len(serialized),
+            "validation_status": validation_status,
+        }
+        line = json.dumps(record, separators=(',', ':'))[:-1] + ',"data":' + serialized + "}\n"
+
+        with self._locked():
+            state = self._read_state() or self._new_state(context)
+            with open(self.pending_path, 'a', encoding='utf-8') as pending:
+                pending.write(line)
+            state["pending"] += 1
+            state["total_outputs"] += 1
+            state["total_size_bytes"] += record["size_bytes"]
+            state["validation"][validation_status] += 1
+            if component not in state["components"]:
+                state["components"].append(component)
+            state["status"] = "processing"
+            flushed = state["pending"] >= batch_size and self._flush(state)
+            self._write_state(state)
+        return {"record": record, "flushed": bool(flushed), "state": state}
+
+    def _records(self) -> Iterator[Dict[str, Any]]:
+        """Iterate the flushed batches, then anything still pending"""
+        if os.path.exists(self.stream_path):
+            opener = gzip.open if self.compress else open
+            with opener(self.stream_path, 'rt', encoding='utf-8') as stream:
+                for line in stream:
+                    if line.strip():
+                        yield json.loads(line)
+        if os.path.exists(self.pending_path):
+            with open(self.pending_path, 'r', encoding='utf-8') as pending:
+                for line in pending:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def finalize(self, formats: List[str], status: str) -> Dict[str, Any]:
+        """Flush the buffer and write every consolidated report in one pass"""
+        with self._locked():
+            state = self._read_state()
+            if state is None:
+                raise AnsibleActionFail("Unknown output session %s" % self.session_id)
+            self._flush(state)
+            state["status"] = status
+            state["finalization_time"] = _utc_now()
+            state["final_output_count"] = state["total_outputs"]
+            header = json.loads(json.dumps({key: state[key] for key in (
+                "session_id", "timestamp", "context", "status", "finalization_time",
+                "total_outputs", "total_size_bytes", "validation", "components")}))
+            paths = self._write_reports(header, formats)
+            self._write_state(state)
+        return {"state": state, "paths": paths}
+
+    def _write_reports(self, header: Dict[str, Any], formats: List[str]) -> Dict[str, str]:
+        """Stream the records once into all requested report writers"""
+        paths = {fmt: "%s_final_consolidated.%s" % (self.file_prefix, 'yml' if fmt == 'yaml' else fmt)
+                 for fmt in formats}
+        handles = {fmt: open(path, 'w', encoding='utf-8') for fmt, path in paths.items()}
+        try:
+            if 'json' in handles:
+                handles['json'].write(json.dumps(header, indent=2)[:-2] + ',\n  "outputs": [')
+            if 'yaml' in handles:
+                handles['yaml'].write("# Output Manager - Consolidated Output\n# Generated: %s\n\n"
+                                      % header["finalization_time"])
+                handles['yaml'].write(yaml.safe_dump(header, default_flow_style=False, sort_keys=False))
+                handles['yaml'].write("outputs:\n")
+            if 'html' in handles:
+                handles['html'].write(self._html_head(header))
+            if 'xml' in handles:
+                handles['xml'].write(self._xml_head(header))
+
+            first = True
+            for record in self._records():
+                if 'json' in handles:
+                    handles['json'].write(("\n    " if first else ",\n    ") + json.dumps(record))
+                if 'yaml' in handles:
+                    handles['yaml'].write(yaml.safe_dump([record], default_flow_style=False,
+                                                         sort_keys=False))
+                if 'html' in handles:
+                    handles['html'].write(self._html_row(record))
+                if 'xml' in handles:
+                    handles['xml'].write(self._xml_output(record))
+                first = False
+
+            if 'json' in handles:
+                handles['json'].write("\n  ]\n}\n" if not first else "]\n}\n")
+            if 'yaml' in handles and first:
+                handles['yaml'].write("  []\n")
+            if 'html' in handles:
+                handles['html'].write("</tbody>\n</table>\n</body>\n</html>\n")
+            if 'xml' in handles:
+                handles['xml'].write("  </outputs>\n</ansible_output>\n")
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return paths
+
+    @staticmethod
+    def _html_head(header: Dict[str, Any]) -> str:
+        """HTML report header with the session summary"""
+        summary = "".join("<tr><th>%s</th><td>%s</td></tr>\n" % (html.escape(str(key)), html.escape(str(value)))
+                          for key, value in header.items() if key != "context")
+        context = "".join("<tr><th>%s</th><td>%s</td></tr>\n" % (html.escape(str(key)), html.escape(str(value)))
+                          for key, value in (header.get("context") or {}).items())
+        return ("<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+                "<title>Output Session %s</title>\n</head>\n<body>\n"
+                "<h1>Output Session %s</h1>\n<table>\n%s%s</table>\n"
+                "<h2>Outputs</h2>\n<table>\n<thead><tr><th>Component</th><th>Timestamp</th>"
+                "<th>Format</th><th>Size (bytes)</th><th>Validation</th><th>Data</th></tr></thead>\n"
+                "<tbody>\n" % (html.escape(header["session_id"]), html.escape(header["session_id"]),
+                               summary, context))
+
+    @staticmethod
+    def _html_row(record: Dict[str, Any]) -> str:
+        """One HTML table row per record"""
+        cells = [record.get("component"), record.get("timestamp"), record.get("format"),
+                 record.get("size_bytes"), record.get("validation_status")]
+        return "<tr>%s<td><pre>%s</pre></td></tr>\n" % (
+            "".join("<td>%s</td>" % html.escape(str(cell)) for cell in cells),
+            html.escape(json.dumps(record.get("data"), indent=2)))
+
+    @staticmethod
+    def _xml_head(header: Dict[str, Any]) -> str:
+        """XML report header in the layout of the former output.xml.j2 template"""
+        context = "".join("    <%s>%s</%s>\n" % (key, xml_escape(str(value)), key)
+                          for key, value in (header.get("context") or {}).items()
+                          if re.match(r'^[A-Za-z_][A-Za-z0-9_.-]*$', str(key)))
+        return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<ansible_output xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+                '  <metadata>\n    <session_id>%s</session_id>\n    <timestamp>%s</timestamp>\n'
+                '  </metadata>\n  <deployment_context>\n%s  </deployment_context>\n'
+                '  <output_info>\n    <status>%s</status>\n    <total_outputs>%d</total_outputs>\n'
+                '    <total_size_bytes>%d</total_size_bytes>\n  </output_info>\n  <outputs>\n'
+                % (xml_escape(header["session_id"]), xml_escape(header["timestamp"]), context,
+                   xml_escape(header["status"]), header["total_outputs"], header["total_size_bytes"]))
+
+    @staticmethod
+    def _xml_output(record: Dict[str, Any]) -> str:
+        """One <output> element per record, data embedded as JSON"""
+        fields = "".join("      <%s>%s</%s>\n" % (key, xml_escape(str(record.get(key))), key)
+                         for key in ("component", "timestamp", "format", "status", "size_bytes",
+                                     "validation_status"))
+        return "    <output>\n%s      <data>%s</data>\n    </output>\n" % (
+            fields, xml_escape(json.dumps(record.get("data"))))
+
+    def summary(self) -> Dict[str, Any]:
+        """Current session counters"""
+        state = self._read_state()
+        if state is None:
+            raise AnsibleActionFail("Unknown output session %s" % self.session_id)
+        return state
+
+
+class ActionModule(ActionBase):
+    """Buffer component outputs and write consolidated reports"""
+
+    TRANSFERS_FILES = False
+    _requires_connection = False
+
+    argument_spec = dict(
+        operation=dict(type='str', default='append', choices=['append', 'finalize', 'status']),
+        session_id=dict(type='str', required=True),
+        component=dict(type='str', default='output_manager'),
+        data=dict(type='raw'),
+        format=dict(type='str', default='json'),
+        context=dict(type='dict', default={}),
+        output_dir=dict(type='path', default='/tmp/ansible_outputs'),
+        batch_size=dict(type='int', default=50),
+        compress=dict(type='bool', default=True),
+        formats=dict(type='list', elements='str', default=['json']),
+        status=dict(type='str', default='finalized'),
+        sanitize=dict(type='bool', default=True),
+        redact_fields=dict(type='list', elements='str', default=['password', 'secret', 'token', 'key', 'credential']),
+        password_pattern=dict(type='str'),
+        redaction_text=dict(type='str', default='[REDACTED]'),
+        return_data=dict(type='bool', default=False),
+    )
+
+    def run(self, tmp=None, task_vars=None):
+        """Execute the requested sink operation"""
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        _, args = self.validate_argument_spec(argument_spec=self.argument_spec)
+        sink = OutputSink(args['output_dir'], args['session_id'], args['compress'])
+        operation = args['operation']
+
+        if operation == 'append':
+            if args['batch_size'] < 1:
+                raise AnsibleActionFail("batch_size must be at least 1")
+            data = args['data'] if args['data'] is not None else {}
+            if args['sanitize']:
+                data = Sanitizer(args['redact_fields'], args['password_pattern'],
+                                 args['redaction_text']).apply(data)
+            outcome = sink.append(args['component'], data, args['format'], args['batch_size'],
+                                  args['context'])
+            state = outcome["state"]
+            result['changed'] = True
+            result['record'] = outcome["record"]
+            result['flushed'] = outcome["flushed"]
+            if args['return_data']:
+                result['data'] = data
+        elif operation == 'finalize':
+            unknown = [fmt for fmt in args['formats'] if fmt not in REPORT_FORMATS]
+            if unknown:
+                raise AnsibleActionFail("Unsupported report formats: %s" % ", ".join(unknown))
+            outcome = sink.finalize(args['formats'], args['status'])
+            state = outcome["state"]
+            result['changed'] = True
+            result['report_paths'] = outcome["paths"]
+        else:
+            state = sink.summary()
+            result['changed'] = False
+
+        result['session_id'] = args['session_id']
+        result['status'] = state["status"]
+        result['stream_path'] = sink.stream_path
+        result['total_outputs'] = state["total_outputs"]
+        result['total_size_bytes'] = state["total_size_bytes"]
+        result['pending'] = state["pending"]
+        result['batches_flushed'] = state["batches_flushed"]
+        result['validation'] = state["validation"]
+        result['components'] = state["components"]
+        return result
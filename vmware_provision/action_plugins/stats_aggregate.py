@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Action Plugin: Stats Aggregate
+
+Size-capped replacement for set_stats of whole module results. A role
+declares the fields it wants from a result; the plugin extracts and
+flattens them into one small entry per VM and component, published as
+`<stat>.<vm>.<component>` with the same aggregation as set_stats. Values
+that recur across VMs (folder, datastore lists) are published once in
+`<stat>_shared` and referenced as `@<hash>`. Values over the size budget
+and the full result spill into a gzip-compressed JSON artifact whose path
+is in the entry. A per-run ledger on the controller skips entries and
+shared values that were already published and caps the bytes one run adds
+to the job artifacts. The ledger belongs to one ansible-playbook process:
+a ledger left by an earlier run under the same run_id is started over, so
+references never point at shared values only an earlier run published.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import datetime
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+
+_MISSING = object()
+_UNSAFE_PATH_CHARS = re.compile(r'[^A-Za-z0-9_.-]+')
+SHARED_REF_PREFIX = '@'
+
+
+def _utc_now() -> str:
+    """Current UTC time in the ISO 8601 format used by the roles"""
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _encode(value: Any) -> str:
+    """Compact, key-sorted JSON; its length is the size the value adds to the stats"""
+    return json.dumps(value, separators=(',', ':'), sort_keys=True, default=str)
+
+
+def _path_part(value: str) -> str:
+    return _UNSAFE_PATH_CHARS.sub('_', value).strip('._') or '_'
+
+
+def playbook_run_id() -> str:
+    """Id of the ansible-playbook process that forked this worker; its start time guards against pid reuse"""
+    pid = os.getppid()
+    try:
+        with open('/proc/%d/stat' % pid, 'r') as f:
+            started = f.read().rsplit(')', 1)[1].split()[19]
+    except (IOError, OSError, IndexError):
+        started = '0'
+    return 'run_%d_%s' % (pid, started)
+
+
+def resolve(source: Any, path: str) -> Any:
+    """Value at a dotted path ('instance.hw_datastores.0'), _MISSING when absent"""
+    value = source
+    for part in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.lstrip('-').isdigit():
+            index = int(part)
+            value = value[index] if -len(value) <= index < len(value) else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def extract(source: Any, fields: Dict[str, str]) -> Dict[str, Any]:
+    """Declared fields of source, nested dicts flattened to name_key; absent and null values dropped"""
+    flat: Dict[str, Any] = {}
+
+    def put(name: str, value: Any) -> None:
+        if isinstance(value, dict) and value:
+            for key, item in value.items():
+                put('%s_%s' % (name, key), item)
+        elif value is not None and value is not _MISSING:
+            flat[name] = value
+
+    for name, path in fields.items():
+        put(name, resolve(source, path))
+    return flat
+
+
+class RunLedger:
+    """What one run already published under a stat: entry hashes, value hashes, bytes"""
+
+    def __init__(self, directory: str, stat: str, owner: str):
+        self.directory = directory
+        self.path = os.path.join(directory, '%s.ledger.json' % _path_part(stat))
+        self.owner = owner
+
+    @contextmanager
+    def locked(self) -> Iterator[Dict[str, Any]]:
+        """Ledger state for read-modify-write, serialized across forks and playbook runs"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        state = json.load(f)
+                except (IOError, OSError, ValueError):
+                    state = {}
+                if state.get('owner') != self.owner:
+                    # Written by another playbook run: its stats are not in this run's job
+                    state = {'owner': self.owner, 'bytes': 0, 'entries': {}, 'seen': [], 'shared': []}
+                yield state
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.stats_ledger_')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class StatsEntry:
+    """Budgeted stats entry for one VM and component"""
+
+    def __init__(self, fields: Dict[str, Any], keep: List[str], details_path: str, max_value_bytes: int,
+                 shared_min_bytes: int):
+        self.fields = fields
+        self.keep = set(keep) | {'details_path'}
+        self.details_path = details_path
+        self.max_value_bytes = max_value_bytes
+        self.shared_min_bytes = shared_min_bytes
+        self.spilled: Dict[str, Any] = {}
+        self.shared: Dict[str, Any] = {}
+        self.originals: Dict[str, Any] = {}
+        self.candidates: Dict[str, str] = {}
+        self.sizes = {name: len(_encode(value)) for name, value in fields.items()}
+
+    def _spill(self, name: str) -> None:
+        value = self.fields.pop(name)
+        self.spilled[name] = self.originals.get(name, value)
+        self.sizes.pop(name)
+        self.fields['details_path'] = self.details_path
+
+    def build(self) -> None:
+        """Spill oversized values and hash the ones large enough to share"""
+        for name in [name for name, size in self.sizes.items() if size > self.max_value_bytes]:
+            if name not in self.keep:
+                self._spill(name)
+        if self.shared_min_bytes > 0:
+            for name, size in self.sizes.items():
+                if size >= self.shared_min_bytes:
+                    encoded = _encode(self.fields[name])
+                    self.candidates[name] = hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:12]
+
+    def share(self, digests: Set[str]) -> None:
+        """Replace the candidate values with these hashes by references"""
+        for name, digest in self.candidates.items():
+            if digest in digests and name in self.fields:
+                self.shared[digest] = self.originals[name] = self.fields[name]
+                self.fields[name] = SHARED_REF_PREFIX + digest
+                self.sizes[name] = len(digest) + 3
+
+    def size(self) -> int:
+        return len(_encode(self.fields))
+
+    def fit(self, budget: int) -> None:
+        """Spill the largest non-kept values until the entry is within budget"""
+        candidates = sorted((name for name in self.sizes if name not in self.keep),
+                            key=lambda name: self.sizes[name])
+        while candidates and self.size() > budget:
+            self._spill(candidates.pop())
+
+    def referenced_shared(self) -> Dict[str, Any]:
+        """Shared values still referenced after spilling"""
+        refs = {value[len(SHARED_REF_PREFIX):] for value in self.fields.values()
+                if isinstance(value, str) and value.startswith(SHARED_REF_PREFIX)}
+        return {digest: value for digest, value in self.shared.items() if digest in refs}
+
+
+def write_artifact(path: str, content: Dict[str, Any]) -> int:
+    """Atomically write gzip-compressed JSON; returns the compressed size"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.stats_artifact_')
+    with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        f.write(json.dumps(content, default=str).encode('utf-8'))
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+class ActionModule(ActionBase):
+    """Publish a flattened, size-capped per-VM stats entry"""
+
+    TRANSFERS_FILES = False
+    _requires_connection = False
+
+    argument_spec = dict(
+        key=dict(type='str', required=True),
+        component=dict(type='str', required=True),
+        source=dict(type='raw', default={}),
+        fields=dict(type='raw', required=True),
+        values=dict(type='dict', default={}),
+        keep=dict(type='list', elements='str', default=[]),
+        details=dict(type='raw'),
+        stat=dict(type='str', default='vm_stats'),
+        run_id=dict(type='str'),
+        artifact_dir=dict(type='path', default='/tmp/ansible_stats'),
+        max_value_bytes=dict(type='int', default=256),
+        max_entry_bytes=dict(type='int', default=1024),
+        shared_min_bytes=dict(type='int', default=32),
+        max_run_bytes=dict(type='int', default=262144),
+        per_host=dict(type='bool', default=False),
+        aggregate=dict(type='bool', default=True),
+    )
+
+    @staticmethod
+    def _field_paths(fields: Any) -> Dict[str, str]:
+        """fields as {name: path}; a list of paths names each field after its path"""
+        if isinstance(fields, dict):
+            return {str(name): str(path) for name, path in fields.items()}
+        if isinstance(fields, list):
+            return {str(path).replace('.', '_'): str(path) for path in fields}
+        raise AnsibleActionFail("fields must be a dict of name: path or a list of paths")
+
+    def _publish(self, args: Dict[str, Any], entry: StatsEntry) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Ledger-checked stats data and bookkeeping for this entry"""
+        ledger_key = '%s/%s' % (args['key'], args['component'])
+        entry_hash = hashlib.sha1(_encode(entry.fields).encode('utf-8')).hexdigest()
+        info = {'duplicate': False, 'budget_exceeded': False, 'run_bytes': 0}
+        ledger = RunLedger(os.path.join(args['artifact_dir'], _path_part(args['run_id'])), args['stat'],
+                           playbook_run_id())
+        with ledger.locked() as state:
+            if state['entries'].get(ledger_key) == entry_hash:
+                info['duplicate'] = True
+                info['run_bytes'] = state['bytes']
+                return {}, info
+            # A value is shared from its second occurrence in the run on; the first VM keeps it inline
+            known = set(state['shared'])
+            seen = set(state['seen'])
+            entry.share({digest for digest in entry.candidates.values() if digest in known or digest in seen})
+            entry.fit(args['max_entry_bytes'])
+            shared = {digest: value for digest, value in entry.referenced_shared().items() if digest not in known}
+            data = self._stats_data(args, entry.fields, shared)
+            if args['max_run_bytes'] > 0 and state['bytes'] + len(_encode(data)) > args['max_run_bytes']:
+                # Over the run budget only the kept fields and the artifact path are published
+                info['budget_exceeded'] = True
+                entry.fit(0)
+                shared = {digest: value for digest, value in entry.referenced_shared().items()
+                          if digest not in known}
+                data = self._stats_data(args, entry.fields, shared)
+            state['entries'][ledger_key] = entry_hash
+            state['seen'].extend(digest for digest in set(entry.candidates.values()) if digest not in seen | known)
+            state['shared'].extend(shared)
+            state['bytes'] += len(_encode(data))
+            info['run_bytes'] = state['bytes']
+        return data, info
+
+    @staticmethod
+    def _stats_data(args: Dict[str, Any], fields: Dict[str, Any], shared: Dict[str, Any]) -> Dict[str, Any]:
+        data = {args['stat']: {args['key']: {args['component']: fields}}}
+        if shared:
+            data[args['stat'] + '_shared'] = shared
+        return data
+
+    def run(self, tmp=None, task_vars=None):
+        """Extract, budget and publish the entry"""
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        _, args = self.validate_argument_spec(argument_spec=self.argument_spec)
+        for option in ('max_value_bytes', 'max_entry_bytes'):
+            if args[option] < 1:
+                raise AnsibleActionFail("%s must be at least 1" % option)
+
+        args['run_id'] = args['run_id'] or playbook_run_id()
+        fields = extract(args['source'], self._field_paths(args['fields']))
+        fields.update((name, value) for name, value in args['values'].items() if value is not None)
+        artifact_path = os.path.join(args['artifact_dir'], _path_part(args['run_id']),
+                                     _path_part(args['stat']), _path_part(args['key']),
+                                     '%s.json.gz' % _path_part(args['component']))
+        fields.pop('details_path', None)
+        if args['details'] is not None:
+            fields['details_path'] = artifact_path
+        entry = StatsEntry(fields, args['keep'], artifact_path, args['max_value_bytes'], args['shared_min_bytes'])
+        entry.build()
+        try:
+            data, info = self._publish(args, entry)
+        except (IOError, OSError) as e:
+            raise AnsibleActionFail("Cannot update stats ledger in %s: %s" % (args['artifact_dir'], e))
+
+        if entry.spilled or args['details'] is not None:
+            try:
+                result['artifact_bytes'] = write_artifact(artifact_path, {
+                    'stat': args['stat'], 'key': args['key'], 'component': args['component'],
+                    'recorded_at': _utc_now(), 'spilled': entry.spilled, 'details': args['details']})
+            except (IOError, OSError) as e:
+                raise AnsibleActionFail("Cannot write stats artifact %s: %s" % (artifact_path, e))
+            result['details_path'] = artifact_path
+
+        result['changed'] = False
+        result['ansible_stats'] = {'data': data, 'per_host': args['per_host'], 'aggregate': args['aggregate']}
+        # The entry itself is only in ansible_stats so the task event does not carry it twice
+        result['entry_bytes'] = len(_encode(entry.fields))
+        result['spilled'] = sorted(entry.spilled)
+        result['shared'] = sorted(data.get(args['stat'] + '_shared', {}))
+        result['duplicate'] = info['duplicate']
+        result['budget_exceeded'] = info['budget_exceeded']
+        result['run_bytes'] = info['run_bytes']
+        return result
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Structure Optimizer Benchmarks
+
+Measures the data_structure_optimizer library and the vmware_data_optimizer
+module on deterministic synthetic vSphere payloads (see payloads.py). Every
+case reports latency percentiles, throughput in records per second, peak
+traced memory and output size; results are written as JSON and can be
+compared against the committed baseline with a regression threshold.
+
+Cases:
+    validate                      validate_data on every record
+    normalize                     normalize_data over the record list
+    optimize                      optimize_data_structure (normalize + metadata)
+    convert:<format>              convert_to_format for every DataFormat
+    compress:<type>               compress_data on the JSON encoding
+    module_cold                   vmware_data_optimizer run as a fresh process
+
+Profiles:
+    quick   scales 1 and 1000 at depth 3 (the committed baseline)
+    full    scales 1, 1000 and 100000 at depths 1, 3 and 6; cases whose
+            payload exceeds --max-payload-mb are reported as skipped
+
+Usage:
+    python3 benchmarks/bench_data_optimizer.py
+    python3 benchmarks/bench_data_optimizer.py --compare benchmarks/baseline.json
+    python3 benchmarks/bench_data_optimizer.py --profile full --output /tmp/bench_full.json
+    python3 benchmarks/bench_data_optimizer.py --kind vmware_resource --case convert:yaml
+    python3 benchmarks/bench_data_optimizer.py --update-baseline
+
+Version: 2.0.0
+Compatibility: Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import argparse
+import datetime
+import fnmatch
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+LIBRARY_DIR = os.path.join(PROJECT_DIR, 'library')
+sys.path[:0] = [BENCH_DIR, LIBRARY_DIR]
+
+from data_structure_optimizer import (  # noqa: E402
+    CompressionType, DataFormat, DataStructureConfig, DataStructureOptimizer
+)
+import payloads  # noqa: E402
+
+RESULT_FORMAT_VERSION = 1
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Growth below these absolute amounts is timer/allocator noise, not a regression
+NOISE_FLOOR = {'p50_ms': 0.05, 'peak_kb': 64.0}
+
+PROFILES = {
+    'quick': {'scales': [1, 1000], 'depths': [3]},
+    'full': {'scales': [1, 1000, 100000], 'depths': [1, 3, 6]},
+}
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def measure(func, records, min_time, max_iterations, min_iterations=3):
+    """Time func() repeatedly, then measure its peak traced memory once"""
+    func()  # warm-up: first-call imports and caches are not part of the steady state
+    samples = []
+    started = time.perf_counter()
+    output = None
+    while len(samples) < max_iterations and (len(samples) < min_iterations or
+                                             time.perf_counter() - started < min_time):
+        begin = time.perf_counter()
+        output = func()
+        samples.append(time.perf_counter() - begin)
+    total = sum(samples)
+
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'records': records,
+        'iterations': len(samples),
+        'mean_ms': round(total / len(samples) * 1000, 4),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 4),
+        'throughput_rps': round(records * len(samples) / total, 2) if total else None,
+        'peak_kb': round(peak / 1024, 1),
+        'output_bytes': _size(output),
+    }
+
+
+def _size(output):
+    if isinstance(output, (bytes, str)):
+        return len(output)
+    if output is None:
+        return 0
+    return len(json.dumps(output, default=str))
+
+
+def library_cases(kind, records, payload):
+    """(name, callable) pairs for the library operations on one payload"""
+    wrapped = {'kind': kind, 'records': payload}
+    cases = []
+
+    validator = DataStructureOptimizer(DataStructureConfig())
+    cases.append(('validate', lambda: [validator.validate_data(record, kind) for record in payload]))
+    cases.append(('normalize', lambda: validator.normalize_data(payload)))
+    optimizer = DataStructureOptimizer(DataStructureConfig(include_checksums=False))
+    cases.append(('optimize', lambda: optimizer.optimize_data_structure(wrapped)))
+
+    compact = DataStructureOptimizer(DataStructureConfig(pretty_print=False, compression=CompressionType.GZIP))
+    for data_format in DataFormat:
+        # CSV flattens one row per record; every other format takes the wrapped document
+        data = payload if data_format == DataFormat.CSV else wrapped
+        cases.append(('convert:%s' % data_format.value,
+                      lambda fmt=data_format, data=data: compact.convert_to_format(data, fmt)))
+
+    encoded = json.dumps(wrapped, default=str).encode()
+    for compression in CompressionType:
+        compressor = DataStructureOptimizer(DataStructureConfig(compression=compression))
+        cases.append(('compress:%s' % compression.value, lambda c=compressor: c.compress_data(encoded)))
+    return cases
+
+
+def module_cold_case(kind, payload, runs):
+    """Run vmware_data_optimizer as Ansible does: a new interpreter per call"""
+    module_path = os.path.join(LIBRARY_DIR, 'vmware_data_optimizer.py')
+    with tempfile.TemporaryDirectory(prefix='bench_module_') as tmp:
+        args_path = os.path.join(tmp, 'args.json')
+        with open(args_path, 'w', encoding='utf-8') as f:
+            json.dump({'ANSIBLE_MODULE_ARGS': {'data': {'kind': kind, 'records': payload}, 'data_type': kind,
+                                               'output_format': 'json', 'pretty_print': False}}, f)
+        samples = []
+        output = b''
+        for _run in range(runs):
+            begin = time.perf_counter()
+            completed = subprocess.run([sys.executable, module_path, args_path], cwd=tmp,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+            samples.append(time.perf_counter() - begin)
+            output = completed.stdout
+            if completed.returncode != 0:
+                return {'error': (completed.stdout or completed.stderr).decode('utf-8', 'replace')[-500:]}
+    return {
+        'records': len(payload),
+        'iterations': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 4),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 4),
+        'throughput_rps': round(len(payload) * len(samples) / sum(samples), 2),
+        'peak_kb': None,
+        'output_bytes': len(output),
+    }
+
+
+def estimated_payload_mb(kind, count, depth):
+    sample = payloads.to_payload(payloads.generate(kind, 1, depth))
+    return len(json.dumps(sample)) * count / (1024 * 1024)
+
+
+def run_suite(args):
+    profile = PROFILES[args.profile]
+    scales = args.scale or profile['scales']
+    depths = args.depth or profile['depths']
+    kinds = args.kind or sorted(payloads.GENERATORS)
+    patterns = args.case or ['*']
+    results = {}
+    skipped = {}
+
+    for kind in kinds:
+        for depth in depths:
+            for count in scales:
+                prefix = '%s/n=%d/depth=%d' % (kind, count, depth)
+                size_mb = estimated_payload_mb(kind, count, depth)
+                if size_mb > args.max_payload_mb:
+                    skipped[prefix] = 'payload ~%.0f MB exceeds --max-payload-mb %d' % (size_mb, args.max_payload_mb)
+                    print('skip  %-48s %s' % (prefix, skipped[prefix]))
+                    continue
+                payload = payloads.to_payload(payloads.generate(kind, count, depth, args.seed))
+                cases = library_cases(kind, count, payload)
+                if not args.no_module:
+                    cases.append(('module_cold', None))
+                for name, func in cases:
+                    if not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                        continue
+                    case_id = '%s/%s' % (prefix, name)
+                    if func is None:
+                        result = module_cold_case(kind, payload, args.module_runs)
+                    else:
+                        result = measure(func, count, args.min_time, args.max_iterations)
+                    results[case_id] = result
+                    if 'error' in result:
+                        print('error %-48s %s' % (case_id, result['error']))
+                    else:
+                        print('%-64s p50 %10.3f ms  p99 %10.3f ms  %12s rec/s  peak %10s KB' % (
+                            case_id, result['p50_ms'], result['p99_ms'], result['throughput_rps'],
+                            result['peak_kb']))
+    return {
+        'format_version': RESULT_FORMAT_VERSION,
+        'meta': {
+            'profile': args.profile,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Cases whose p50 latency or peak memory grew by more than threshold"""
+    regressions = []
+    for case_id, base in baseline.get('results', {}).items():
+        result = current['results'].get(case_id)
+        if not result or 'error' in result or 'error' in base:
+            continue
+        for metric in ('p50_ms', 'peak_kb'):
+            before, after = base.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change > threshold and after - before > NOISE_FLOOR[metric]:
+                regressions.append({'case': case_id, 'metric': metric, 'baseline': before,
+                                    'current': after, 'change_percent': round(change * 100, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data_structure_optimizer and vmware_data_optimizer")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--kind', action='append', choices=sorted(payloads.GENERATORS), default=None)
+    parser.add_argument('--scale', action='append', type=int, default=None, help="Record count (repeatable)")
+    parser.add_argument('--depth', action='append', type=int, default=None, help="Property depth (repeatable)")
+    parser.add_argument('--case', action='append', default=None, help="Case name glob, e.g. 'convert:*'")
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--min-time', type=float, default=0.3, help="Minimum seconds of timed iterations per case")
+    parser.add_argument('--max-iterations', type=int, default=200)
+    parser.add_argument('--module-runs', type=int, default=5, help="Processes started per module_cold case")
+    parser.add_argument('--no-module', action='store_true', help="Skip the module_cold cases")
+    parser.add_argument('--max-payload-mb', type=int, default=256)
+    parser.add_argument('--output', default=None, help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', default=None, help="Baseline to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed relative growth of p50 latency and peak memory (default 0.25)")
+    parser.add_argument('--update-baseline', action='store_true', help="Write the results to benchmarks/baseline.json")
+    args = parser.parse_args()
+
+    # The optimizer logs at INFO through the root logger; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    current = run_suite(args)
+
+    output = DEFAULT_BASELINE if args.update_baseline else args.output or os.path.join(
+        BENCH_DIR, 'results', time.strftime('%Y%m%dT%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print('results written to %s' % output)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for regression in regressions:
+            print('REGRESSION %(case)s %(metric)s %(baseline)s -> %(current)s (+%(change_percent)s%%)' % regression)
+        if regressions:
+            sys.exit(1)
+        print('no regressions above %.0f%% against %s' % (args.threshold * 100, args.compare))
+
+
+if __name__ == '__main__':
+    main()
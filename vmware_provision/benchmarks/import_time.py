@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Import Time Budget
+
+Measures the import cost of data_structure_optimizer with `python -X importtime`
+in fresh interpreters and fails when a case exceeds its budget. Ansible starts
+a new interpreter for every module run, so this cost is paid once per task per
+host.
+
+Cases:
+    library                       import data_structure_optimizer on its own
+    module_increment              the same import after ansible.module_utils.basic,
+                                  i.e. what vmware_data_optimizer adds to a module run
+    module_json_run               a vmware_data_optimizer JSON passthrough run; must
+                                  not load any format or codec backend
+
+Usage:
+    python3 benchmarks/import_time.py
+    python3 benchmarks/import_time.py --runs 21 --top 15
+    python3 benchmarks/import_time.py --budget library=50 --budget module_increment=15
+
+Version: 2.0.0
+Compatibility: Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+LIBRARY_DIR = os.path.join(PROJECT_DIR, 'library')
+
+RESULT_FORMAT_VERSION = 1
+TARGET = 'data_structure_optimizer'
+
+# Median cumulative import time in ms; the JSON run has no time budget, only the backend check
+DEFAULT_BUDGETS_MS = {
+    'library': 70.0,
+    'module_increment': 20.0,
+}
+
+# Imported on first use only; a JSON passthrough must not load them (bz2 and lzma are
+# left out because ansible.module_utils.basic imports them itself)
+LAZY_BACKENDS = ('yaml', 'xml.etree.ElementTree', 'csv', 'gzip', 'pickle')
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( +)(\S+)\s*$')
+
+
+def parse_importtime(stderr):
+    """(self_us, cumulative_us, depth, module) per line of -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            entries.append((int(match.group(1)), int(match.group(2)), (len(match.group(3)) - 1) // 2,
+                            match.group(4)))
+    return entries
+
+
+def run_importtime(argv, cwd):
+    """Import entries of one fresh interpreter started with -X importtime"""
+    env = dict(os.environ, PYTHONPATH=LIBRARY_DIR)
+    completed = subprocess.run([sys.executable, '-X', 'importtime'] + argv, cwd=cwd, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if completed.returncode != 0:
+        raise RuntimeError((completed.stdout + completed.stderr).decode('utf-8', 'replace')[-500:])
+    return parse_importtime(completed.stderr.decode('utf-8', 'replace'))
+
+
+def measure(argv, cwd, runs, top):
+    """Median target import time, heaviest modules and every module loaded over runs"""
+    run_importtime(argv, cwd)  # warm the bytecode cache
+    target_ms = []
+    self_us = {}
+    loaded = set()
+    for _run in range(runs):
+        entries = run_importtime(argv, cwd)
+        target = [cumulative for _self, cumulative, _depth, module in entries if module == TARGET]
+        if target:
+            target_ms.append(target[-1] / 1000.0)
+        for own, _cumulative, _depth, module in entries:
+            self_us.setdefault(module, []).append(own)
+            loaded.add(module)
+    heaviest = sorted(((statistics.median(samples) / 1000.0, module) for module, samples in self_us.items()),
+                      reverse=True)[:top]
+    return {
+        'runs': runs,
+        'median_ms': round(statistics.median(target_ms), 3) if target_ms else None,
+        'min_ms': round(min(target_ms), 3) if target_ms else None,
+        'heaviest_self_ms': [{'module': module, 'self_ms': round(ms, 3)} for ms, module in heaviest],
+        'lazy_backends_loaded': sorted(module for module in LAZY_BACKENDS if module in loaded),
+    }
+
+
+def run_cases(args):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_import_') as tmp:
+        args_path = os.path.join(tmp, 'args.json')
+        with open(args_path, 'w', encoding='utf-8') as f:
+            json.dump({'ANSIBLE_MODULE_ARGS': {'data': {'vmName': 'bench-vm-01', 'numCPUs': 2},
+                                               'output_format': 'json', 'pretty_print': False}}, f)
+        cases = {
+            'library': ['-c', 'import %s' % TARGET],
+            'module_increment': ['-c', 'import ansible.module_utils.basic; import %s' % TARGET],
+            'module_json_run': [os.path.join(LIBRARY_DIR, 'vmware_data_optimizer.py'), args_path],
+        }
+        for name, argv in cases.items():
+            results[name] = measure(argv, tmp, args.runs, args.top)
+    return results
+
+
+def check_budgets(results, budgets):
+    """Budget violations as printable lines"""
+    failures = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is not None and result['median_ms'] is not None and result['median_ms'] > budget:
+            failures.append('OVER BUDGET %s %.1f ms > %.1f ms' % (name, result['median_ms'], budget))
+        if result['lazy_backends_loaded']:
+            failures.append('EAGER IMPORT %s loaded %s' % (name, ', '.join(result['lazy_backends_loaded'])))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure data_structure_optimizer import time against a budget")
+    parser.add_argument('--runs', type=int, default=11, help="Fresh interpreters per case")
+    parser.add_argument('--top', type=int, default=10, help="Heaviest modules listed per case")
+    parser.add_argument('--budget', action='append', default=None, metavar='CASE=MS',
+                        help="Override a case budget (default: %s)" % ', '.join(
+                            '%s=%s' % item for item in sorted(DEFAULT_BUDGETS_MS.items())))
+    parser.add_argument('--output', default=None,
+                        help="Result file (default: benchmarks/results/import_<timestamp>.json)")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for item in args.budget or []:
+        name, _, value = item.partition('=')
+        if name not in budgets or not value:
+            parser.error("--budget expects CASE=MS with CASE one of %s" % ', '.join(sorted(budgets)))
+        budgets[name] = float(value)
+
+    results = run_cases(args)
+    for name, result in results.items():
+        budget = budgets.get(name)
+        print('%-18s median %8s ms  min %8s ms  budget %s' % (
+            name, result['median_ms'] if result['median_ms'] is not None else '-',
+            result['min_ms'] if result['min_ms'] is not None else '-',
+            '%.1f ms' % budget if budget is not None else '-'))
+        for entry in result['heaviest_self_ms']:
+            print('    %8.3f ms  %s' % (entry['self_ms'], entry['module']))
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', 'import_%s.json' % time.strftime('%Y%m%dT%H%M%S'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format_version': RESULT_FORMAT_VERSION,
+            'meta': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'created_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'budgets_ms': budgets,
+            },
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print('results written to %s' % output)
+
+    failures = check_budgets(results, budgets)
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+    print('all cases within budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic vSphere Payloads
+
+Deterministic generators for the data_structure_optimizer data classes. The
+same seed, count and depth always produce the same records, so benchmark
+runs on different commits measure identical inputs. Property keys are
+camelCase, as returned by the vSphere API, so normalize_data does real work.
+
+Version: 2.0.0
+Compatibility: Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import datetime
+import random
+from dataclasses import asdict
+
+from data_structure_optimizer import OperationResult, SessionData, VMwareResourceData
+
+EPOCH = datetime.datetime(2024, 1, 15, 8, 0, 0)
+RESOURCE_TYPES = ('VirtualMachine', 'Datastore', 'HostSystem', 'DistributedVirtualPortgroup', 'Folder')
+RESOURCE_STATES = ('creating', 'created', 'updating', 'updated', 'deleting', 'deleted', 'error')
+OPERATION_TYPES = ('vm_provision', 'network_config', 'disk_config', 'inventory_update')
+OPERATION_STATUSES = ('pending', 'running', 'completed', 'failed', 'cancelled')
+PROPERTY_KEYS = ('numCpu', 'memoryMB', 'guestId', 'powerState', 'ipAddress', 'hostName',
+                 'datastoreUrl', 'networkName', 'vmPathName', 'toolsStatus', 'overallStatus', 'instanceUuid')
+
+
+def _properties(rng, depth, breadth=3):
+    """Nested camelCase property tree, depth levels deep"""
+    node = {}
+    for key in rng.sample(PROPERTY_KEYS, 4):
+        node[key] = rng.choice((rng.randint(0, 65536), 'value-%d' % rng.randint(0, 9999), rng.random() < 0.5))
+    if depth > 1:
+        for index in range(breadth):
+            node['childConfig%d' % index] = _properties(rng, depth - 1, max(1, breadth - 1))
+    return node
+
+
+def resource(rng, index, depth):
+    created = EPOCH + datetime.timedelta(seconds=index)
+    return VMwareResourceData(
+        resource_id='vm-%d' % (1000 + index),
+        resource_type=rng.choice(RESOURCE_TYPES),
+        resource_name='dev-dc1-rhel9-app-%05d' % index,
+        resource_state=rng.choice(RESOURCE_STATES),
+        properties=_properties(rng, depth),
+        metadata={'clusterName': 'DEV-Cluster', 'datacenterName': 'DEV-DC', 'tagList': ['env:dev', 'tier:app']},
+        created_at=created,
+        updated_at=created + datetime.timedelta(seconds=rng.randint(1, 600)))
+
+
+def operation(rng, index, depth, changes=2):
+    start = EPOCH + datetime.timedelta(seconds=index * 5)
+    duration = round(rng.uniform(0.5, 300.0), 3)
+    success = rng.random() < 0.9
+    return OperationResult(
+        operation_id='op-%06d' % index,
+        operation_type=rng.choice(OPERATION_TYPES),
+        operation_name='Provision VM %d' % index,
+        status='completed' if success else 'failed',
+        start_time=start,
+        end_time=start + datetime.timedelta(seconds=duration),
+        duration_seconds=duration,
+        success=success,
+        error_message=None if success else 'Task timed out waiting for IP address',
+        warnings=['retry %d' % attempt for attempt in range(rng.randint(0, 2))],
+        results={'vmMoid': 'vm-%d' % (1000 + index), 'taskResult': _properties(rng, max(1, depth - 1))},
+        performance_metrics={'apiCalls': rng.randint(1, 40), 'waitSeconds': round(rng.uniform(0, 60), 2)},
+        resource_changes=[resource(rng, index * changes + offset, max(1, depth - 1)) for offset in range(changes)])
+
+
+def session(rng, index, depth, operations=5):
+    start = EPOCH + datetime.timedelta(minutes=index)
+    ops = [operation(rng, index * operations + offset, depth) for offset in range(operations)]
+    successful = sum(1 for op in ops if op.success)
+    return SessionData(
+        session_id='session-%06d' % index,
+        session_type='provisioning',
+        session_name='Wave %d' % index,
+        start_time=start,
+        end_time=start + datetime.timedelta(minutes=30),
+        operations=ops,
+        total_operations=len(ops),
+        successful_operations=successful,
+        failed_operations=len(ops) - successful,
+        session_metadata={'awxJobId': 1234 + index, 'launchedBy': 'aap'},
+        performance_summary={'totalSeconds': 1800.0, 'apiCalls': 120})
+
+
+GENERATORS = {
+    'vmware_resource': resource,
+    'operation_result': operation,
+    'session_data': session,
+}
+
+
+def generate(kind, count, depth=3, seed=2024):
+    """Generate count records of a kind as data class instances"""
+    rng = random.Random('%s:%d:%d:%d' % (kind, count, depth, seed))
+    factory = GENERATORS[kind]
+    return [factory(rng, index, depth) for index in range(count)]
+
+
+def to_payload(records):
+    """Records as the plain dicts a module receives (datetimes as ISO strings)"""
+    def encode(value):
+        if isinstance(value, dict):
+            return {key: encode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [encode(item) for item in value]
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return value
+    return [encode(asdict(record)) for record in records]
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Provisioning Throughput
+
+Runs a provisioning playbook (site.yml by default) once per VM against a
+local tools/mock_vcenter.py and reports end-to-end throughput: wall time,
+VMs per minute, per-run duration percentiles, vCenter calls per VM and per
+method, logins, faults, and the calls, logins and retry attempts of every
+role. Each run logs in with its VM name as user, so the mock's request log
+attributes every call to a run; the span_trace callback supplies the role
+boundaries and retry attempts of that run.
+
+Latency and failure injection are passed through to the mock, so the same
+harness shows how the playbooks behave when vCenter is slow or flaky.
+Results are written as JSON; --compare flags growth in calls or logins per
+VM (per role too) and drops in VMs per minute above --threshold.
+
+Usage:
+    python3 benchmarks/provision_throughput.py --vms 10 --parallel 5
+    python3 benchmarks/provision_throughput.py --vms 20 --latency-ms 30 --fail '*=0.02'
+    python3 benchmarks/provision_throughput.py --vms 10 --tags vm,disk --compare /tmp/throughput_before.json
+
+Version: 2.0.0
+Compatibility: Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import argparse
+import bisect
+import concurrent.futures
+import datetime
+import glob
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+MOCK_VCENTER = os.path.join(PROJECT_DIR, 'tools', 'mock_vcenter.py')
+CALLBACK_DIR = os.path.join(PROJECT_DIR, 'callback_plugins')
+
+RESULT_FORMAT_VERSION = 1
+OUTSIDE_ROLES = '(no role)'
+MOCK_START_TIMEOUT = 60
+
+# Options forwarded verbatim to tools/mock_vcenter.py
+MOCK_OPTIONS = (
+    ('hosts', '--hosts'), ('latency_ms', '--latency-ms'), ('jitter_ms', '--jitter-ms'),
+    ('method_latency', '--method-latency'), ('task_seconds', '--task-seconds'),
+    ('task_duration', '--task-duration'), ('fail', '--fail'), ('task_fail', '--task-fail'),
+    ('tools_seconds', '--tools-seconds'), ('guest_ip_seconds', '--guest-ip-seconds'),
+    ('boot_spread_seconds', '--boot-spread-seconds'),
+    ('page_size', '--page-size'), ('seed', '--seed'),
+)
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a non-empty sample list"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(args, port, work_dir, log_file):
+    """Start tools/mock_vcenter.py and wait until it listens"""
+    command = [sys.executable, MOCK_VCENTER, '--port', str(port), '--env', args.env, '--location', args.location,
+               '--log-file', log_file]
+    for attribute, option in MOCK_OPTIONS:
+        value = getattr(args, attribute)
+        if value is None:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            command.extend([option, str(item)])
+    output_path = os.path.join(work_dir, 'mock_vcenter.out')
+    with open(output_path, 'w', encoding='utf-8') as output:
+        process = subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT)
+    deadline = time.time() + MOCK_START_TIMEOUT
+    while time.time() < deadline and process.poll() is None:
+        with open(output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('mock_vcenter:'):
+                    print(line.rstrip())
+                    return process
+        time.sleep(0.2)
+    process.kill()
+    with open(output_path, 'r', encoding='utf-8') as f:
+        raise SystemExit("mock_vcenter did not start:\n%s" % f.read())
+
+
+def mock_stats(port):
+    """Counters served by the mock at /_stats"""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    with urllib.request.urlopen('https://127.0.0.1:%d/_stats' % port, context=context, timeout=10) as response:
+        return json.load(response)
+
+
+def run_playbook(args, vm_name, port, work_dir):
+    """One ansible-playbook run provisioning vm_name; returns its run record"""
+    trace_dir = os.path.join(work_dir, 'traces', vm_name)
+    env = dict(os.environ, VMWARE_PORT=str(port), ANSIBLE_SPAN_TRACE_DIR=trace_dir,
+               ANSIBLE_CALLBACKS_ENABLED=','.join(filter(None, [os.environ.get('ANSIBLE_CALLBACKS_ENABLED'),
+                                                                'span_trace'])),
+               ANSIBLE_CALLBACK_PLUGINS=os.pathsep.join(filter(None, [os.environ.get('ANSIBLE_CALLBACK_PLUGINS'),
+                                                                      CALLBACK_DIR])))
+    # site.yml reads vcenter_host, vm_provision.yml and the other standalone playbooks assert
+    # vcenter_hostname and a vm_definitions list
+    extra_vars = {
+        'env': args.env, 'location': args.location, 'domain': args.domain, 'vm_os': args.vm_os,
+        'vm_name': vm_name, 'vm_definitions': [{'name': vm_name}],
+        'vcenter_host': '127.0.0.1', 'vcenter_hostname': '127.0.0.1', 'vcenter_username': vm_name,
+        'vcenter_password': 'mock',
+    }
+    command = ['ansible-playbook', args.playbook, '-e', json.dumps(extra_vars)]
+    for extra in args.extra_vars or []:
+        command.extend(['-e', extra])
+    if args.tags:
+        command.extend(['--tags', args.tags])
+    if args.skip_tags:
+        command.extend(['--skip-tags', args.skip_tags])
+
+    log_path = os.path.join(work_dir, 'logs', vm_name + '.log')
+    started = time.time()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        returncode = subprocess.call(command, cwd=PROJECT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    finished = time.time()
+    return {'vm_name': vm_name, 'returncode': returncode, 'started': started, 'finished': finished,
+            'seconds': round(finished - started, 3), 'log': log_path, 'trace_dir': trace_dir}
+
+
+def load_requests(log_file):
+    """Mock request log lines, with the user of each session filled in"""
+    requests = []
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                requests.append(json.loads(line))
+    users = {request['session']: request['user'] for request in requests if request.get('user')}
+    for request in requests:
+        request['user'] = request.get('user') or users.get(request['session'])
+    return requests
+
+
+def load_roles(trace_dir):
+    """Role intervals (epoch seconds, sorted by start) and retry attempts per role of one run"""
+    events = []
+    for path in glob.glob(os.path.join(trace_dir, 'span_trace_*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            events.extend(event for event in json.load(f).get('traceEvents', []) if event.get('ph') == 'X')
+    by_id = {event['args'].get('span_id'): event for event in events}
+
+    def role_of(event):
+        while event is not None:
+            if event.get('cat') == 'role':
+                return event['name']
+            event = by_id.get(event['args'].get('parent_id'))
+        return OUTSIDE_ROLES
+
+    intervals = sorted((event['ts'] / 1e6, (event['ts'] + event['dur']) / 1e6, event['name'])
+                       for event in events if event.get('cat') == 'role')
+    retries = {}
+    for event in events:
+        if event.get('cat') == 'retry' and event['args'].get('attempt', 1) > 1:
+            role = role_of(event)
+            retries[role] = retries.get(role, 0) + 1
+    return intervals, retries
+
+
+def role_at(intervals, starts, moment):
+    index = bisect.bisect_right(starts, moment) - 1
+    if index >= 0 and moment <= intervals[index][1]:
+        return intervals[index][2]
+    return OUTSIDE_ROLES
+
+
+def summarize(args, runs, requests, wall_seconds, stats):
+    vm_count = len(runs)
+    by_user = {}
+    for request in requests:
+        by_user.setdefault(request['user'], []).append(request)
+
+    methods = {}
+    roles = {}
+    for run in runs:
+        intervals, retries = load_roles(run['trace_dir'])
+        starts = [interval[0] for interval in intervals]
+        run_requests = by_user.get(run['vm_name'], [])
+        run['vcenter_calls'] = len(run_requests)
+        run['logins'] = sum(1 for request in run_requests if request['method'] == 'Login')
+        run['faults'] = sum(1 for request in run_requests if request['status'] != 'ok')
+        for start, end, name in intervals:
+            role = roles.setdefault(name, {'calls': 0, 'logins': 0, 'faults': 0, 'retries': 0, 'seconds': 0.0})
+            role['seconds'] += end - start
+        for role_name, count in retries.items():
+            roles.setdefault(role_name, {'calls': 0, 'logins': 0, 'faults': 0, 'retries': 0, 'seconds': 0.0})
+            roles[role_name]['retries'] += count
+        for request in run_requests:
+            methods[request['method']] = methods.get(request['method'], 0) + 1
+            role = roles.setdefault(role_at(intervals, starts, request['time']),
+                                    {'calls': 0, 'logins': 0, 'faults': 0, 'retries': 0, 'seconds': 0.0})
+            role['calls'] += 1
+            role['logins'] += request['method'] == 'Login'
+            role['faults'] += request['status'] != 'ok'
+
+    succeeded = sum(1 for run in runs if run['returncode'] == 0)
+    durations = [run['seconds'] for run in runs]
+    calls = sum(run['vcenter_calls'] for run in runs)
+    return {
+        'format_version': RESULT_FORMAT_VERSION,
+        'meta': {
+            'playbook': args.playbook, 'env': args.env, 'location': args.location, 'vm_os': args.vm_os,
+            'tags': args.tags, 'skip_tags': args.skip_tags, 'parallel': args.parallel,
+            'latency_ms': args.latency_ms, 'fail': args.fail, 'task_fail': args.task_fail,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        },
+        'summary': {
+            'vms': vm_count,
+            'succeeded': succeeded,
+            'failed': vm_count - succeeded,
+            'wall_seconds': round(wall_seconds, 3),
+            'vms_per_minute': round(succeeded * 60.0 / wall_seconds, 3) if wall_seconds else 0.0,
+            'run_p50_seconds': percentile(durations, 0.50) if durations else None,
+            'run_p95_seconds': percentile(durations, 0.95) if durations else None,
+            'run_max_seconds': max(durations) if durations else None,
+            'vcenter_calls': calls,
+            'calls_per_vm': round(calls / vm_count, 2) if vm_count else 0.0,
+            'logins_per_vm': round(sum(run['logins'] for run in runs) / vm_count, 2) if vm_count else 0.0,
+            'faults': sum(run['faults'] for run in runs),
+            'injected_failures': stats.get('injected_failures', 0),
+            'injected_task_failures': stats.get('injected_task_failures', 0),
+            'unsupported_methods': stats.get('unsupported', {}),
+            'tasks': stats.get('tasks', {}),
+        },
+        'methods_per_vm': {method: round(count / vm_count, 2) for method, count in sorted(methods.items())},
+        'roles': {name: {'calls_per_vm': round(role['calls'] / vm_count, 2),
+                         'logins_per_vm': round(role['logins'] / vm_count, 2),
+                         'faults': role['faults'],
+                         'retries': role['retries'],
+                         'mean_seconds': round(role['seconds'] / vm_count, 3)}
+                  for name, role in sorted(roles.items())},
+        'runs': [{key: run[key] for key in ('vm_name', 'returncode', 'seconds', 'vcenter_calls', 'logins',
+                                            'faults', 'log')} for run in runs],
+    }
+
+
+def report(result):
+    summary = result['summary']
+    print('vms %(vms)d  succeeded %(succeeded)d  failed %(failed)d  wall %(wall_seconds).1f s  '
+          '%(vms_per_minute).2f VMs/min  run p50 %(run_p50_seconds)s s  p95 %(run_p95_seconds)s s' % summary)
+    print('vcenter calls %(vcenter_calls)d  per VM %(calls_per_vm).1f  logins per VM %(logins_per_vm).1f  '
+          'faults %(faults)d  injected %(injected_failures)d' % summary)
+    if summary['unsupported_methods']:
+        print('unsupported by the mock: %s' % ', '.join(summary['unsupported_methods']))
+    print('%-32s %12s %12s %8s %8s %10s' % ('role', 'calls/VM', 'logins/VM', 'faults', 'retries', 'mean s'))
+    for name, role in result['roles'].items():
+        print('%-32s %12.1f %12.1f %8d %8d %10.2f' % (name, role['calls_per_vm'], role['logins_per_vm'],
+                                                       role['faults'], role['retries'], role['mean_seconds']))
+    print('%-32s %12s' % ('method', 'calls/VM'))
+    for method, count in sorted(result['methods_per_vm'].items(), key=lambda item: -item[1]):
+        print('%-32s %12.1f' % (method, count))
+
+
+def compare(current, baseline, threshold):
+    """Metrics that moved the wrong way by more than threshold"""
+    regressions = []
+
+    def check(name, before, after, higher_is_worse=True):
+        if not before or after is None:
+            return
+        change = (after - before) / before
+        if (change if higher_is_worse else -change) > threshold:
+            regressions.append({'metric': name, 'baseline': before, 'current': after,
+                                'change_percent': round(change * 100, 1)})
+
+    for metric in ('calls_per_vm', 'logins_per_vm'):
+        check(metric, baseline['summary'].get(metric), current['summary'].get(metric))
+    check('vms_per_minute', baseline['summary'].get('vms_per_minute'), current['summary'].get('vms_per_minute'),
+          higher_is_worse=False)
+    for name, base in baseline.get('roles', {}).items():
+        role = current['roles'].get(name, {})
+        for metric in ('calls_per_vm', 'logins_per_vm'):
+            check('%s.%s' % (name, metric), base.get(metric), role.get(metric))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provisioning throughput against a local mock vCenter")
+    parser.add_argument('--vms', type=int, default=5, help="VMs to provision (one playbook run each)")
+    parser.add_argument('--parallel', type=int, default=1, help="Concurrent playbook runs")
+    parser.add_argument('--playbook', default='site.yml')
+    parser.add_argument('--env', default='dev')
+    parser.add_argument('--location', default='dc1')
+    parser.add_argument('--domain', default='example.com')
+    parser.add_argument('--vm-os', default='rhel9')
+    parser.add_argument('--name-prefix', default=None, help="VM name prefix (default: <env>-<location>-<os>-perf)")
+    parser.add_argument('--tags', default=None, help="Passed to ansible-playbook --tags")
+    parser.add_argument('--skip-tags', default=None, help="Passed to ansible-playbook --skip-tags")
+    parser.add_argument('-e', '--extra-vars', action='append', default=None, help="Extra vars for every run")
+    parser.add_argument('--hosts', type=int, default=None, help="ESXi hosts in the mock cluster")
+    parser.add_argument('--latency-ms', type=float, default=None)
+    parser.add_argument('--jitter-ms', type=float, default=None)
+    parser.add_argument('--method-latency', action='append', default=None, metavar='METHOD=MS')
+    parser.add_argument('--task-seconds', type=float, default=None)
+    parser.add_argument('--task-duration', action='append', default=None, metavar='METHOD=SECONDS')
+    parser.add_argument('--fail', action='append', default=None, metavar='METHOD=RATE')
+    parser.add_argument('--task-fail', action='append', default=None, metavar='METHOD=RATE')
+    parser.add_argument('--tools-seconds', type=float, default=None)
+    parser.add_argument('--guest-ip-seconds', type=float, default=None)
+    parser.add_argument('--boot-spread-seconds', type=float, default=None)
+    parser.add_argument('--page-size', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--work-dir', default=None, help="Keep run logs, traces and the mock log here")
+    parser.add_argument('--output', default=None,
+                        help="Result file (default: benchmarks/results/throughput_<timestamp>.json)")
+    parser.add_argument('--compare', default=None, help="Earlier result to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Allowed relative growth of calls and logins per VM and drop in VMs/min (default 0.10)")
+    args = parser.parse_args()
+
+    if shutil.which('ansible-playbook') is None:
+        raise SystemExit("ansible-playbook not found in PATH")
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='provision_throughput_')
+    os.makedirs(os.path.join(work_dir, 'logs'), exist_ok=True)
+    log_file = os.path.join(work_dir, 'vcenter_requests.jsonl')
+    if os.path.exists(log_file):
+        os.remove(log_file)
+
+    prefix = args.name_prefix or re.sub(r'[^a-z0-9-]', '-', '%s-%s-%s-perf' % (args.env, args.location, args.vm_os))
+    vm_names = ['%s-%03d' % (prefix, index) for index in range(1, args.vms + 1)]
+    port = free_port()
+    mock = start_mock(args, port, work_dir, log_file)
+    try:
+        started = time.time()
+        runs = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+            futures = [pool.submit(run_playbook, args, vm_name, port, work_dir) for vm_name in vm_names]
+            for future in concurrent.futures.as_completed(futures):
+                run = future.result()
+                runs.append(run)
+                print('%-40s rc=%d %8.1f s' % (run['vm_name'], run['returncode'], run['seconds']))
+        wall_seconds = time.time() - started
+        stats = mock_stats(port)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    runs.sort(key=lambda run: run['vm_name'])
+    requests = load_requests(log_file)
+    result = summarize(args, runs, requests, wall_seconds, stats)
+    result['meta']['work_dir'] = work_dir
+    report(result)
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', time.strftime('throughput_%Y%m%dT%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print('results written to %s (run logs and traces in %s)' % (output, work_dir))
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        for regression in regressions:
+            print('REGRESSION %(metric)s %(baseline)s -> %(current)s (%(change_percent)+.1f%%)' % regression)
+        if regressions:
+            sys.exit(1)
+        print('no regressions above %.0f%% against %s' % (args.threshold * 100, args.compare))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Callback Plugin: Span Trace
+
+Records monotonic-clock spans for every play, role, task and retry attempt of
+a run, nests the vCenter call spans returned by modules (see
+module_utils/span_timer.py) under the task that made them, and links spans to
+the call chain opened by call_stack_manager through C(call_chain_id). The
+trace is exported when the playbook finishes in the Chrome trace event format
+(chrome://tracing, Perfetto) or as OTLP JSON.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+    name: span_trace
+    type: aggregate
+    short_description: Exports monotonic timing spans of a run as a trace file
+    description:
+        - Times plays, roles, tasks and retry attempts per host with the controller's monotonic clock
+        - Nests the C(vcenter_spans) returned by instrumented modules under their task
+        - Opens a span per call chain frame reported by call_stack_manager and links the role and task spans to it
+        - Writes the trace when the playbook ends
+    version_added: "2.0.0"
+    author:
+        - VMware Provisioning Team
+    requirements:
+        - Enable the callback in C(callbacks_enabled) or C(ANSIBLE_CALLBACKS_ENABLED)
+    options:
+        output_dir:
+            description: Directory the trace file is written to
+            default: /tmp/ansible_span_trace
+            type: path
+            env:
+                - name: ANSIBLE_SPAN_TRACE_DIR
+            ini:
+                - section: callback_span_trace
+                  key: output_dir
+        trace_format:
+            description:
+                - C(chrome) writes Chrome trace events, C(otlp) writes OTLP JSON resource spans
+            default: chrome
+            type: str
+            choices: ['chrome', 'otlp']
+            env:
+                - name: ANSIBLE_SPAN_TRACE_FORMAT
+            ini:
+                - section: callback_span_trace
+                  key: trace_format
+'''
+
+import datetime
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from ansible.plugins.callback import CallbackBase
+
+SPAN_RESULT_KEY = 'vcenter_spans'
+
+CONTROLLER = 'controller'
+LANE_TASKS = 'tasks'
+LANE_CHAIN = 'call chain'
+
+
+class _HostState:
+    """Open spans of one host"""
+
+    def __init__(self):
+        self.role: Optional[str] = None
+        self.role_span: Optional[int] = None
+        self.chain: List[int] = []
+        self.tasks: Dict[str, int] = {}
+        self.attempts: Dict[str, int] = {}
+
+
+class CallbackModule(CallbackBase):
+    """Span recorder and trace exporter"""
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'span_trace'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display=display)
+        self._epoch_origin = time.time()
+        self._mono_origin = time.perf_counter()
+        self._spans: List[Dict[str, Any]] = []
+        self._hosts: Dict[str, _HostState] = {}
+        self._playbook_span: Optional[int] = None
+        self._play_span: Optional[int] = None
+        self._playbook_name = 'playbook'
+
+    # Span bookkeeping
+
+    def _now(self) -> float:
+        """Monotonic clock reading"""
+        return time.perf_counter()
+
+    def _from_epoch(self, epoch: float) -> float:
+        """Convert an epoch timestamp reported by a module to the monotonic scale"""
+        return self._mono_origin + (epoch - self._epoch_origin)
+
+    def _open(self, name: str, category: str, parent: Optional[int], host: str = CONTROLLER,
+              lane: str = LANE_TASKS, start: Optional[float] = None, **attributes: Any) -> int:
+        """Open a span and return its id"""
+        span_id = len(self._spans)
+        self._spans.append({
+            'id': span_id,
+            'parent': parent,
+            'name': name,
+            'category': category,
+            'host': host,
+            'lane': lane,
+            'start': self._now() if start is None else start,
+            'end': None,
+            'status': 'ok',
+            'attributes': attributes,
+        })
+        return span_id
+
+    def _close(self, span_id: Optional[int], status: Optional[str] = None,
+               end: Optional[float] = None) -> None:
+        """Close a span once; later calls keep the first end time"""
+        if span_id is None:
+            return
+        span = self._spans[span_id]
+        if span['end'] is None:
+            span['end'] = self._now() if end is None else end
+        if status is not None:
+            span['status'] = status
+
+    def _host(self, name: str) -> _HostState:
+        """Per-host state, created on first use"""
+        if name not in self._hosts:
+            self._hosts[name] = _HostState()
+        return self._hosts[name]
+
+    def _chain_parent(self, state: _HostState) -> Optional[int]:
+        """Innermost open call chain span of a host, else the play"""
+        return state.chain[-1] if state.chain else self._play_span
+
+    def _close_roles(self) -> None:
+        """Close the open role span of every host"""
+        for state in self._hosts.values():
+            self._close(state.role_span)
+            state.role, state.role_span = None, None
+
+    # Playbook and play
+
+    def v2_playbook_on_start(self, playbook):
+        self._playbook_name = os.path.splitext(os.path.basename(playbook._file_name))[0]
+        self._playbook_span = self._open(self._playbook_name, 'playbook', None,
+                                         playbook=playbook._file_name)
+
+    def v2_playbook_on_play_start(self, play):
+        self._close_roles()
+        self._close(self._play_span)
+        self._play_span = self._open(play.get_name().strip() or 'play', 'play', self._playbook_span)
+
+    # Tasks and roles
+
+    def v2_runner_on_start(self, host, task):
+        host_name = host.get_name()
+        state = self._host(host_name)
+        role = task._role.get_name() if task._role else None
+        if role != state.role:
+            self._close(state.role_span)
+            state.role = role
+            state.role_span = None
+            if role:
+                state.role_span = self._open(role, 'role', self._chain_parent(state), host_name)
+        parent = state.role_span if state.role_span is not None else self._chain_parent(state)
+        attributes = {'action': task.action}
+        if state.chain:
+            attributes['call_chain_id'] = self._spans[state.chain[-1]]['name']
+        state.tasks[task._uuid] = self._open(task.get_name().strip(), 'task', parent, host_name,
+                                             **attributes)
+
+    def v2_runner_retry(self, result):
+        host_name = result._host.get_name()
+        state = self._host(host_name)
+        task_span = state.tasks.get(result._task._uuid)
+        if task_span is None:
+            return
+        attempt = result._result.get('attempts', 1)
+        previous = state.attempts.get(result._task._uuid)
+        if previous is None:
+            previous = self._open('attempt 1', 'retry', task_span, host_name,
+                                  start=self._spans[task_span]['start'], attempt=1)
+        self._close(previous, 'error')
+        state.attempts[result._task._uuid] = self._open(
+            'attempt %d' % (attempt + 1), 'retry', task_span, host_name, attempt=attempt + 1)
+
+    def _finish_task(self, result, status: str) -> None:
+        """Close the task span and attach the spans reported by the module"""
+        host_name = result._host.get_name()
+        state = self._host(host_name)
+        task_uuid = result._task._uuid
+        task_span = state.tasks.pop(task_uuid, None)
+        attempt_span = state.attempts.pop(task_uuid, None)
+        if task_span is None:
+            return
+        self._close(attempt_span, status)
+        self._close(task_span, status)
+
+        payload = result._result
+        module_parent = attempt_span if attempt_span is not None else task_span
+        for item in [payload] + list(payload.get('results') or []):
+            if isinstance(item, dict):
+                self._add_module_spans(item.get(SPAN_RESULT_KEY) or [], module_parent, host_name)
+        self._track_call_chain(payload.get('ansible_facts') or {}, state, host_name)
+
+    def _add_module_spans(self, spans: List[Dict[str, Any]], parent: int, host_name: str) -> None:
+        """Rebase module spans onto the controller clock, keeping their nesting"""
+        local_ids: Dict[Any, int] = {}
+        for span in spans:
+            start = self._from_epoch(float(span.get('start', 0.0)))
+            span_id = self._open(span.get('name', 'call'), span.get('category', 'vcenter'),
+                                 local_ids.get(span.get('parent'), parent), host_name,
+                                 start=start, **(span.get('attributes') or {}))
+            self._close(span_id, span.get('status', 'ok'),
+                        end=start + float(span.get('duration', 0.0)))
+            local_ids[span.get('id')] = span_id
+
+    def _track_call_chain(self, facts: Dict[str, Any], state: _HostState, host_name: str) -> None:
+        """Mirror the call chain stack reported by call_chain_tracker"""
+        if 'call_stack_depth' not in facts:
+            return
+        depth = int(facts['call_stack_depth'])
+        opened = facts.get('call_chain_id') if 'call_stack_handle' in facts else None
+        keep = depth - 1 if opened else depth
+        while len(state.chain) > max(keep, 0):
+            self._close(state.chain.pop())
+        if opened:
+            parent = state.chain[-1] if state.chain else self._playbook_span
+            state.chain.append(self._open(opened, 'call_chain', parent, host_name, LANE_CHAIN,
+                                          call_chain_id=opened))
+
+    def v2_runner_on_ok(self, result):
+        self._finish_task(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._finish_task(result, 'error')
+
+    def v2_runner_on_skipped(self, result):
+        self._finish_task(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._finish_task(result, 'error')
+
+    # Export
+
+    def v2_playbook_on_stats(self, stats):
+        self._close_roles()
+        for state in self._hosts.values():
+            for span_id in list(state.tasks.values()) + list(state.attempts.values()) + state.chain:
+                self._close(span_id)
+        self._close(self._play_span)
+        self._close(self._playbook_span)
+
+        output_dir = self.get_option('output_dir')
+        trace_format = self.get_option('trace_format')
+        stamp = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        if trace_format == 'otlp':
+            path = os.path.join(output_dir, 'span_trace_%s_%s.otlp.json' % (self._playbook_name, stamp))
+            document = self._otlp_document()
+        else:
+            path = os.path.join(output_dir, 'span_trace_%s_%s.json' % (self._playbook_name, stamp))
+            document = self._chrome_document()
+
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(document, f, separators=(',', ':'), default=str)
+        except (IOError, OSError) as e:
+            self._display.warning("span_trace: could not write %s: %s" % (path, e))
+            return
+        self._display.display("span_trace: wrote %d spans to %s" % (len(self._spans), path))
+
+    def _epoch_us(self, mono: float) -> int:
+        """Monotonic reading as epoch microseconds"""
+        return int((self._epoch_origin + (mono - self._mono_origin)) * 1000000)
+
+    def _chrome_document(self) -> Dict[str, Any]:
+        """Chrome trace events, one thread per host and lane"""
+        threads: Dict[Any, int] = {}
+        events: List[Dict[str, Any]] = []
+        for span in self._spans:
+            lane = (span['host'], span['lane'])
+            if lane not in threads:
+                threads[lane] = len(threads) + 1
+                label = span['host'] if span['lane'] == LANE_TASKS else "%s (%s)" % lane
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1,
+                               'tid': threads[lane], 'args': {'name': label}})
+            args = dict(span['attributes'], span_id=span['id'], parent_id=span['parent'],
+                        status=span['status'])
+            events.append({
+                'name': span['name'],
+                'cat': span['category'],
+                'ph': 'X',
+                'ts': self._epoch_us(span['start']),
+                'dur': max(int((span['end'] - span['start']) * 1000000), 0),
+                'pid': 1,
+                'tid': threads[lane],
+                'args': args,
+            })
+        events.insert(0, {'name': 'process_name', 'ph': 'M', 'pid': 1,
+                          'args': {'name': self._playbook_name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def _otlp_document(self) -> Dict[str, Any]:
+        """OTLP JSON export of all spans under a single trace id"""
+        trace_id = uuid.uuid4().hex
+
+        def span_hex(span_id):
+            return '%016x' % (span_id + 1)
+
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {'key': key, 'value': {'boolValue': value}}
+            if isinstance(value, int):
+                return {'key': key, 'value': {'intValue': str(value)}}
+            if isinstance(value, float):
+                return {'key': key, 'value': {'doubleValue': value}}
+            return {'key': key, 'value': {'stringValue': str(value)}}
+
+        spans = []
+        for span in self._spans:
+            attributes = dict(span['attributes'], host=span['host'], category=span['category'])
+            record = {
+                'traceId': trace_id,
+                'spanId': span_hex(span['id']),
+                'name': span['name'],
+                'kind': 1,
+                'startTimeUnixNano': str(self._epoch_us(span['start']) * 1000),
+                'endTimeUnixNano': str(self._epoch_us(span['end']) * 1000),
+                'attributes': [attribute(key, value) for key, value in attributes.items()],
+                'status': {'code': 2 if span['status'] == 'error' else 1},
+            }
+            if span['parent'] is not None:
+                record['parentSpanId'] = span_hex(span['parent'])
+            spans.append(record)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [attribute('service.name', 'vmware_provision'),
+                                        attribute('playbook', self._playbook_name)]},
+            'scopeSpans': [{'scope': {'name': self.CALLBACK_NAME, 'version': '2.0.0'},
+                            'spans': spans}],
+        }]}
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: AAP Conflict Resolver
+
+Resolves every local/platform state conflict of a sync in one pass. The
+conflict list is indexed by state key once, missing values are looked up in
+the local and platform snapshots, and the chosen strategy is applied per key
+in a single loop, producing the merged local state, the platform updates to
+queue, manual review artifacts and a resolution log.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: aap_conflict_resolver
+short_description: Resolve AAP state conflicts in one pass
+description:
+    - Applies one resolution strategy to the full list of conflicts found by a sync
+    - Conflicts are keyed by state key (C(conflict_type) without C(_mismatch)); a later conflict for the same key supersedes an earlier one, which is logged as C(superseded) and counted in C(stats.superseded)
+    - Conflict values missing from an entry are read from the C(local_state) / C(platform_state) snapshots
+    - Returns the merged local state, the platform updates to queue, manual review artifacts and a resolution log
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    conflicts:
+        description:
+            - Conflicts with C(conflict_type), C(severity) and optionally C(local_state), C(platform_state), C(local_timestamp), C(platform_timestamp) and C(detected_at)
+        required: true
+        type: list
+        elements: dict
+    strategy:
+        description:
+            - Resolution strategy
+        required: false
+        type: str
+        choices: ['platform_wins', 'local_wins', 'manual_review', 'merge_strategy', 'timestamp_based']
+        default: platform_wins
+    local_state:
+        description:
+            - Local state snapshot, keyed by state key
+        required: false
+        type: dict
+        default: {}
+    platform_state:
+        description:
+            - Platform state snapshot, keyed by state key
+        required: false
+        type: dict
+        default: {}
+    allow_platform_updates:
+        description:
+            - Allow strategies to produce platform updates; C(local_wins) resolves nothing without it
+        required: false
+        type: bool
+        default: false
+    local_priority_types:
+        description:
+            - Conflict types where the local value wins under C(merge_strategy)
+        required: false
+        type: list
+        elements: str
+        default: []
+    mergeable_types:
+        description:
+            - Conflict types C(merge_strategy) resolves
+        required: false
+        type: list
+        elements: str
+        default: ['job_status_mismatch']
+    manual_review_timeout:
+        description:
+            - Seconds until a manual review artifact is due
+        required: false
+        type: int
+        default: 3600
+    resolution_id:
+        description:
+            - Identifier of this resolution, generated from the current time when omitted
+        required: false
+        type: str
+'''
+
+EXAMPLES = r'''
+- name: Resolve conflicts
+  aap_conflict_resolver:
+    conflicts: "{{ aap_sync_conflicts }}"
+    strategy: platform_wins
+    local_state: "{{ aap_state_local_updates | default({}) }}"
+    platform_state: "{{ aap_job_state | default({}) }}"
+  register: aap_conflict_resolution
+'''
+
+RETURN = r'''
+resolution_id:
+    description: Identifier of this resolution
+    type: str
+    returned: always
+merged_state:
+    description: Local state snapshot with the resolved values applied
+    type: dict
+    returned: always
+local_updates:
+    description: State keys changed locally and their new values
+    type: dict
+    returned: always
+platform_updates:
+    description: State keys to push to the platform and their local values
+    type: dict
+    returned: always
+resolution_actions:
+    description: Resolution log, one entry per handled conflict
+    type: list
+    returned: always
+manual_review_artifacts:
+    description: Conflicts left for manual review
+    type: list
+    returned: always
+stats:
+    description: Counts of processed, resolved, skipped, pending, failed and superseded conflicts, and the execution time; processed is the sum of unique_keys and superseded; a conflict with malformed data, such as an unparsable timestamp, counts as failed and is logged as C(resolution_failed)
+    type: dict
+    returned: always
+    sample: {"processed": 3, "unique_keys": 2, "resolved": 2, "skipped": 0, "pending_review": 0, "failed": 0, "superseded": 1,
+             "execution_time": 0.001}
+'''
+
+import datetime
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+
+EPOCH = '1970-01-01T00:00:00Z'
+
+
+def state_key(conflict_type):
+    """'job_status_mismatch' -> 'job_status'"""
+    return conflict_type.replace('_mismatch', '')
+
+
+def _iso(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_timestamp(value):
+    """Parse an AAP / ansible_date_time ISO timestamp into an aware datetime; ValueError if malformed"""
+    text = str(value or EPOCH).strip().replace('Z', '+00:00')
+    try:
+        moment = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            moment = datetime.datetime.strptime(text[:19], '%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            raise ValueError("invalid timestamp %r" % (value,))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment
+
+
+def index_conflicts(conflicts, local_state, platform_state):
+    """Key conflicts by state key, filling missing values from the snapshots
+
+    Returns the indexed conflicts and the earlier conflicts a later one for the
+    same key superseded, each with the position of the conflict that replaced it.
+    """
+    indexed = {}
+    superseded = []
+    for position, conflict in enumerate(conflicts):
+        key = state_key(conflict['conflict_type'])
+        entry = dict(conflict, key=key, position=position)
+        if 'local_state' not in entry:
+            entry['local_state'] = local_state.get(key)
+        if 'platform_state' not in entry:
+            entry['platform_state'] = platform_state.get(key)
+        if key in indexed:
+            superseded.append(dict(indexed[key], superseded_by=position))
+        indexed[key] = entry
+    return indexed, superseded
+
+
+class ConflictResolver:
+    """Applies one strategy over indexed conflicts"""
+
+    def __init__(self, params, now=None):
+        self.params = params
+        self.now = now or datetime.datetime.now(datetime.timezone.utc)
+        self.timestamp = _iso(self.now)
+        self.resolution_id = params.get('resolution_id') or 'resolve_%s' % self.now.strftime('%Y%m%d_%H%M%S')
+        self.local_updates = {}
+        self.platform_updates = {}
+        self.actions = []
+        self.artifacts = []
+        self.skipped = 0
+        self.failed = 0
+        self.local_priority = set(params.get('local_priority_types') or ())
+        self.mergeable = set(params.get('mergeable_types') or ())
+
+    def _log(self, action, conflict, **details):
+        entry = {'action': action, 'conflict_type': conflict['conflict_type'], 'timestamp': self.timestamp}
+        entry.update(details)
+        self.actions.append(entry)
+
+    def platform_wins(self, conflict):
+        if conflict.get('severity') not in ('warning', 'error'):
+            return False
+        self.local_updates[conflict['key']] = conflict['platform_state']
+        self._log('platform_wins', conflict, old_value=conflict['local_state'], new_value=conflict['platform_state'])
+        return True
+
+    def local_wins(self, conflict):
+        if conflict.get('severity') not in ('warning', 'error') or not self.params.get('allow_platform_updates'):
+            return False
+        self.platform_updates[conflict['key']] = conflict['local_state']
+        self._log('local_wins', conflict, old_value=conflict['platform_state'], new_value=conflict['local_state'])
+        return True
+
+    def timestamp_based(self, conflict):
+        if 'platform_timestamp' not in conflict or 'local_timestamp' not in conflict:
+            return False
+        try:
+            newer_platform = parse_timestamp(conflict['platform_timestamp']) > parse_timestamp(conflict['local_timestamp'])
+        except ValueError as e:
+            raise ValueError("conflict %d (%s): %s" % (conflict['position'], conflict['conflict_type'], e))
+        resolution = 'platform_wins' if newer_platform else 'local_wins'
+        if newer_platform:
+            self.local_updates[conflict['key']] = conflict['platform_state']
+        else:
+            self.platform_updates[conflict['key']] = conflict['local_state']
+        self._log('timestamp_based_' + resolution, conflict,
+                  platform_timestamp=conflict['platform_timestamp'], local_timestamp=conflict['local_timestamp'],
+                  resolution=resolution)
+        return True
+
+    def merge_strategy(self, conflict):
+        if conflict['conflict_type'] not in self.mergeable:
+            return False
+        local_first = conflict['conflict_type'] in self.local_priority
+        merged = conflict['local_state'] if local_first else conflict['platform_state']
+        self.local_updates[conflict['key']] = merged
+        self._log('merge_strategy', conflict, local_value=conflict['local_state'],
+                  platform_value=conflict['platform_state'], merged_value=merged, merge_logic='priority_based')
+        return True
+
+    def manual_review(self, conflict):
+        if conflict.get('severity') != 'error':
+            return False
+        artifact_id = '%s_%d' % (self.resolution_id, conflict['position'])
+        deadline = self.now + datetime.timedelta(seconds=self.params.get('manual_review_timeout') or 3600)
+        self.artifacts.append({
+            'conflict_id': artifact_id,
+            'conflict_type': conflict['conflict_type'],
+            'severity': conflict['severity'],
+            'local_state': conflict['local_state'],
+            'platform_state': conflict['platform_state'],
+            'detected_at': conflict.get('detected_at'),
+            'review_required': True,
+            'review_deadline': _iso(deadline),
+            'escalation_level': 'standard',
+        })
+        self._log('manual_review_required', conflict, review_artifact_id=artifact_id)
+        return False
+
+    def resolve(self, indexed, superseded=()):
+        """Apply the strategy to every conflict; returns the number resolved"""
+        apply = getattr(self, self.params['strategy'])
+        resolved = 0
+        for conflict in superseded:
+            self._log('superseded', conflict, position=conflict['position'], superseded_by=conflict['superseded_by'],
+                      local_value=conflict['local_state'], platform_value=conflict['platform_state'])
+        for conflict in sorted(indexed.values(), key=lambda entry: entry['position']):
+            try:
+                applied = apply(conflict)
+            except ValueError as e:
+                # Malformed conflict data fails that conflict only
+                self.failed += 1
+                self._log('resolution_failed', conflict, position=conflict['position'], error=str(e))
+                continue
+            if applied:
+                resolved += 1
+            elif self.params['strategy'] != 'manual_review' or conflict.get('severity') != 'error':
+                self.skipped += 1
+        return resolved
+
+
+def run_module():
+    """Main module execution function"""
+
+    module_args = dict(
+        conflicts=dict(type='list', elements='dict', required=True),
+        strategy=dict(type='str', required=False, default='platform_wins',
+                      choices=['platform_wins', 'local_wins', 'manual_review', 'merge_strategy', 'timestamp_based']),
+        local_state=dict(type='dict', required=False, default={}),
+        platform_state=dict(type='dict', required=False, default={}),
+        allow_platform_updates=dict(type='bool', required=False, default=False),
+        local_priority_types=dict(type='list', elements='str', required=False, default=[]),
+        mergeable_types=dict(type='list', elements='str', required=False, default=['job_status_mismatch']),
+        manual_review_timeout=dict(type='int', required=False, default=3600),
+        resolution_id=dict(type='str', required=False)
+    )
+
+    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+    params = module.params
+
+    for position, conflict in enumerate(params['conflicts']):
+        if not conflict.get('conflict_type'):
+            module.fail_json(msg="Conflict %d has no conflict_type" % position)
+
+    started = time.monotonic()
+    indexed, superseded = index_conflicts(params['conflicts'], params['local_state'], params['platform_state'])
+    resolver = ConflictResolver(params)
+    resolved = resolver.resolve(indexed, superseded)
+
+    merged_state = dict(params['local_state'])
+    merged_state.update(resolver.local_updates)
+
+    module.exit_json(
+        changed=False,
+        resolution_id=resolver.resolution_id,
+        merged_state=merged_state,
+        local_updates=resolver.local_updates,
+        platform_updates=resolver.platform_updates,
+        resolution_actions=resolver.actions,
+        manual_review_artifacts=resolver.artifacts,
+        stats={
+            'processed': len(params['conflicts']),
+            'unique_keys': len(indexed),
+            'resolved': resolved,
+            'skipped': resolver.skipped,
+            'pending_review': len(resolver.artifacts),
+            'failed': resolver.failed,
+            'superseded': len(superseded),
+            'execution_time': round(time.monotonic() - started, 4),
+        })
+
+
+def main():
+    """Main entry point"""
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
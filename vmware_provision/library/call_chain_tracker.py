@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: Call Chain Tracker
+
+Documentation stub for the call_chain_tracker action plugin. The plugin runs
+entirely on the controller; see action_plugins/call_chain_tracker.py.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: call_chain_tracker
+short_description: Track call chain frames in an append-only session log
+description:
+    - Appends call chain frames to a per-session JSON-lines log on the controller in constant time
+    - Keeps depth and parent/child links as frame indices instead of copying the whole chain through Jinja
+    - Exposes only a compact handle (session id + frame id) as facts
+    - Builds the full call chain on demand for reports
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    operation:
+        description:
+            - C(start) opens a frame as a child of the innermost open frame
+            - C(end) closes a frame by C(frame_id), or the innermost open frame of C(component)
+            - C(finalize) closes all open frames and writes the report
+            - C(report) builds the full call chain without changing the session
+        required: false
+        type: str
+        choices: ['start', 'end', 'finalize', 'report']
+        default: 'start'
+    session_id:
+        description:
+            - Call stack session identifier
+        required: true
+        type: str
+    component:
+        description:
+            - Component name of the frame, required for C(start)
+        required: false
+        type: str
+    frame_id:
+        description:
+            - Frame to close with C(end)
+        required: false
+        type: int
+    status:
+        description:
+            - Final status recorded by C(end) and C(finalize)
+        required: false
+        type: str
+        default: 'completed'
+    log_dir:
+        description:
+            - Directory holding the session logs
+        required: false
+        type: str
+        default: '/tmp/ansible_call_chain'
+    max_depth:
+        description:
+            - Maximum number of open frames; C(start) fails beyond it
+        required: false
+        type: int
+        default: 10
+    context:
+        description:
+            - Deployment context recorded once in the session header
+        required: false
+        type: dict
+        default: {}
+    metadata:
+        description:
+            - Extra data recorded with the frame
+        required: false
+        type: dict
+        default: {}
+    dest:
+        description:
+            - Write the C(finalize)/C(report) call chain to this file instead of returning it
+        required: false
+        type: path
+notes:
+    - This is an action plugin; it never connects to the managed host
+'''
+
+EXAMPLES = r'''
+- name: Add current component to call chain
+  call_chain_tracker:
+    session_id: "{{ call_stack_session_id }}"
+    component: "vmware_vm_provision"
+    max_depth: 10
+
+- name: Mark component completed
+  call_chain_tracker:
+    operation: end
+    session_id: "{{ call_stack_handle.session_id }}"
+    frame_id: "{{ call_stack_handle.frame_id }}"
+
+- name: Write final call chain report
+  call_chain_tracker:
+    operation: finalize
+    session_id: "{{ call_stack_session_id }}"
+    dest: "/tmp/call_stack_{{ call_stack_session_id }}_final.json"
+'''
+
+RETURN = r'''
+ansible_facts:
+    description: Compact call stack facts
+    returned: always
+    type: dict
+    sample:
+        call_stack_handle:
+            session_id: "vm_deploy_1705312800_123456"
+            frame_id: 3
+        call_chain_id: "vm_deploy_1705312800_123456_4_vmware_vm_provision"
+        call_stack_depth: 4
+parent_id:
+    description: Frame id of the parent frame
+    returned: when operation is start
+    type: int
+    sample: 2
+frames_recorded:
+    description: Number of frames recorded in the session
+    returned: always
+    type: int
+    sample: 4
+report:
+    description: Full call chain rebuilt from the log
+    returned: when operation is finalize or report and dest is not set
+    type: dict
+log_path:
+    description: Path of the session log
+    returned: always
+    type: str
+    sample: "/tmp/ansible_call_chain/call_chain_vm_deploy_1705312800_123456.jsonl"
+'''
@@ -14,24 +14,25 @@ Last Updated: 2024-01-15
 """
 
 import json
-import yaml
-import xml.etree.ElementTree as ET
-import csv
-import gzip
-import pickle
-import hashlib
 import datetime
 import re
 from typing import Dict, List, Any, Optional, Union, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 import logging
 
+# Format and codec backends (yaml, xml.etree, csv, gzip, pickle, hashlib) are
+# imported where they are used: a module run that only passes JSON through
+# never loads them.
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_NORMALIZE_KEY = re.compile(r'([A-Z])')
+
 class DataFormat(Enum):
     """Supported data formats for output"""
     JSON = "json"
@@ -117,6 +118,47 @@ class SessionData:
     session_metadata: Dict[str, Any]
     performance_summary: Dict[str, Any]
 
+@lru_cache(maxsize=None)
+def _validation_schemas() -> Dict[str, Dict]:
+    """Validation schemas for the standard data types, built once per process"""
+    return {
+        "vmware_resource": {
+            "required_fields": ["resource_id", "resource_type", "resource_name", "resource_state"],
+            "field_types": {
+                "resource_id": str,
+                "resource_type": str,
+                "resource_name": str,
+                "resource_state": str,
+                "properties": dict,
+                "metadata": dict
+            },
+            "valid_states": ["creating", "created", "updating", "updated", "deleting", "deleted", "error"]
+        },
+        "operation_result": {
+            "required_fields": ["operation_id", "operation_type", "operation_name", "status", "start_time", "success"],
+            "field_types": {
+                "operation_id": str,
+                "operation_type": str,
+                "operation_name": str,
+                "status": str,
+                "success": bool
+            },
+            "valid_statuses": ["pending", "running", "completed", "failed", "cancelled"]
+        },
+        "session_data": {
+            "required_fields": ["session_id", "session_type", "session_name", "start_time", "operations"],
+            "field_types": {
+                "session_id": str,
+                "session_type": str,
+                "session_name": str,
+                "operations": list,
+                "total_operations": int,
+                "successful_operations": int,
+                "failed_operations": int
+            }
+        }
+    }
+
 class DataStructureOptimizer:
     """Main data structure optimizer class"""
     
@@ -127,44 +169,8 @@ class DataStructureOptimizer:
         self.validation_schemas = self._load_validation_schemas()
         
     def _load_validation_schemas(self) -> Dict[str, Dict]:
-        """Load validation schemas for different data types"""
-        return {
-            "vmware_resource": {
-                "required_fields": ["resource_id", "resource_type", "resource_name", "resource_state"],
-                "field_types": {
-                    "resource_id": str,
-                    "resource_type": str,
-                    "resource_name": str,
-                    "resource_state": str,
-                    "properties": dict,
-                    "metadata": dict
-                },
-                "valid_states": ["creating", "created", "updating", "updated", "deleting", "deleted", "error"]
-            },
-            "operation_result": {
-                "required_fields": ["operation_id", "operation_type", "operation_name", "status", "start_time", "success"],
-                "field_types": {
-                    "operation_id": str,
-                    "operation_type": str,
-                    "operation_name": str,
-                    "status": str,
-                    "success": bool
-                },
-                "valid_statuses": ["pending", "running", "completed", "failed", "cancelled"]
-            },
-            "session_data": {
-                "required_fields": ["session_id", "session_type", "session_name", "start_time", "operations"],
-                "field_types": {
-                    "session_id": str,
-                    "session_type": str,
-                    "session_name": str,
-                    "operations": list,
-                    "total_operations": int,
-                    "successful_operations": int,
-                    "failed_operations": int
-                }
-            }
-        }
+        """Load validation schemas for different data types (shared, read-only)"""
+        return _validation_schemas()
     
     def validate_data(self, data: Any, data_type: str) -> Tuple[bool, List[str]]:
         """Validate data against schema"""
@@ -206,7 +212,7 @@ class DataStructureOptimizer:
             normalized = {}
             for key, value in data.items():
                 # Normalize key names (snake_case)
-                normalized_key = re.sub(r'([A-Z])', r'_\1', key).lower().strip('_')
+                normalized_key = _NORMALIZE_KEY.sub(r'_\1', key).lower().strip('_')
                 normalized[normalized_key] = self.normalize_data(value)
             return normalized
         elif isinstance(data, list):
@@ -232,6 +238,7 @@ class DataStructureOptimizer:
         }
         
         if self.config.include_checksums:
+            import hashlib
             data_str = json.dumps(data, sort_keys=True, default=str)
             metadata["checksum"] = hashlib.sha256(data_str.encode()).hexdigest()
         
@@ -244,6 +251,7 @@ class DataStructureOptimizer:
     def compress_data(self, data: bytes) -> bytes:
         """Compress data using specified compression type"""
         if self.config.compression == CompressionType.GZIP:
+            import gzip
             return gzip.compress(data)
         elif self.config.compression == CompressionType.BZIP2:
             import bz2
@@ -257,6 +265,7 @@ class DataStructureOptimizer:
     def decompress_data(self, data: bytes) -> bytes:
         """Decompress data using specified compression type"""
         if self.config.compression == CompressionType.GZIP:
+            import gzip
             return gzip.decompress(data)
         elif self.config.compression == CompressionType.BZIP2:
             import bz2
@@ -273,6 +282,7 @@ class DataStructureOptimizer:
             return json.dumps(data, indent=2 if self.config.pretty_print else None, default=str)
         
         elif output_format == DataFormat.YAML:
+            import yaml
             return yaml.dump(data, default_flow_style=False, indent=2 if self.config.pretty_print else None)
         
         elif output_format == DataFormat.XML:
@@ -285,6 +295,7 @@ class DataStructureOptimizer:
             return self._convert_to_html(data)
         
         elif output_format == DataFormat.PICKLE:
+            import pickle
             return pickle.dumps(data)
         
         elif output_format == DataFormat.COMPRESSED_JSON:
@@ -292,6 +303,7 @@ class DataStructureOptimizer:
             return self.compress_data(json_data)
         
         elif output_format == DataFormat.COMPRESSED_YAML:
+            import yaml
             yaml_data = yaml.dump(data).encode()
             return self.compress_data(yaml_data)
         
@@ -300,6 +312,8 @@ class DataStructureOptimizer:
     
     def _convert_to_xml(self, data: Any, root_name: str = "data") -> str:
         """Convert data to XML format"""
+        import xml.etree.ElementTree as ET
+
         def dict_to_xml(d, parent):
             for key, value in d.items():
                 if isinstance(value, dict):
@@ -350,6 +364,7 @@ class DataStructureOptimizer:
             all_keys.update(item.keys())
         
         # Create CSV
+        import csv
         import io
         output = io.StringIO()
         writer = csv.DictWriter(output, fieldnames=sorted(all_keys))
@@ -516,9 +531,11 @@ class DataStructureOptimizer:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
             elif file_extension in ['.yml', '.yaml']:
+                import yaml
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = yaml.safe_load(f)
             elif file_extension == '.pickle':
+                import pickle
                 with open(file_path, 'rb') as f:
                     data = pickle.load(f)
             else:
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: Deployment History
+
+Documentation stub for the deployment_history action plugin. The plugin runs
+entirely on the controller; see action_plugins/deployment_history.py.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: deployment_history
+short_description: Record deployments in an indexed SQLite history and query it
+description:
+    - Records each deployment with its steps, step timings, retry_manager operations and errors in one transaction
+    - Records output_manager component output sizes and validation status
+    - Answers fleet queries (recent deployments, failures, per-environment summary, step durations, retries, errors, component output volume) from indexes instead of scanning report files
+    - Compacts deployments older than the retention period into per-day totals that the summary query still counts
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    operation:
+        description:
+            - C(record) inserts or replaces one deployment
+            - C(record_output) inserts one output_manager component record
+            - C(query) runs the named C(query)
+            - C(compact) rolls up and deletes deployments older than C(retention_days)
+        required: false
+        type: str
+        choices: ['record', 'record_output', 'query', 'compact']
+        default: 'record'
+    db_path:
+        description:
+            - SQLite database on the controller, created on first use
+        required: false
+        type: path
+        default: '/tmp/ansible_history/deployments.db'
+    deployment:
+        description:
+            - Deployment row with C(vm_name), C(environment), C(location), C(status) and C(succeeded)
+            - Optional C(os_type), C(started_at), C(finished_at), C(job_id), C(artifact_path), C(details)
+            - C(deployment_key) identifies the deployment; recording the same key again replaces it
+        required: false
+        type: dict
+    steps:
+        description:
+            - Completed steps in order, as names or dicts with C(name) and C(finished_at)
+            - A step without C(started_at) starts when the previous step finished
+        required: false
+        type: list
+        elements: raw
+        default: []
+    step_times:
+        description:
+            - Completion time per step name, for C(steps) given as names (the state file's C(step_times))
+        required: false
+        type: dict
+        default: {}
+    retries:
+        description:
+            - retry_manager operation records (C(retry_operations))
+        required: false
+        type: list
+        elements: raw
+        default: []
+    errors:
+        description:
+            - Error messages, or dicts with C(message), C(step) and C(occurred_at)
+        required: false
+        type: list
+        elements: raw
+        default: []
+    session_id:
+        description:
+            - Output session identifier for C(record_output)
+        required: false
+        type: str
+    component:
+        description:
+            - Component that produced the output
+        required: false
+        type: str
+        default: 'output_manager'
+    record:
+        description:
+            - output_sink record metadata (C(timestamp), C(size_bytes), C(validation_status))
+        required: false
+        type: dict
+        default: {}
+    context:
+        description:
+            - Deployment context of the output (C(environment), C(location), C(vm_os))
+        required: false
+        type: dict
+        default: {}
+    query:
+        description:
+            - Named query for C(operation=query)
+        required: false
+        type: str
+        choices: ['recent', 'failures', 'summary', 'steps', 'retries', 'errors', 'deployment', 'outputs']
+    filters:
+        description:
+            - Query filters C(environment), C(location), C(os_type), C(vm_name), C(status) and C(step)
+            - C(since) and C(until) take ISO 8601 times, epoch seconds or ages such as C(7d) or C(24h)
+        required: false
+        type: dict
+        default: {}
+    limit:
+        description:
+            - Maximum number of rows returned
+        required: false
+        type: int
+        default: 50
+    retention_days:
+        description:
+            - Age in days after which C(compact) rolls deployments up
+        required: false
+        type: float
+    vacuum:
+        description:
+            - Reclaim free space after compacting
+        required: false
+        type: bool
+        default: false
+requirements:
+    - python >= 3.8
+notes:
+    - Runs on the controller only; the database uses WAL mode so concurrent runs can write and query it
+    - tools/history_query.py runs the same queries from the command line
+'''
+
+EXAMPLES = r'''
+# Record the deployment at the end of status tracking
+- name: Record deployment history
+  deployment_history:
+    deployment:
+      vm_name: "{{ vm_name }}"
+      environment: "{{ env }}"
+      location: "{{ location }}"
+      os_type: "{{ vm_os }}"
+      status: "{{ deployment_state.state }}"
+      succeeded: "{{ deployment_state.state == 'complete' }}"
+      started_at: "{{ deployment_state.start_time }}"
+    steps: "{{ deployment_state.steps_completed }}"
+    step_times: "{{ deployment_state.step_times | default({}) }}"
+    retries: "{{ retry_operations | default([]) }}"
+
+# Production failures of the last week
+- name: Query recent failures
+  deployment_history:
+    operation: query
+    query: failures
+    filters:
+      environment: prod
+      since: 7d
+  register: prod_failures
+
+# Keep 90 days of detail
+- name: Compact deployment history
+  deployment_history:
+    operation: compact
+    retention_days: 90
+'''
+
+RETURN = r'''
+deployment_id:
+    description: Row id of the recorded deployment
+    returned: when operation is record
+    type: int
+    sample: 1042
+deployment_key:
+    description: Key the deployment was recorded under
+    returned: when operation is record
+    type: str
+    sample: "prod/DC1/web-01/2024-01-15T10:30:00Z"
+steps:
+    description: Number of steps recorded
+    returned: when operation is record
+    type: int
+    sample: 6
+output_id:
+    description: Row id of the recorded output
+    returned: when operation is record_output
+    type: int
+    sample: 88
+rows:
+    description: Query result rows
+    returned: when operation is query
+    type: list
+    elements: dict
+    sample:
+        - environment: prod
+          deployments: 412
+          succeeded: 398
+          failed: 14
+          success_rate: 96.6
+          mean_duration_seconds: 742.3
+query_ms:
+    description: Query execution time in milliseconds
+    returned: when operation is query
+    type: float
+    sample: 0.6
+deployments_compacted:
+    description: Deployments rolled into daily totals and deleted
+    returned: when operation is compact
+    type: int
+    sample: 1200
+db_path:
+    description: History database path
+    returned: always
+    type: str
+    sample: "/tmp/ansible_history/deployments.db"
+'''
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: Output Sink
+
+Documentation stub for the output_sink action plugin. The plugin runs
+entirely on the controller; see action_plugins/output_sink.py.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: output_sink
+short_description: Buffer component outputs and write consolidated reports in one pass
+description:
+    - Appends each component record to a per-session pending JSON-lines buffer on the controller
+    - Flushes the buffer to an append-only output stream once it holds C(batch_size) records, as one gzip member per batch when C(compress) is set
+    - Validates, sizes and sanitizes each record with a single serialization
+    - Writes the consolidated JSON, YAML, HTML and XML reports together in one pass over the records at finalize
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    operation:
+        description:
+            - C(append) buffers one component record
+            - C(finalize) flushes the buffer and writes the consolidated reports
+            - C(status) returns the session counters without changing anything
+        required: false
+        type: str
+        choices: ['append', 'finalize', 'status']
+        default: 'append'
+    session_id:
+        description:
+            - Output session identifier
+        required: true
+        type: str
+    component:
+        description:
+            - Component that produced the output
+        required: false
+        type: str
+        default: 'output_manager'
+    data:
+        description:
+            - Component output data
+        required: false
+        type: raw
+    format:
+        description:
+            - Format label recorded with the output
+        required: false
+        type: str
+        default: 'json'
+    context:
+        description:
+            - Deployment context stored with the session on its first record
+        required: false
+        type: dict
+        default: {}
+    output_dir:
+        description:
+            - Directory holding the session buffer, stream and reports
+        required: false
+        type: path
+        default: '/tmp/ansible_outputs'
+    batch_size:
+        description:
+            - Number of buffered records that triggers a flush to the output stream
+        required: false
+        type: int
+        default: 50
+    compress:
+        description:
+            - Write the output stream as gzip
+        required: false
+        type: bool
+        default: true
+    formats:
+        description:
+            - Consolidated report formats written at finalize
+        required: false
+        type: list
+        elements: str
+        choices: ['json', 'yaml', 'html', 'xml']
+        default: ['json']
+    status:
+        description:
+            - Final session status recorded at finalize
+        required: false
+        type: str
+        default: 'finalized'
+    sanitize:
+        description:
+            - Redact sensitive keys and values before the record is buffered
+        required: false
+        type: bool
+        default: true
+    redact_fields:
+        description:
+            - Key substrings whose values are replaced by C(redaction_text)
+        required: false
+        type: list
+        elements: str
+        default: ['password', 'secret', 'token', 'key', 'credential']
+    password_pattern:
+        description:
+            - Regular expression redacted inside string values
+        required: false
+        type: str
+    redaction_text:
+        description:
+            - Replacement text for redacted data
+        required: false
+        type: str
+        default: '[REDACTED]'
+    return_data:
+        description:
+            - Return the sanitized record data, e.g. to forward it to external systems
+        required: false
+        type: bool
+        default: false
+requirements:
+    - python >= 3.8
+    - PyYAML
+notes:
+    - Runs on the controller only; records from all hosts of a session share one stream
+'''
+
+EXAMPLES = r'''
+# Record a component's output
+- name: Add component output
+  output_sink:
+    session_id: "{{ output_session_id }}"
+    component: "vmware_vm_provision"
+    data: "{{ vm_provision_result }}"
+    batch_size: "{{ output_manager.performance.batch_size }}"
+
+# Write the consolidated reports at the end of the run
+- name: Generate final consolidated output
+  output_sink:
+    operation: finalize
+    session_id: "{{ output_session_id }}"
+    formats: ["json", "yaml", "html"]
+  register: output_final
+'''
+
+RETURN = r'''
+record:
+    description: Metadata of the buffered record
+    returned: when operation is append
+    type: dict
+    sample:
+        component: "vmware_vm_provision"
+        timestamp: "2024-01-15T10:30:00Z"
+        format: "json"
+        status: "processed"
+        size_bytes: 1824
+        validation_status: "valid"
+data:
+    description: Sanitized record data
+    returned: when operation is append and return_data is set
+    type: raw
+flushed:
+    description: Whether this record completed a batch and the buffer was flushed
+    returned: when operation is append
+    type: bool
+    sample: false
+report_paths:
+    description: Consolidated report file per format
+    returned: when operation is finalize
+    type: dict
+    sample:
+        json: "/tmp/ansible_outputs/output_1705312800_123456_final_consolidated.json"
+        html: "/tmp/ansible_outputs/output_1705312800_123456_final_consolidated.html"
+stream_path:
+    description: Append-only output stream of the session
+    returned: always
+    type: str
+    sample: "/tmp/ansible_outputs/output_1705312800_123456_outputs.jsonl.gz"
+status:
+    description: Session status
+    returned: always
+    type: str
+    sample: "processing"
+total_outputs:
+    description: Number of records in the session
+    returned: always
+    type: int
+    sample: 12
+total_size_bytes:
+    description: Serialized size of all record data
+    returned: always
+    type: int
+    sample: 48211
+pending:
+    description: Records buffered but not yet flushed
+    returned: always
+    type: int
+    sample: 12
+batches_flushed:
+    description: Number of batches written to the output stream
+    returned: always
+    type: int
+    sample: 0
+validation:
+    description: Record counts per validation status
+    returned: always
+    type: dict
+    sample: {valid: 12, invalid: 0}
+components:
+    description: Components that reported in the session
+    returned: always
+    type: list
+    elements: str
+    sample: ["vmware_vm_provision", "vmware_network_config"]
+'''
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: Stats Aggregate
+
+Documentation stub for the stats_aggregate action plugin. The plugin runs
+entirely on the controller; see action_plugins/stats_aggregate.py.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: stats_aggregate
+short_description: Publish a flattened, size-capped per-VM stats entry instead of whole module results
+description:
+    - Extracts the declared C(fields) from a module result and flattens nested dicts into C(name_key) fields
+    - Publishes them as C(<stat>.<key>.<component>) through the same aggregation as set_stats, so AAP receives one small entry per VM and component
+    - Publishes values that recur across VMs once in C(<stat>_shared) and references them as C(@<hash>) from their second occurrence in the run on
+    - Spills values over C(max_value_bytes), values that do not fit C(max_entry_bytes) and the optional C(details) into a gzip-compressed JSON artifact whose path is in the entry as C(details_path)
+    - Keeps a per-run ledger on the controller that skips unchanged entries and shared values already published, and caps the bytes one run adds at C(max_run_bytes)
+    - The ledger belongs to one ansible-playbook process; a ledger an earlier run left under the same C(run_id) is started over
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    key:
+        description:
+            - Entry key, normally the VM name
+        required: true
+        type: str
+    component:
+        description:
+            - Component the entry describes (vm_provision, disk_config, ...)
+        required: true
+        type: str
+    source:
+        description:
+            - Module result or other dict the fields are read from
+        required: false
+        type: raw
+        default: {}
+    fields:
+        description:
+            - Dict of field name to dotted path in C(source) (C(instance.hw_datastores.0)), or a list of paths named after the path
+            - Absent and null values are left out
+        required: true
+        type: raw
+    values:
+        description:
+            - Additional fields given directly
+        required: false
+        type: dict
+        default: {}
+    keep:
+        description:
+            - Fields that are never spilled, such as status fields AAP workflows branch on
+        required: false
+        type: list
+        elements: str
+        default: []
+    details:
+        description:
+            - Full data written only to the artifact, such as the whole module result
+        required: false
+        type: raw
+    stat:
+        description:
+            - Top-level stats key
+        required: false
+        type: str
+        default: 'vm_stats'
+    run_id:
+        description:
+            - Run identifier naming the ledger and artifact directory, such as the AAP job id
+            - Defaults to an id of the ansible-playbook process
+        required: false
+        type: str
+    artifact_dir:
+        description:
+            - Controller directory for the ledger and the spill artifacts
+        required: false
+        type: path
+        default: '/tmp/ansible_stats'
+    max_value_bytes:
+        description:
+            - Largest JSON-encoded value published inline
+        required: false
+        type: int
+        default: 256
+    max_entry_bytes:
+        description:
+            - Largest JSON-encoded entry; the largest values spill until it fits
+        required: false
+        type: int
+        default: 1024
+    shared_min_bytes:
+        description:
+            - Smallest JSON-encoded value published once in C(<stat>_shared); 0 disables sharing
+        required: false
+        type: int
+        default: 32
+    max_run_bytes:
+        description:
+            - Bytes one run may add to the stats; past it only kept fields and C(details_path) are published; 0 disables the cap
+        required: false
+        type: int
+        default: 262144
+    per_host:
+        description:
+            - Same as set_stats C(per_host)
+        required: false
+        type: bool
+        default: false
+    aggregate:
+        description:
+            - Same as set_stats C(aggregate)
+        required: false
+        type: bool
+        default: true
+requirements:
+    - python >= 3.8
+notes:
+    - Runs on the controller only; the artifacts are read with C(zcat) or Python's gzip module
+'''
+
+EXAMPLES = r'''
+# Publish the provisioning result of one VM
+- name: Set stats for AAP
+  stats_aggregate:
+    key: "{{ vm_name }}"
+    component: vm_provision
+    source: "{{ vm_creation }}"
+    fields:
+      failed: failed
+      power_state: instance.hw_power_status
+      ip_address: instance.ipv4
+      datastores: instance.hw_datastores
+    keep: [failed, power_state]
+    values:
+      deployed_at: "{{ ansible_date_time.iso8601 }}"
+    details: "{{ vm_creation }}"
+    run_id: "{{ aap_stats.run_id }}"
+'''
+
+RETURN = r'''
+ansible_stats:
+    description: Stats data with the aggregation settings, merged by the strategy like set_stats
+    returned: always
+    type: dict
+    sample:
+        data:
+            vm_stats:
+                web-01:
+                    vm_provision:
+                        failed: false
+                        power_state: poweredOn
+                        datastores: "@3f2a9c01d4e7"
+                        details_path: "/tmp/ansible_stats/4711/vm_stats/web-01/vm_provision.json.gz"
+            vm_stats_shared:
+                3f2a9c01d4e7: ["DS-PROD-TIER1-01", "DS-PROD-TIER1-02"]
+        per_host: false
+        aggregate: true
+entry_bytes:
+    description: JSON-encoded size of the entry
+    returned: always
+    type: int
+    sample: 212
+spilled:
+    description: Fields moved to the artifact
+    returned: always
+    type: list
+    elements: str
+shared:
+    description: Shared value hashes this task published
+    returned: always
+    type: list
+    elements: str
+duplicate:
+    description: Whether an identical entry was already published in this run, so nothing was published
+    returned: always
+    type: bool
+budget_exceeded:
+    description: Whether the run budget cut the entry down to its kept fields
+    returned: always
+    type: bool
+run_bytes:
+    description: Bytes the run has published under C(stat)
+    returned: always
+    type: int
+    sample: 18230
+details_path:
+    description: Artifact with the spilled values and details
+    returned: when values spilled or details is set
+    type: str
+artifact_bytes:
+    description: Compressed artifact size
+    returned: when values spilled or details is set
+    type: int
+'''
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: VMware Environment Validate
+
+Validates the vCenter environment a deployment depends on from a single
+inventory fetch. The datacenter resource pools, datastores, distributed
+switches and VM folders are read with one property collector retrieval and
+indexed locally; every requirement is then checked in-process, missing folders
+are created in one pass, and all failures are reported together.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_environment_validate
+short_description: Validate the vCenter environment from one inventory fetch
+description:
+    - Reads resource pools, datastores, distributed switches and VM folders of a datacenter with one property collector retrieval over one session
+    - Checks the vCenter version, resource pool, datastores, distributed switches and folders against indexed lookups
+    - Creates missing VM folders, parents first, in a single pass
+    - Evaluates every requirement and reports all failures together
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    datacenter:
+        description:
+            - Datacenter to validate
+        required: true
+        type: str
+    min_vcenter_version:
+        description:
+            - Minimum supported vCenter version
+        required: false
+        type: str
+        default: '8.0'
+    resource_pool:
+        description:
+            - Resource pool that must exist, by name or inventory path
+        required: false
+        type: str
+    datastores:
+        description:
+            - Datastores in the environment C(datastores) format; every C(name) must exist and be accessible
+        required: false
+        type: dict
+        default: {}
+    min_free_space_gb:
+        description:
+            - Minimum free space each required datastore must report, C(0) disables the check
+        required: false
+        type: int
+        default: 0
+    networks:
+        description:
+            - Networks in the environment C(networks) format
+            - Distributed networks require a distributed switch, or the one named in C(dvswitch)
+        required: false
+        type: dict
+        default: {}
+    folders:
+        description:
+            - VM folders that must exist, as paths below the datacenter VM folder
+        required: false
+        type: dict
+        default: {}
+    create_missing_folders:
+        description:
+            - Create missing folders instead of reporting them as failures
+        required: false
+        type: bool
+        default: true
+    fail_on_error:
+        description:
+            - Fail the task when any check fails; otherwise the failures are only returned
+        required: false
+        type: bool
+        default: true
+extends_documentation_fragment:
+    - community.vmware.vmware.documentation
+requirements:
+    - python >= 3.8
+    - pyvmomi
+    - community.vmware
+notes:
+    - Supports check mode; missing folders are reported as to be created
+'''
+
+EXAMPLES = r'''
+- name: Validate environment
+  vmware_environment_validate:
+    hostname: "{{ vcenter.hostname }}"
+    username: "{{ vcenter.username }}"
+    password: "{{ vcenter.password }}"
+    validate_certs: "{{ vcenter.validate_certs }}"
+    datacenter: "{{ datacenter }}"
+    resource_pool: "{{ resource_pool }}"
+    datastores: "{{ datastores }}"
+    networks: "{{ networks }}"
+    folders: "{{ folders }}"
+  register: environment_check
+'''
+
+RETURN = r'''
+vcenter_version:
+    description: vCenter version
+    returned: always
+    type: str
+    sample: "8.0.2"
+checks:
+    description: Outcome of every check
+    returned: always
+    type: list
+    elements: dict
+    sample:
+        - {check: "datastore", target: "DEV-SSD-01", status: "passed", message: "Datastore DEV-SSD-01 available"}
+failures:
+    description: Messages of the failed checks
+    returned: always
+    type: list
+    elements: str
+    sample: ["Required datastore DEV-HDD-01 not found"]
+folders_created:
+    description: Folder paths created by this run, parents first
+    returned: always
+    type: list
+    elements: str
+    sample: ["/DEV/Testing"]
+inventory:
+    description: Indexed datacenter inventory
+    returned: always
+    type: dict
+    sample:
+        resource_pools: ["Resources", "DEV-RP"]
+        datastores:
+            DEV-SSD-01: {type: "VMFS", accessible: true, capacity_gb: 2048.0, free_gb: 1210.5}
+        dvswitches: ["DEV-DVS"]
+        folders: ["/DEV", "/DEV/Linux"]
+fetch_calls:
+    description: Property collector round trips made to read the inventory
+    returned: always
+    type: int
+    sample: 1
+vcenter_spans:
+    description: Timing of the vCenter calls made by this run
+    returned: always
+    type: list
+    elements: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.compat.version import LooseVersion
+from ansible.module_utils.property_collector import retrieve_properties
+from ansible.module_utils.span_timer import SpanTimer
+
+try:
+    from pyVmomi import vim, vmodl
+    from ansible_collections.community.vmware.plugins.module_utils.vmware import (
+        PyVmomi, vmware_argument_spec, find_datacenter_by_name
+    )
+    HAS_COMMUNITY_VMWARE = True
+except ImportError:
+    HAS_COMMUNITY_VMWARE = False
+
+GB = 1024 ** 3
+
+PROPERTY_PATHS = (
+    ('ResourcePool', ['name', 'parent']),
+    ('Datastore', ['name', 'summary.type', 'summary.accessible', 'summary.capacity', 'summary.freeSpace']),
+    ('DistributedVirtualSwitch', ['name']),
+    ('Folder', ['name', 'parent', 'childType']),
+)
+
+
+def normalize_folder_path(path):
+    """'/DEV/Linux', 'DEV/Linux/' and 'vm/DEV/Linux' all map to '/DEV/Linux'"""
+    parts = [part for part in str(path).split('/') if part]
+    if parts and parts[0] == 'vm':
+        parts = parts[1:]
+    return '/' + '/'.join(parts)
+
+
+class Inventory:
+    """Datacenter inventory indexed for lookups"""
+
+    def __init__(self, objects, vm_root):
+        self.resource_pools = {}
+        self.datastores = {}
+        self.dvswitches = set()
+        self.folders = {'/': vm_root}
+
+        pools = {}
+        folders = {}
+        for obj, props in objects:
+            if isinstance(obj, vim.ResourcePool):
+                pools[obj._moId] = (obj, props)
+            elif isinstance(obj, vim.Datastore):
+                self.datastores[props['name']] = {
+                    'type': props.get('summary.type'),
+                    'accessible': bool(props.get('summary.accessible')),
+                    'capacity_gb': round((props.get('summary.capacity') or 0) / GB, 1),
+                    'free_gb': round((props.get('summary.freeSpace') or 0) / GB, 1),
+                }
+            elif isinstance(obj, vim.DistributedVirtualSwitch):
+                self.dvswitches.add(props['name'])
+            elif isinstance(obj, vim.Folder) and 'VirtualMachine' in (props.get('childType') or []):
+                folders[obj._moId] = (obj, props)
+
+        # Pools are indexed by name and by path below the cluster root pool
+        for moid, (obj, props) in pools.items():
+            names = []
+            current = moid
+            while current in pools:
+                names.append(pools[current][1]['name'])
+                parent = pools[current][1].get('parent')
+                current = parent._moId if isinstance(parent, vim.ResourcePool) else None
+            self.resource_pools[props['name']] = obj
+            self.resource_pools['/'.join(reversed(names))] = obj
+
+        # Folder paths are built from the parent chain up to the datacenter VM folder
+        for moid, (obj, props) in folders.items():
+            if moid == vm_root._moId:
+                continue
+            names = []
+            current = moid
+            while current in folders and current != vm_root._moId:
+                names.append(folders[current][1]['name'])
+                current = folders[current][1]['parent']._moId
+            if current == vm_root._moId:
+                self.folders['/' + '/'.join(reversed(names))] = obj
+
+    def summary(self):
+        return {
+            'resource_pools': sorted(set(self.resource_pools)),
+            'datastores': self.datastores,
+            'dvswitches': sorted(self.dvswitches),
+            'folders': sorted(path for path in self.folders if path != '/'),
+        }
+
+
+class EnvironmentValidator:
+    """Evaluates all requirements against the inventory"""
+
+    def __init__(self, module, inventory):
+        self.module = module
+        self.inventory = inventory
+        self.checks = []
+        self.folders_created = []
+
+    def _record(self, check, target, passed, message):
+        self.checks.append({'check': check, 'target': target,
+                            'status': 'passed' if passed else 'failed', 'message': message})
+
+    @property
+    def failures(self):
+        return [check['message'] for check in self.checks if check['status'] == 'failed']
+
+    def check_version(self, version):
+        minimum = self.module.params['min_vcenter_version']
+        compatible = LooseVersion(version) >= LooseVersion(minimum)
+        self._record('vcenter_version', version, compatible,
+                     "vCenter version compatible" if compatible
+                     else f"vCenter version {version} not compatible. Required version {minimum} or higher")
+
+    def check_resource_pool(self, name):
+        found = name in self.inventory.resource_pools
+        self._record('resource_pool', name, found,
+                     f"Resource pool {name} available" if found else f"Required resource pool {name} not found")
+
+    def check_datastores(self, datastores):
+        min_free = self.module.params['min_free_space_gb']
+        for _key, datastore in sorted(datastores.items()):
+            name = datastore['name'] if isinstance(datastore, dict) else str(datastore)
+            info = self.inventory.datastores.get(name)
+            if info is None:
+                self._record('datastore', name, False, f"Required datastore {name} not found")
+            elif not info['accessible']:
+                self._record('datastore', name, False, f"Datastore {name} is not accessible")
+            elif min_free and info['free_gb'] < min_free:
+                self._record('datastore', name, False,
+                             f"Datastore {name} has {info['free_gb']} GB free, {min_free} GB required")
+            else:
+                self._record('datastore', name, True, f"Datastore {name} available")
+
+    def check_networks(self, networks):
+        distributed = [network for network in networks.values()
+                       if isinstance(network, dict) and network.get('type') == 'distributed']
+        if not distributed:
+            return
+        if not self.inventory.dvswitches:
+            self._record('dvswitch', self.module.params['datacenter'], False,
+                         "No distributed switch found in datacenter")
+            return
+        named = sorted({network['dvswitch'] for network in distributed if network.get('dvswitch')})
+        for name in named:
+            found = name in self.inventory.dvswitches
+            self._record('dvswitch', name, found,
+                         f"Distributed switch {name} available" if found
+                         else f"Required distributed switch {name} not found")
+        if not named:
+            self._record('dvswitch', self.module.params['datacenter'], True, "Distributed switch available")
+
+    def check_folders(self, folders):
+        missing = sorted({normalize_folder_path(path) for path in folders.values()}
+                         - set(self.inventory.folders))
+        for path in sorted(normalize_folder_path(path) for path in folders.values()):
+            if path not in missing:
+                self._record('folder', path, True, f"Folder {path} available")
+        if not missing:
+            return
+        if not self.module.params['create_missing_folders']:
+            for path in missing:
+                self._record('folder', path, False, f"Required folder {path} not found")
+            return
+        for path in missing:
+            try:
+                self._create_folder(path)
+                self._record('folder', path, True, f"Folder {path} created")
+            except vmodl.MethodFault as e:
+                self._record('folder', path, False, f"Folder {path} could not be created: {e.msg}")
+
+    def _create_folder(self, path):
+        """Create a folder and any missing parents, reusing folders created earlier in the pass"""
+        parts = path.strip('/').split('/')
+        parent = self.inventory.folders['/']
+        for depth in range(1, len(parts) + 1):
+            current = '/' + '/'.join(parts[:depth])
+            if current not in self.inventory.folders:
+                if self.module.check_mode:
+                    self.inventory.folders[current] = parent
+                else:
+                    self.inventory.folders[current] = parent.CreateFolder(parts[depth - 1])
+                self.folders_created.append(current)
+            parent = self.inventory.folders[current]
+
+
+def run_module():
+    """Main module execution function"""
+
+    module_args = vmware_argument_spec() if HAS_COMMUNITY_VMWARE else {}
+    module_args.update(
+        datacenter=dict(type='str', required=True),
+        min_vcenter_version=dict(type='str', required=False, default='8.0'),
+        resource_pool=dict(type='str', required=False),
+        datastores=dict(type='dict', required=False, default={}),
+        min_free_space_gb=dict(type='int', required=False, default=0),
+        networks=dict(type='dict', required=False, default={}),
+        folders=dict(type='dict', required=False, default={}),
+        create_missing_folders=dict(type='bool', required=False, default=True),
+        fail_on_error=dict(type='bool', required=False, default=True)
+    )
+
+    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+
+    if not HAS_COMMUNITY_VMWARE:
+        module.fail_json(msg="The community.vmware collection and pyvmomi are required for this module")
+
+    params = module.params
+    timer = SpanTimer()
+
+    try:
+        pyv = timer.call('connect', PyVmomi, module)
+        version = pyv.content.about.version
+        datacenter = timer.call('find_datacenter', find_datacenter_by_name, pyv.content, params['datacenter'])
+        if datacenter is None:
+            module.fail_json(msg=f"Datacenter '{params['datacenter']}' not found", vcenter_version=version,
+                             failures=[f"Datacenter {params['datacenter']} not found"], **timer.as_result())
+
+        with timer.span('retrieve_inventory'):
+            objects, fetch_calls = retrieve_properties(pyv.content, datacenter, PROPERTY_PATHS)
+        inventory = Inventory(objects, datacenter.vmFolder)
+
+        validator = EnvironmentValidator(module, inventory)
+        validator.check_version(version)
+        if params['resource_pool']:
+            validator.check_resource_pool(params['resource_pool'])
+        validator.check_datastores(params['datastores'])
+        validator.check_networks(params['networks'])
+        with timer.span('create_folders'):
+            validator.check_folders(params['folders'])
+
+    except vmodl.MethodFault as e:
+        module.fail_json(msg=f"Environment validation failed: {e.msg}", **timer.as_result())
+
+    failures = validator.failures
+    result = timer.as_result({
+        'changed': bool(validator.folders_created),
+        'vcenter_version': version,
+        'checks': validator.checks,
+        'failures': failures,
+        'folders_created': validator.folders_created,
+        'inventory': inventory.summary(),
+        'fetch_calls': fetch_calls,
+    })
+    if failures and params['fail_on_error']:
+        module.fail_json(msg=f"Environment validation failed with {len(failures)} error(s): " + '; '.join(failures),
+                         **result)
+    module.exit_json(**result)
+
+
+def main():
+    """Main entry point"""
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
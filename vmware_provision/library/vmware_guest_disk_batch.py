@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: VMware Guest Disk Batch
+
+Adds every requested disk of a VM in a single reconfigure. The current
+device layout is read once, disks already present at their controller and
+unit are skipped (or grown when a larger size is requested), missing SCSI
+controllers are created in the same spec, and the resulting layout is
+returned in the vmware_guest_disk_info shape so callers need no second read.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_guest_disk_batch
+short_description: Add all disks of a VM with one reconfigure task
+description:
+    - Reads the VM device layout once and plans every requested disk against it
+    - Disks already present at the requested controller and unit are left alone; larger requested sizes grow the disk
+    - Creates missing SCSI controllers and all new disks in a single ReconfigVM_Task
+    - Returns the resulting layout in the C(guest_disk_info) format of vmware_guest_disk_info
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    name:
+        description:
+            - Name of the VM
+        required: true
+        type: str
+    datacenter:
+        description:
+            - Datacenter of the VM
+        required: false
+        type: str
+    folder:
+        description:
+            - VM folder, used when several VMs share the same name
+        required: false
+        type: str
+    disks:
+        description:
+            - Disks the VM must have
+        required: false
+        type: list
+        elements: dict
+        default: []
+        suboptions:
+            size_gb:
+                description: Disk size in GB
+                type: int
+                required: true
+            type:
+                description: Provisioning type
+                type: str
+                choices: ['thin', 'thick', 'eagerzeroedthick']
+                default: thin
+            datastore:
+                description: Datastore for the disk file, C(default_datastore) or the VM home when omitted
+                type: str
+            scsi_controller:
+                description: SCSI bus number (0-3)
+                type: int
+                default: 0
+            unit_number:
+                description: Unit number on the controller (0-15, 7 is reserved)
+                type: int
+                required: true
+            scsi_type:
+                description: Controller type used when the controller has to be created
+                type: str
+                choices: ['paravirtual', 'lsilogic', 'lsilogicsas', 'buslogic']
+                default: paravirtual
+    default_datastore:
+        description:
+            - Datastore for disks that do not name one
+        required: false
+        type: str
+'''
+
+EXAMPLES = r'''
+- name: Add additional disks
+  vmware_guest_disk_batch:
+    hostname: "{{ vcenter.hostname }}"
+    username: "{{ vcenter.username }}"
+    password: "{{ vcenter.password }}"
+    validate_certs: "{{ vcenter.validate_certs }}"
+    name: "{{ vm_name }}"
+    datacenter: "{{ datacenter }}"
+    default_datastore: "{{ vm_datastore }}"
+    disks:
+      - size_gb: 200
+        unit_number: 1
+      - size_gb: 500
+        type: eagerzeroedthick
+        scsi_controller: 1
+        unit_number: 0
+  register: disk_config
+'''
+
+RETURN = r'''
+disks:
+    description: Action taken per requested disk (C(added), C(grown), C(unchanged))
+    type: list
+    returned: always
+    sample: [{"scsi_controller": 0, "unit_number": 1, "size_gb": 200, "action": "added"}]
+controllers_added:
+    description: SCSI bus numbers of controllers created by this run
+    type: list
+    returned: always
+guest_disk_info:
+    description: Resulting disk layout, keyed like vmware_guest_disk_info
+    type: dict
+    returned: always
+reconfigure_calls:
+    description: Number of reconfigure tasks issued (0 or 1)
+    type: int
+    returned: always
+'''
+
+import re
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.span_timer import SpanTimer
+
+try:
+    from pyVmomi import vim, vmodl
+    from ansible_collections.community.vmware.plugins.module_utils.vmware import (
+        PyVmomi, TaskError, vmware_argument_spec, find_datastore_by_name, wait_for_task
+    )
+    HAS_COMMUNITY_VMWARE = True
+except ImportError:
+    HAS_COMMUNITY_VMWARE = False
+
+
+KB_PER_GB = 1024 * 1024
+
+SCSI_CONTROLLER_TYPES = {
+    'paravirtual': 'ParaVirtualSCSIController',
+    'lsilogic': 'VirtualLsiLogicController',
+    'lsilogicsas': 'VirtualLsiLogicSASController',
+    'buslogic': 'VirtualBusLogicController',
+}
+
+
+def _controller_type(device):
+    for name, class_name in SCSI_CONTROLLER_TYPES.items():
+        if isinstance(device, getattr(vim.vm.device, class_name)):
+            return name
+    return type(device).__name__
+
+
+def _datastore_name(file_name):
+    """'[DEV-SSD-01] vm/vm_1.vmdk' -> 'DEV-SSD-01', without a datastore lookup per disk"""
+    match = re.match(r'^\[([^\]]+)\]', file_name or '')
+    return match.group(1) if match else None
+
+
+def disk_layout(devices):
+    """Index SCSI controllers by bus number and disks by (bus, unit)"""
+    controllers = {}
+    by_key = {}
+    for device in devices:
+        if isinstance(device, vim.vm.device.VirtualSCSIController):
+            controllers[device.busNumber] = device
+            by_key[device.key] = device
+    disks = {}
+    for device in devices:
+        if isinstance(device, vim.vm.device.VirtualDisk) and device.controllerKey in by_key:
+            disks[(by_key[device.controllerKey].busNumber, device.unitNumber)] = device
+    return controllers, disks
+
+
+def guest_disk_info(devices):
+    """Disk layout in the vmware_guest_disk_info return format"""
+    controllers = {device.key: device for device in devices
+                   if isinstance(device, vim.vm.device.VirtualController)}
+    info = {}
+    disks = [device for device in devices if isinstance(device, vim.vm.device.VirtualDisk)]
+    for index, disk in enumerate(disks):
+        backing = disk.backing
+        controller = controllers.get(disk.controllerKey)
+        info[str(index)] = {
+            'key': disk.key,
+            'label': disk.deviceInfo.label if disk.deviceInfo else None,
+            'summary': disk.deviceInfo.summary if disk.deviceInfo else None,
+            'backing_filename': getattr(backing, 'fileName', None),
+            'backing_datastore': _datastore_name(getattr(backing, 'fileName', None)),
+            'backing_disk_mode': getattr(backing, 'diskMode', None),
+            'backing_thinprovisioned': getattr(backing, 'thinProvisioned', None),
+            'backing_eagerlyscrub': getattr(backing, 'eagerlyScrub', None),
+            'backing_uuid': getattr(backing, 'uuid', None),
+            'capacity_in_kb': disk.capacityInKB,
+            'capacity_in_bytes': disk.capacityInBytes,
+            'controller_key': disk.controllerKey,
+            'controller_bus_number': controller.busNumber if controller else None,
+            'controller_type': _controller_type(controller) if controller else None,
+            'unit_number': disk.unitNumber,
+        }
+    return info
+
+
+def validate_disk(disk):
+    """Return an error message for an invalid disk request, else None"""
+    bus, unit = disk['scsi_controller'], disk['unit_number']
+    if bus not in range(4):
+        return "scsi_controller %s is out of range 0-3" % bus
+    if unit not in range(16) or unit == 7:
+        return "unit_number %s on controller %s must be 0-15 and not 7" % (unit, bus)
+    if disk['size_gb'] <= 0:
+        return "size_gb must be positive for controller %s unit %s" % (bus, unit)
+    return None
+
+
+class DiskPlanner:
+    """Builds one device change list for every requested disk"""
+
+    def __init__(self, devices, datastore_lookup):
+        self.controllers, self.disks = disk_layout(devices)
+        self.datastore_lookup = datastore_lookup
+        self.device_changes = []
+        self.actions = []
+        self.controllers_added = []
+        self._next_key = -100
+
+    def _temporary_key(self):
+        self._next_key -= 1
+        return self._next_key
+
+    def _controller_key(self, bus, scsi_type):
+        if bus in self.controllers:
+            return self.controllers[bus].key
+        controller = getattr(vim.vm.device, SCSI_CONTROLLER_TYPES[scsi_type])()
+        controller.key = self._temporary_key()
+        controller.busNumber = bus
+        controller.sharedBus = vim.vm.device.VirtualSCSIController.Sharing.noSharing
+        self.device_changes.append(vim.vm.device.VirtualDeviceSpec(
+            operation=vim.vm.device.VirtualDeviceSpec.Operation.add, device=controller))
+        self.controllers[bus] = controller
+        self.controllers_added.append(bus)
+        return controller.key
+
+    def plan(self, disk, default_datastore=None):
+        bus, unit = disk['scsi_controller'], disk['unit_number']
+        size_kb = disk['size_gb'] * KB_PER_GB
+        entry = {'scsi_controller': bus, 'unit_number': unit, 'size_gb': disk['size_gb']}
+        existing = self.disks.get((bus, unit))
+        if existing is not None:
+            if existing.capacityInKB >= size_kb:
+                entry['action'] = 'unchanged'
+                if existing.capacityInKB > size_kb:
+                    entry['note'] = "disk is larger than requested, disks are never shrunk"
+            else:
+                existing.capacityInKB = size_kb
+                existing.capacityInBytes = size_kb * 1024
+                self.device_changes.append(vim.vm.device.VirtualDeviceSpec(
+                    operation=vim.vm.device.VirtualDeviceSpec.Operation.edit, device=existing))
+                entry['action'] = 'grown'
+            self.actions.append(entry)
+            return
+
+        disk_type = disk['type']
+        backing = vim.vm.device.VirtualDisk.FlatVer2BackingInfo(
+            diskMode='persistent',
+            thinProvisioned=disk_type == 'thin',
+            eagerlyScrub=disk_type == 'eagerzeroedthick')
+        datastore_name = disk.get('datastore') or default_datastore
+        if datastore_name:
+            backing.fileName = "[%s]" % datastore_name
+            backing.datastore = self.datastore_lookup(datastore_name)
+        device = vim.vm.device.VirtualDisk(
+            key=self._temporary_key(),
+            controllerKey=self._controller_key(bus, disk['scsi_type']),
+            unitNumber=unit,
+            capacityInKB=size_kb,
+            capacityInBytes=size_kb * 1024,
+            backing=backing)
+        self.device_changes.append(vim.vm.device.VirtualDeviceSpec(
+            operation=vim.vm.device.VirtualDeviceSpec.Operation.add,
+            fileOperation=vim.vm.device.VirtualDeviceSpec.FileOperation.create,
+            device=device))
+        self.disks[(bus, unit)] = device
+        entry['action'] = 'added'
+        entry['datastore'] = datastore_name
+        self.actions.append(entry)
+
+
+def run_module():
+    """Main module execution function"""
+
+    module_args = vmware_argument_spec() if HAS_COMMUNITY_VMWARE else {}
+    module_args.update(
+        name=dict(type='str', required=True),
+        datacenter=dict(type='str', required=False),
+        folder=dict(type='str', required=False),
+        disks=dict(type='list', elements='dict', required=False, default=[], options=dict(
+            size_gb=dict(type='int', required=True),
+            type=dict(type='str', default='thin', choices=['thin', 'thick', 'eagerzeroedthick']),
+            datastore=dict(type='str'),
+            scsi_controller=dict(type='int', default=0),
+            unit_number=dict(type='int', required=True),
+            scsi_type=dict(type='str', default='paravirtual', choices=list(SCSI_CONTROLLER_TYPES))
+        )),
+        default_datastore=dict(type='str', required=False)
+    )
+
+    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+
+    if not HAS_COMMUNITY_VMWARE:
+        module.fail_json(msg="The community.vmware collection and pyvmomi are required for this module")
+
+    params = module.params
+    for disk in params['disks']:
+        error = validate_disk(disk)
+        if error:
+            module.fail_json(msg="Invalid disk request: %s" % error)
+    slots = [(disk['scsi_controller'], disk['unit_number']) for disk in params['disks']]
+    if len(slots) != len(set(slots)):
+        module.fail_json(msg="Several disks request the same controller and unit number")
+
+    timer = SpanTimer()
+    try:
+        pyv = timer.call('connect', PyVmomi, module)
+        vm = timer.call('get_vm', pyv.get_vm)
+        if vm is None:
+            module.fail_json(msg=f"VM '{params['name']}' not found", **timer.as_result())
+        devices = timer.call('read_devices', lambda: list(vm.config.hardware.device))
+
+        datastores = {}
+
+        def datastore_lookup(name):
+            if name not in datastores:
+                datastores[name] = timer.call('find_datastore', find_datastore_by_name,
+                                              pyv.content, name, params['datacenter'])
+                if datastores[name] is None:
+                    module.fail_json(msg=f"Datastore '{name}' not found", **timer.as_result())
+            return datastores[name]
+
+        planner = DiskPlanner(devices, datastore_lookup)
+        for disk in params['disks']:
+            planner.plan(disk, params['default_datastore'])
+
+        changed = bool(planner.device_changes)
+        reconfigure_calls = 0
+        if changed and not module.check_mode:
+            spec = vim.vm.ConfigSpec(deviceChange=planner.device_changes)
+            task = timer.call('reconfigure_vm', vm.ReconfigVM_Task, spec=spec)
+            reconfigure_calls = 1
+            with timer.span('wait_for_task', target=params['name']):
+                wait_for_task(task)
+            devices = timer.call('read_devices', lambda: list(vm.config.hardware.device))
+        elif changed:
+            # Grown disks already carry their new capacity; append the controllers and disks that would be
+            # added, keeping NVMe, SATA and IDE disks the SCSI planner does not index
+            devices = devices + [change.device for change in planner.device_changes
+                                 if change.operation == vim.vm.device.VirtualDeviceSpec.Operation.add]
+
+    except vmodl.MethodFault as e:
+        module.fail_json(msg=f"Disk reconfiguration failed: {e.msg}", **timer.as_result())
+    except TaskError as e:
+        module.fail_json(msg=f"Disk reconfiguration failed: {str(e)}", **timer.as_result())
+
+    module.exit_json(**timer.as_result({
+        'changed': changed,
+        'disks': planner.actions,
+        'controllers_added': planner.controllers_added,
+        'guest_disk_info': guest_disk_info(devices),
+        'reconfigure_calls': reconfigure_calls,
+    }))
+
+
+def main():
+    """Main entry point"""
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: VMware Guest Readiness
+
+Waits until a batch of VMs reports a guest IP address and running VMware
+Tools, in one session. The VMs are looked up with one property collector
+retrieval and then watched through a property filter with WaitForUpdatesEx,
+so vCenter pushes the guest changes instead of every VM being polled; each VM
+is marked ready as soon as its update arrives and times out on its own
+deadline.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_guest_readiness
+short_description: Wait for guest IP and VMware Tools of a batch of VMs with one change feed
+description:
+    - Finds every VM of the batch with one property collector retrieval
+    - Watches power state, VMware Tools status and guest IP of all of them with one property filter and WaitForUpdatesEx, instead of polling each VM
+    - Marks each VM ready when its guest reports what C(wait_for) asks for and times out each VM on its own deadline
+    - Replaces C(wait_for_ip_address) of vmware_guest, so a slow guest no longer holds the clone task or triggers its retries
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    datacenter:
+        description:
+            - Datacenter of the VMs
+        required: true
+        type: str
+    vms:
+        description:
+            - VM names, or dicts with C(name) and an optional C(timeout) in seconds
+        required: true
+        type: list
+        elements: raw
+    timeout:
+        description:
+            - Seconds each VM may take to become ready, counted from the start of the task
+        required: false
+        type: int
+        default: 600
+    wait_for:
+        description:
+            - C(ip) waits for a guest IP address that is not link-local, C(tools) for running VMware Tools
+        required: false
+        type: list
+        elements: str
+        choices: ['ip', 'tools']
+        default: ['ip', 'tools']
+    update_wait_seconds:
+        description:
+            - Longest single WaitForUpdatesEx call; the wait is cut shorter when a VM deadline comes first
+        required: false
+        type: int
+        default: 60
+    fail_on_timeout:
+        description:
+            - Fail the task when a VM is not ready in time, is not found or is deleted while waiting
+        required: false
+        type: bool
+        default: true
+'''
+
+EXAMPLES = r'''
+- name: Wait for guest readiness
+  vmware_guest_readiness:
+    hostname: "{{ vcenter.hostname }}"
+    username: "{{ vcenter.username }}"
+    password: "{{ vcenter.password }}"
+    validate_certs: "{{ vcenter.validate_certs }}"
+    datacenter: "{{ datacenter }}"
+    vms: "{{ ansible_play_hosts | map('extract', hostvars, 'vm_name') | list }}"
+    timeout: 900
+  run_once: true
+  register: vm_readiness
+
+# Windows guests take longer to finish sysprep
+- name: Wait for a mixed batch
+  vmware_guest_readiness:
+    datacenter: "{{ datacenter }}"
+    vms:
+      - web-01
+      - name: win-app-01
+        timeout: 1800
+'''
+
+RETURN = r'''
+vms:
+    description: Readiness per VM
+    returned: always
+    type: dict
+    sample:
+        web-01:
+            status: ready
+            power_state: poweredOn
+            tools_status: guestToolsRunning
+            ip_address: "10.20.30.41"
+            ready_after_seconds: 41.7
+ready:
+    description: Ready VMs in the order they became ready
+    returned: always
+    type: list
+    elements: str
+not_ready:
+    description: VMs that timed out (C(timeout)), were not found (C(not_found)) or were deleted while waiting (C(removed))
+    returned: always
+    type: list
+    elements: str
+wait_calls:
+    description: WaitForUpdatesEx calls made
+    returned: always
+    type: int
+    sample: 7
+elapsed_seconds:
+    description: Time spent waiting for the whole batch
+    returned: always
+    type: float
+    sample: 63.2
+vcenter_spans:
+    description: Timing of the vCenter calls made by this run
+    returned: always
+    type: list
+    elements: dict
+'''
+
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.property_collector import PropertyWatch, retrieve_properties
+from ansible.module_utils.span_timer import SpanTimer
+
+try:
+    from pyVmomi import vmodl
+    from ansible_collections.community.vmware.plugins.module_utils.vmware import (
+        PyVmomi, vmware_argument_spec, find_datacenter_by_name
+    )
+    HAS_COMMUNITY_VMWARE = True
+except ImportError:
+    HAS_COMMUNITY_VMWARE = False
+
+WATCHED_PATHS = ['runtime.powerState', 'guest.toolsRunningStatus', 'guest.ipAddress']
+
+LINK_LOCAL_PREFIXES = ('169.254.', 'fe80:')
+
+
+def normalize_vms(vms, default_timeout):
+    """{name: timeout} from the vms option; raises ValueError on a malformed entry"""
+    timeouts = {}
+    for entry in vms:
+        if isinstance(entry, dict):
+            name = entry.get('name')
+            timeout = entry.get('timeout', default_timeout)
+        else:
+            name, timeout = entry, default_timeout
+        if not isinstance(name, str) or not name:
+            raise ValueError("every vms entry needs a name: %r" % (entry,))
+        try:
+            timeout = int(timeout)
+        except (TypeError, ValueError):
+            raise ValueError("timeout of %s is not a number: %r" % (name, timeout))
+        timeouts[name] = timeout
+    return timeouts
+
+
+def is_ready(guest, wait_for):
+    """Whether the watched guest properties satisfy every wait_for condition"""
+    if guest.get('runtime.powerState') != 'poweredOn':
+        return False
+    if 'tools' in wait_for and guest.get('guest.toolsRunningStatus') != 'guestToolsRunning':
+        return False
+    if 'ip' in wait_for:
+        address = guest.get('guest.ipAddress')
+        if not address or address.lower().startswith(LINK_LOCAL_PREFIXES):
+            return False
+    return True
+
+
+class ReadinessTracker:
+    """Per-VM guest state, deadlines and outcome of one batch"""
+
+    def __init__(self, timeouts, wait_for):
+        self.started = time.monotonic()
+        self.wait_for = wait_for
+        self.deadlines = {name: self.started + timeout for name, timeout in timeouts.items()}
+        self.guests = {name: {} for name in timeouts}
+        self.status = {}
+        self.ready_after = {}
+        self.ready = []
+
+    @property
+    def pending(self):
+        return [name for name in self.deadlines if name not in self.status]
+
+    def resolve(self, name, status):
+        self.status.setdefault(name, status)
+
+    def update(self, name, kind, values):
+        """Apply one object update; marks the VM ready or removed"""
+        if name in self.status:
+            return
+        if kind == 'leave':
+            self.resolve(name, 'removed')
+            return
+        self.guests[name].update(values)
+        if is_ready(self.guests[name], self.wait_for):
+            self.resolve(name, 'ready')
+            self.ready_after[name] = round(time.monotonic() - self.started, 3)
+            self.ready.append(name)
+
+    def expire(self):
+        """Time out the pending VMs past their deadline"""
+        now = time.monotonic()
+        for name in self.pending:
+            if self.deadlines[name] <= now:
+                self.resolve(name, 'timeout')
+
+    def next_deadline(self):
+        return min(self.deadlines[name] for name in self.pending)
+
+    def results(self):
+        vms = {}
+        for name in self.deadlines:
+            guest = self.guests[name]
+            vms[name] = {
+                'status': self.status.get(name, 'timeout'),
+                'power_state': guest.get('runtime.powerState'),
+                'tools_status': guest.get('guest.toolsRunningStatus'),
+                'ip_address': guest.get('guest.ipAddress'),
+                'ready_after_seconds': self.ready_after.get(name),
+            }
+        return vms
+
+
+def run_module():
+    """Main module execution function"""
+
+    module_args = vmware_argument_spec() if HAS_COMMUNITY_VMWARE else {}
+    module_args.update(
+        datacenter=dict(type='str', required=True),
+        vms=dict(type='list', elements='raw', required=True),
+        timeout=dict(type='int', required=False, default=600),
+        wait_for=dict(type='list', elements='str', required=False, default=['ip', 'tools'], choices=['ip', 'tools']),
+        update_wait_seconds=dict(type='int', required=False, default=60),
+        fail_on_timeout=dict(type='bool', required=False, default=True)
+    )
+
+    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+
+    if not HAS_COMMUNITY_VMWARE:
+        module.fail_json(msg="The community.vmware collection and pyvmomi are required for this module")
+
+    params = module.params
+    try:
+        timeouts = normalize_vms(params['vms'], params['timeout'])
+    except ValueError as e:
+        module.fail_json(msg="Invalid vms: %s" % e)
+    if params['update_wait_seconds'] < 1:
+        module.fail_json(msg="update_wait_seconds must be at least 1")
+
+    timer = SpanTimer()
+    tracker = ReadinessTracker(timeouts, params['wait_for'])
+    wait_calls = 0
+
+    try:
+        pyv = timer.call('connect', PyVmomi, module)
+        datacenter = timer.call('find_datacenter', find_datacenter_by_name, pyv.content, params['datacenter'])
+        if datacenter is None:
+            module.fail_json(msg=f"Datacenter '{params['datacenter']}' not found", **timer.as_result())
+
+        with timer.span('find_vms', vms=len(timeouts)):
+            objects, _round_trips = retrieve_properties(pyv.content, datacenter, [('VirtualMachine', ['name'])])
+        found = {}
+        for obj, props in objects:
+            if props.get('name') in timeouts:
+                found.setdefault(props['name'], obj)
+        for name in timeouts:
+            if name not in found:
+                tracker.resolve(name, 'not_found')
+
+        if found:
+            names_by_moid = {obj._moId: name for name, obj in found.items()}
+            with timer.span('create_filter', vms=len(found)):
+                watch = PropertyWatch(pyv.content, list(found.values()), 'VirtualMachine', WATCHED_PATHS)
+            try:
+                while True:
+                    tracker.expire()
+                    if not tracker.pending:
+                        break
+                    max_wait = min(params['update_wait_seconds'], tracker.next_deadline() - time.monotonic())
+                    with timer.span('wait_for_updates', pending=len(tracker.pending)):
+                        changes = watch.wait(max_wait)
+                    for obj, kind, values in changes:
+                        name = names_by_moid.get(obj._moId)
+                        if name is not None:
+                            tracker.update(name, kind, values)
+            finally:
+                wait_calls = watch.waits
+                timer.call('destroy_filter', watch.close)
+
+    except vmodl.MethodFault as e:
+        module.fail_json(msg=f"Guest readiness wait failed: {e.msg}", **timer.as_result({
+            'vms': tracker.results(), 'ready': tracker.ready, 'wait_calls': wait_calls}))
+
+    vms = tracker.results()
+    not_ready = [name for name, vm in vms.items() if vm['status'] != 'ready']
+    result = timer.as_result({
+        'changed': False,
+        'vms': vms,
+        'ready': tracker.ready,
+        'not_ready': not_ready,
+        'wait_calls': wait_calls,
+        'elapsed_seconds': round(time.monotonic() - tracker.started, 3),
+    })
+    if not_ready and params['fail_on_timeout']:
+        module.fail_json(msg=f"{len(not_ready)} of {len(vms)} VM(s) not ready: " + ', '.join(
+            f"{name} ({vms[name]['status']})" for name in not_ready), **result)
+    module.exit_json(**result)
+
+
+def main():
+    """Main entry point"""
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: VMware Placement Plan
+
+Chooses a datastore and host for every VM of a wave. Capacity of all
+datastores listed for the environment and of the cluster hosts is read with
+one property collector retrieval; VMs are then packed in-process against
+in-memory reservations, largest disk first, onto the datastore of their tier
+with the most usable free space. Bookings are kept in a locked ledger so
+concurrent runs against the same datacenter never promise the same space.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_placement_plan
+short_description: Plan datastore and host placement for a wave of VMs
+description:
+    - Reads capacity of every datastore in the environment C(datastores) tiers and of the cluster hosts with one property collector retrieval
+    - Places VMs largest disk first onto the datastore of their tier with the most usable free space, in O(log n) per VM
+    - Picks the connected host with the most free memory that mounts the chosen datastore
+    - Books placements in a locked on-disk ledger so concurrent runs do not oversubscribe a datastore
+    - With C(state=released), drops the bookings of VMs that now exist without contacting vCenter
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    datacenter:
+        description:
+            - Datacenter holding the datastores and hosts
+        required: true
+        type: str
+    cluster:
+        description:
+            - Cluster whose hosts are placement candidates; without it the host is left to DRS
+        required: false
+        type: str
+    datastores:
+        description:
+            - Datastores in the environment C(datastores) format, keyed by tier
+            - A tier holds one datastore definition with C(name) or a list of them
+        required: false
+        type: dict
+        default: {}
+    vms:
+        description:
+            - VMs of the wave
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description: VM name
+                type: str
+                required: true
+            disk_gb:
+                description: Provisioned disk size to reserve
+                type: float
+            memory_mb:
+                description: Memory to reserve on the host
+                type: int
+            tier:
+                description: Storage tier, C(default_tier) when omitted
+                type: str
+    default_tier:
+        description:
+            - Tier for VMs that do not name one
+        required: false
+        type: str
+        default: tier1
+    allow_tier_fallback:
+        description:
+            - Place a VM on a later tier (in sorted tier order) when its own tier is full
+        required: false
+        type: bool
+        default: false
+    headroom_percent:
+        description:
+            - Share of each datastore capacity never handed out
+        required: false
+        type: float
+        default: 10
+    ledger_dir:
+        description:
+            - Directory of the reservation ledger shared by concurrent runs
+        required: false
+        type: str
+        default: /tmp/ansible_placement
+    run_id:
+        description:
+            - Identifier recorded with the bookings of this run
+        required: false
+        type: str
+        default: default
+    reservation_ttl:
+        description:
+            - Seconds after which an unreleased booking no longer counts
+        required: false
+        type: int
+        default: 3600
+    state:
+        description:
+            - C(planned) places the wave and books it, C(released) drops the bookings of the listed VMs
+        required: false
+        type: str
+        choices: ['planned', 'released']
+        default: planned
+    fail_on_unplaced:
+        description:
+            - Fail when any VM of the wave cannot be placed
+        required: false
+        type: bool
+        default: true
+'''
+
+EXAMPLES = r'''
+- name: Plan placement for the VM
+  vmware_placement_plan:
+    hostname: "{{ vcenter.hostname }}"
+    username: "{{ vcenter.username }}"
+    password: "{{ vcenter.password }}"
+    validate_certs: "{{ vcenter.validate_certs }}"
+    datacenter: "{{ datacenter }}"
+    cluster: "{{ cluster }}"
+    datastores: "{{ datastores }}"
+    vms:
+      - name: "{{ vm_name }}"
+        disk_gb: "{{ vm_defaults.disk_gb }}"
+        memory_mb: "{{ vm_defaults.memory_mb }}"
+        tier: tier1
+    run_id: "{{ awx_job_id | default('local') }}"
+  register: placement
+
+- name: Release the booking once the VM exists
+  vmware_placement_plan:
+    datacenter: "{{ datacenter }}"
+    vms:
+      - name: "{{ vm_name }}"
+    state: released
+'''
+
+RETURN = r'''
+placements:
+    description: Placement per VM name
+    type: dict
+    returned: always
+    sample: {"dev-dc1-rhel9-app-001": {"datastore": "DEV-SSD-01", "host": "esx01.example.com", "tier": "tier1"}}
+unplaced:
+    description: Reason per VM that could not be placed
+    type: dict
+    returned: always
+datastores:
+    description: Capacity, pending bookings and usable space left per datastore after the wave
+    type: dict
+    returned: when state is planned
+missing_datastores:
+    description: Configured datastores that were not found or are not usable
+    type: list
+    returned: when state is planned
+released:
+    description: VMs whose bookings were dropped
+    type: list
+    returned: when state is released
+fetch_calls:
+    description: Property collector round trips used to read capacity
+    type: int
+    returned: when state is planned
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.placement_planner import PlacementPlanner, ReservationLedger, MB
+from ansible.module_utils.property_collector import retrieve_properties
+from ansible.module_utils.span_timer import SpanTimer
+
+try:
+    from pyVmomi import vim, vmodl
+    from ansible_collections.community.vmware.plugins.module_utils.vmware import (
+        PyVmomi, vmware_argument_spec, find_datacenter_by_name
+    )
+    HAS_COMMUNITY_VMWARE = True
+except ImportError:
+    HAS_COMMUNITY_VMWARE = False
+
+
+PROPERTY_PATHS = (
+    ('Datastore', ['name', 'summary.accessible', 'summary.maintenanceMode',
+                   'summary.capacity', 'summary.freeSpace']),
+    ('ClusterComputeResource', ['name']),
+    ('HostSystem', ['name', 'parent', 'datastore', 'runtime.connectionState', 'runtime.inMaintenanceMode',
+                    'summary.hardware.memorySize', 'summary.quickStats.overallMemoryUsage']),
+)
+
+
+def configured_datastores(datastores):
+    """Map datastore name to tier from the environment C(datastores) dict"""
+    tiers = {}
+    for tier, definition in (datastores or {}).items():
+        entries = definition if isinstance(definition, list) else [definition]
+        for entry in entries:
+            name = entry.get('name') if isinstance(entry, dict) else entry
+            if name:
+                tiers[str(name)] = tier
+    return tiers
+
+
+def capacity_from_inventory(objects, tiers, cluster=None):
+    """Build planner inputs from one property collector retrieval"""
+    datastores = {}
+    unusable = []
+    names_by_moid = {}
+    clusters = {}
+    host_records = []
+    for obj, props in objects:
+        if isinstance(obj, vim.Datastore):
+            names_by_moid[obj._moId] = props.get('name')
+            name = props.get('name')
+            if name not in tiers:
+                continue
+            if not props.get('summary.accessible', False) or \
+                    props.get('summary.maintenanceMode', 'normal') != 'normal':
+                unusable.append(name)
+                continue
+            datastores[name] = {"name": name, "tier": tiers[name],
+                                "capacity": int(props.get('summary.capacity') or 0),
+                                "free_space": int(props.get('summary.freeSpace') or 0)}
+        elif isinstance(obj, vim.ClusterComputeResource):
+            clusters[obj._moId] = props.get('name')
+        elif isinstance(obj, vim.HostSystem):
+            host_records.append(props)
+
+    hosts = []
+    if cluster:
+        for props in host_records:
+            parent = props.get('parent')
+            if parent is None or clusters.get(parent._moId) != cluster:
+                continue
+            if props.get('runtime.connectionState') != 'connected' or props.get('runtime.inMaintenanceMode'):
+                continue
+            mounted = [names_by_moid.get(ds._moId) for ds in props.get('datastore') or []]
+            hosts.append({"name": props.get('name'),
+                          "memory_total_mb": int(props.get('summary.hardware.memorySize') or 0) // MB,
+                          "memory_used_mb": int(props.get('summary.quickStats.overallMemoryUsage') or 0),
+                          "datastores": [name for name in mounted if name in datastores]})
+
+    missing = sorted(set(tiers) - set(datastores) - set(unusable))
+    return list(datastores.values()), hosts, sorted(unusable) + missing
+
+
+def plan_wave(planner, ledger_document, vms, default_tier):
+    """Apply other runs' bookings, then place the wave"""
+    wave = {vm['name'] for vm in vms}
+    for name, booking in ledger_document["reservations"].items():
+        if name not in wave:
+            planner.reserve(booking["datastore"], booking["disk_bytes"],
+                            booking.get("host"), booking.get("memory_mb", 0))
+    return planner.plan(vms, default_tier)
+
+
+def run_module():
+    """Main module execution function"""
+
+    module_args = vmware_argument_spec() if HAS_COMMUNITY_VMWARE else {}
+    module_args.update(
+        datacenter=dict(type='str', required=True),
+        cluster=dict(type='str', required=False),
+        datastores=dict(type='dict', required=False, default={}),
+        vms=dict(type='list', elements='dict', required=True),
+        default_tier=dict(type='str', required=False, default='tier1'),
+        allow_tier_fallback=dict(type='bool', required=False, default=False),
+        headroom_percent=dict(type='float', required=False, default=10),
+        ledger_dir=dict(type='str', required=False, default='/tmp/ansible_placement'),
+        run_id=dict(type='str', required=False, default='default'),
+        reservation_ttl=dict(type='int', required=False, default=3600),
+        state=dict(type='str', required=False, choices=['planned', 'released'], default='planned'),
+        fail_on_unplaced=dict(type='bool', required=False, default=True)
+    )
+
+    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+    params = module.params
+
+    for vm in params['vms']:
+        if not vm.get('name'):
+            module.fail_json(msg="Every entry in vms needs a name")
+
+    ledger = ReservationLedger(params['ledger_dir'], "%s_%s" % (params.get('hostname') or 'vcenter',
+                                                                 params['datacenter']),
+                               params['reservation_ttl'])
+
+    if params['state'] == 'released':
+        names = [vm['name'] for vm in params['vms']]
+        released = [] if module.check_mode else ledger.release(names)
+        module.exit_json(changed=bool(released), released=released, placements={}, unplaced={})
+
+    if not HAS_COMMUNITY_VMWARE:
+        module.fail_json(msg="The community.vmware collection and pyvmomi are required for this module")
+
+    tiers = configured_datastores(params['datastores'])
+    if not tiers:
+        module.fail_json(msg="No datastores configured for placement")
+
+    timer = SpanTimer()
+    try:
+        pyv = timer.call('connect', PyVmomi, module)
+        datacenter = timer.call('find_datacenter', find_datacenter_by_name, pyv.content, params['datacenter'])
+        if datacenter is None:
+            module.fail_json(msg=f"Datacenter '{params['datacenter']}' not found", **timer.as_result())
+        with timer.span('retrieve_capacity'):
+            objects, fetch_calls = retrieve_properties(pyv.content, datacenter, PROPERTY_PATHS)
+    except vmodl.MethodFault as e:
+        module.fail_json(msg=f"Reading placement capacity failed: {e.msg}", **timer.as_result())
+
+    datastores, hosts, missing = capacity_from_inventory(objects, tiers, params['cluster'])
+
+    with timer.span('plan', vms=len(params['vms'])):
+        with ledger.locked():
+            document = ledger.load()
+            planner = PlacementPlanner(datastores, hosts, params['headroom_percent'],
+                                       allow_tier_fallback=params['allow_tier_fallback'])
+            placements, unplaced = plan_wave(planner, document, params['vms'], params['default_tier'])
+            if placements and not module.check_mode:
+                ledger.book(document, placements, params['run_id'])
+                ledger.store(document)
+
+    result = timer.as_result({
+        'changed': bool(placements),
+        'placements': {name: {"datastore": p["datastore"], "host": p["host"], "tier": p["tier"]}
+                       for name, p in sorted(placements.items())},
+        'unplaced': unplaced,
+        'datastores': planner.summary(),
+        'missing_datastores': missing,
+        'fetch_calls': fetch_calls,
+    })
+    if unplaced and params['fail_on_unplaced']:
+        module.fail_json(msg="Placement failed for %d VM(s): " % len(unplaced) +
+                         '; '.join("%s: %s" % item for item in sorted(unplaced.items())), **result)
+    module.exit_json(**result)
+
+
+def main():
+    """Main entry point"""
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: VMware Port Group Reconcile
+
+Desired-state reconciliation of distributed and standard port groups. The
+current configuration of every port group, switch and host in the datacenter
+is read with a single property collector retrieval, compared with the desired
+model built from the environment C(networks) and the role policy, and only the
+differing settings are written: one reconfigure per changed distributed port
+group, one add per switch for missing ones, and one update per host and
+changed standard port group. A run against an unchanged environment makes no
+write calls.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_portgroup_reconcile
+short_description: Apply only the changed port group settings for a set of networks
+description:
+    - Reads the current distributed port group, distributed switch and host port group configuration in one property collector retrieval
+    - Builds the desired model per network from C(networks) and C(policy); settings absent from both are not managed
+    - Sends one minimal reconfigure per changed distributed port group containing only the changed policy sections
+    - Creates missing distributed port groups with one add call per distributed switch
+    - Updates standard port groups only on the hosts where they differ
+    - Makes no write calls when nothing differs; in check mode only the differences are reported
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    datacenter:
+        description:
+            - Datacenter holding the networks
+        required: true
+        type: str
+    cluster:
+        description:
+            - Limit standard port group management to the hosts of this cluster
+        required: false
+        type: str
+    networks:
+        description:
+            - Networks in the environment C(networks) format, keyed by role
+            - Each value needs C(name), C(type) (C(distributed) or C(standard)) and C(vlan)
+            - A value may override the policy with C(num_ports), C(security), C(traffic_shaping) and C(teaming), and set C(dvswitch) or C(vswitch)
+        required: true
+        type: dict
+    policy:
+        description:
+            - Settings applied to every network unless overridden per network
+            - C(num_ports) (distributed only)
+            - C(security) with C(promiscuous_mode), C(mac_changes) and C(forged_transmits)
+            - C(traffic_shaping) with C(enabled), C(average_bandwidth), C(peak_bandwidth) and C(burst_size), applied to ingress and egress (distributed only)
+            - C(teaming) with C(load_balance_policy), C(notify_switches), C(rolling_order), C(active_uplinks) and C(standby_uplinks) (distributed only)
+        required: false
+        type: dict
+        default: {}
+    default_dvswitch:
+        description:
+            - Distributed switch for new distributed port groups without C(dvswitch)
+            - Defaults to the only distributed switch of the datacenter
+        required: false
+        type: str
+    default_vswitch:
+        description:
+            - Standard switch for new standard port groups without C(vswitch)
+        required: false
+        type: str
+        default: 'vSwitch0'
+    create_missing:
+        description:
+            - Create port groups that do not exist; otherwise they are reported as missing
+        required: false
+        type: bool
+        default: true
+extends_documentation_fragment:
+    - community.vmware.vmware.documentation
+requirements:
+    - python >= 3.8
+    - pyvmomi
+    - community.vmware
+notes:
+    - Supports check mode
+    - Port groups are matched by name; uplink port groups are ignored
+'''
+
+EXAMPLES = r'''
+# Reconcile the environment networks with the isolation policy
+- name: Reconcile port groups
+  vmware_portgroup_reconcile:
+    hostname: "{{ vcenter.hostname }}"
+    username: "{{ vcenter.username }}"
+    password: "{{ vcenter.password }}"
+    validate_certs: "{{ vcenter.validate_certs }}"
+    datacenter: "{{ datacenter }}"
+    cluster: "{{ cluster }}"
+    networks: "{{ networks }}"
+    policy:
+      num_ports: 128
+      security:
+        promiscuous_mode: false
+        mac_changes: false
+        forged_transmits: false
+  register: network_reconcile
+'''
+
+RETURN = r'''
+port_groups:
+    description: Reconciliation outcome per network
+    returned: always
+    type: list
+    elements: dict
+    sample:
+        - name: "PROD-APP-NET"
+          type: "distributed"
+          action: "reconfigure"
+          changes:
+            security.forged_transmits: {current: true, desired: false}
+        - name: "PROD-DB-NET"
+          type: "distributed"
+          action: "none"
+          changes: {}
+missing:
+    description: Networks that do not exist and were not created
+    returned: always
+    type: list
+    elements: str
+    sample: []
+fetch_calls:
+    description: Property collector round trips made to read the current state
+    returned: always
+    type: int
+    sample: 1
+write_calls:
+    description: Reconfigure, add and update calls sent to vCenter
+    returned: always
+    type: int
+    sample: 1
+vcenter_spans:
+    description: Timing of the vCenter calls made by this run
+    returned: always
+    type: list
+    elements: dict
+'''
+
+import copy
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.module_utils.property_collector import retrieve_properties
+from ansible.module_utils.span_timer import SpanTimer
+
+try:
+    from pyVmomi import vim, vmodl
+    from ansible_collections.community.vmware.plugins.module_utils.vmware import (
+        PyVmomi, vmware_argument_spec, find_datacenter_by_name, find_cluster_by_name, wait_for_task
+    )
+    HAS_COMMUNITY_VMWARE = True
+except ImportError:
+    HAS_COMMUNITY_VMWARE = False
+
+POLICY_SECTIONS = ('security', 'traffic_shaping', 'teaming')
+DISTRIBUTED_ONLY = ('num_ports', 'traffic_shaping', 'teaming')
+BOOL_SETTINGS = ('promiscuous_mode', 'mac_changes', 'forged_transmits', 'enabled', 'notify_switches', 'rolling_order')
+INT_SETTINGS = ('average_bandwidth', 'peak_bandwidth', 'burst_size')
+
+
+# ---------------------------------------------------------------------------
+# Desired model and diff
+# ---------------------------------------------------------------------------
+
+def _normalize(key, value):
+    """Coerce templated setting values to the types vCenter reports"""
+    if key in BOOL_SETTINGS:
+        return boolean(value)
+    if key in INT_SETTINGS:
+        return int(value)
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return value
+
+
+def desired_model(network, policy):
+    """Desired settings of one network; unset settings are left unmanaged"""
+    model = {
+        'name': network['name'],
+        'type': network.get('type', 'distributed'),
+        'vlan': int(network['vlan']) if network.get('vlan') is not None else None,
+        'switch': network.get('dvswitch') if network.get('type', 'distributed') == 'distributed'
+        else network.get('vswitch'),
+    }
+    num_ports = network.get('num_ports', policy.get('num_ports'))
+    if num_ports is not None:
+        model['num_ports'] = int(num_ports)
+    for section in POLICY_SECTIONS:
+        merged = dict(policy.get(section) or {})
+        merged.update(network.get(section) or {})
+        merged = {key: _normalize(key, value) for key, value in merged.items() if value is not None}
+        if merged:
+            model[section] = merged
+    if model['type'] == 'standard':
+        for setting in DISTRIBUTED_ONLY:
+            model.pop(setting, None)
+    return model
+
+
+def diff_model(current, desired):
+    """Managed settings whose current value differs, keyed by dotted path"""
+    changes = {}
+    if desired.get('vlan') is not None and current.get('vlan') != desired['vlan']:
+        changes['vlan'] = {'current': current.get('vlan'), 'desired': desired['vlan']}
+    if 'num_ports' in desired and current.get('num_ports') != desired['num_ports']:
+        changes['num_ports'] = {'current': current.get('num_ports'), 'desired': desired['num_ports']}
+    for section in POLICY_SECTIONS:
+        for key, value in desired.get(section, {}).items():
+            have = current.get(section, {}).get(key)
+            if have != value:
+                changes['%s.%s' % (section, key)] = {'current': have, 'desired': value}
+    return changes
+
+
+def changed_sections(changes):
+    """Top-level sections touched by a diff"""
+    return {path.split('.', 1)[0] for path in changes}
+
+
+# ---------------------------------------------------------------------------
+# Current state
+# ---------------------------------------------------------------------------
+
+PROPERTY_PATHS = (
+    ('DistributedVirtualPortgroup', ['name', 'config.configVersion', 'config.numPorts', 'config.uplink',
+                                     'config.distributedVirtualSwitch', 'config.defaultPortConfig']),
+    ('DistributedVirtualSwitch', ['name']),
+    ('HostSystem', ['name', 'parent', 'config.network.portgroup', 'configManager.networkSystem']),
+)
+
+
+def _value(policy):
+    """Value of an inheritable vSphere policy, None when unset"""
+    return None if policy is None else policy.value
+
+
+def _shaping(policy):
+    if policy is None:
+        return {}
+    return {
+        'enabled': _value(policy.enabled),
+        'average_bandwidth': _value(policy.averageBandwidth),
+        'peak_bandwidth': _value(policy.peakBandwidth),
+        'burst_size': _value(policy.burstSize),
+    }
+
+
+def distributed_current(props):
+    """Normalize a distributed port group configuration to the model layout"""
+    port = props.get('config.defaultPortConfig')
+    vlan = getattr(getattr(port, 'vlan', None), 'vlanId', None)
+    security = getattr(port, 'securityPolicy', None)
+    teaming = getattr(port, 'uplinkTeamingPolicy', None)
+    order = getattr(teaming, 'uplinkPortOrder', None)
+    ingress = _shaping(getattr(port, 'inShapingPolicy', None))
+    egress = _shaping(getattr(port, 'outShapingPolicy', None))
+    return {
+        'vlan': vlan if isinstance(vlan, int) else None,
+        'num_ports': props.get('config.numPorts'),
+        'security': {} if security is None else {
+            'promiscuous_mode': _value(security.allowPromiscuous),
+            'mac_changes': _value(security.macChanges),
+            'forged_transmits': _value(security.forgedTransmits),
+        },
+        # Ingress and egress are managed together; a mismatch between them reads as a difference
+        'traffic_shaping': {key: value if egress.get(key) == value else [value, egress.get(key)]
+                            for key, value in ingress.items()},
+        'teaming': {} if teaming is None else {
+            'load_balance_policy': _value(teaming.policy),
+            'notify_switches': _value(teaming.notifySwitches),
+            'rolling_order': _value(teaming.rollingOrder),
+            'active_uplinks': list(order.activeUplinkPort or []) if order else [],
+            'standby_uplinks': list(order.standbyUplinkPort or []) if order else [],
+        },
+    }
+
+
+def standard_current(portgroup):
+    """Normalize a host port group to the model layout"""
+    spec = portgroup.spec
+    explicit = getattr(getattr(spec, 'policy', None), 'security', None)
+    effective = getattr(getattr(portgroup, 'computedPolicy', None), 'security', None)
+
+    def setting(name):
+        value = getattr(explicit, name, None)
+        return getattr(effective, name, None) if value is None else value
+
+    return {
+        'vlan': spec.vlanId,
+        'switch': spec.vswitchName,
+        'security': {
+            'promiscuous_mode': setting('allowPromiscuous'),
+            'mac_changes': setting('macChanges'),
+            'forged_transmits': setting('forgedTransmits'),
+        },
+    }
+
+
+class NetworkState:
+    """Current port groups, switches and hosts of a datacenter"""
+
+    def __init__(self, objects, cluster=None):
+        self.portgroups = {}
+        self.switches = {}
+        self.hosts = []
+        cluster_id = cluster._moId if cluster is not None else None
+        for obj, props in objects:
+            if isinstance(obj, vim.DistributedVirtualPortgroup):
+                if not props.get('config.uplink'):
+                    self.portgroups[props['name']] = (obj, props)
+            elif isinstance(obj, vim.DistributedVirtualSwitch):
+                self.switches[props['name']] = obj
+            elif isinstance(obj, vim.HostSystem):
+                parent = props.get('parent')
+                if cluster_id is None or (parent is not None and parent._moId == cluster_id):
+                    portgroups = {pg.spec.name: pg for pg in props.get('config.network.portgroup') or []}
+                    self.hosts.append((props['name'], props.get('configManager.networkSystem'), portgroups))
+
+
+# ---------------------------------------------------------------------------
+# Specs
+# ---------------------------------------------------------------------------
+
+def _bool(value):
+    return vim.BoolPolicy(value=bool(value), inherited=False)
+
+
+def _long(value):
+    return vim.LongPolicy(value=int(value), inherited=False)
+
+
+def _merged(section, current, desired):
+    """Section settings to write: desired values over the current ones"""
+    settings = dict(current.get(section, {}))
+    settings.update(desired.get(section, {}))
+    return settings
+
+
+def distributed_port_config(sections, current, desired):
+    """Default port config holding only the given sections"""
+    port = vim.dvs.VmwareDistributedVirtualSwitch.VmwarePortConfigPolicy()
+    if 'vlan' in sections:
+        port.vlan = vim.dvs.VmwareDistributedVirtualSwitch.VlanIdSpec(vlanId=desired['vlan'], inherited=False)
+    if 'security' in sections:
+        settings = _merged('security', current, desired)
+        port.securityPolicy = vim.dvs.VmwareDistributedVirtualSwitch.SecurityPolicy(
+            allowPromiscuous=_bool(settings.get('promiscuous_mode', False)),
+            macChanges=_bool(settings.get('mac_changes', False)),
+            forgedTransmits=_bool(settings.get('forged_transmits', False)),
+            inherited=False)
+    if 'traffic_shaping' in sections:
+        settings = {key: value for key, value in _merged('traffic_shaping', current, desired).items()
+                    if value is not None and not isinstance(value, list)}
+        shaping = vim.dvs.DistributedVirtualPort.TrafficShapingPolicy(
+            enabled=_bool(settings.get('enabled', False)), inherited=False)
+        for key, attr in (('average_bandwidth', 'averageBandwidth'), ('peak_bandwidth', 'peakBandwidth'),
+                          ('burst_size', 'burstSize')):
+            if key in settings:
+                setattr(shaping, attr, _long(settings[key]))
+        port.inShapingPolicy = shaping
+        port.outShapingPolicy = shaping
+    if 'teaming' in sections:
+        settings = _merged('teaming', current, desired)
+        teaming = vim.dvs.VmwareDistributedVirtualSwitch.UplinkPortTeamingPolicy(inherited=False)
+        if settings.get('load_balance_policy') is not None:
+            teaming.policy = vim.StringPolicy(value=settings['load_balance_policy'], inherited=False)
+        if settings.get('notify_switches') is not None:
+            teaming.notifySwitches = _bool(settings['notify_switches'])
+        if settings.get('rolling_order') is not None:
+            teaming.rollingOrder = _bool(settings['rolling_order'])
+        if settings.get('active_uplinks') or settings.get('standby_uplinks'):
+            teaming.uplinkPortOrder = vim.dvs.VmwareDistributedVirtualSwitch.UplinkPortOrderPolicy(
+                activeUplinkPort=list(settings.get('active_uplinks') or []),
+                standbyUplinkPort=list(settings.get('standby_uplinks') or []),
+                inherited=False)
+        port.uplinkTeamingPolicy = teaming
+    return port
+
+
+def distributed_reconfigure_spec(props, current, desired, changes):
+    """Reconfigure spec containing only the changed settings"""
+    sections = changed_sections(changes)
+    spec = vim.dvs.DistributedVirtualPortgroup.ConfigSpec(configVersion=props['config.configVersion'])
+    if 'num_ports' in sections:
+        spec.numPorts = desired['num_ports']
+    if sections - {'num_ports'}:
+        spec.defaultPortConfig = distributed_port_config(sections, current, desired)
+    return spec
+
+
+def distributed_create_spec(desired):
+    """Config spec for a new distributed port group"""
+    sections = {'vlan'} if desired.get('vlan') is not None else set()
+    sections.update(section for section in POLICY_SECTIONS if section in desired)
+    return vim.dvs.DistributedVirtualPortgroup.ConfigSpec(
+        name=desired['name'], type='earlyBinding', numPorts=desired.get('num_ports', 128),
+        defaultPortConfig=distributed_port_config(sections, {}, desired))
+
+
+def standard_spec(current, desired):
+    """Host port group spec with the desired settings over the current ones"""
+    security = _merged('security', current, desired)
+    spec = vim.host.PortGroup.Specification(
+        name=desired['name'],
+        vlanId=desired['vlan'] if desired.get('vlan') is not None else current.get('vlan', 0),
+        vswitchName=current.get('switch') or desired['switch'],
+        policy=vim.host.NetworkPolicy())
+    if desired.get('security'):
+        spec.policy.security = vim.host.NetworkPolicy.SecurityPolicy(
+            allowPromiscuous=security.get('promiscuous_mode'),
+            macChanges=security.get('mac_changes'),
+            forgedTransmits=security.get('forged_transmits'))
+    return spec
+
+
+# ---------------------------------------------------------------------------
+# Reconciliation
+# ---------------------------------------------------------------------------
+
+class PortgroupReconciler:
+    """Plans and applies the port group delta"""
+
+    def __init__(self, module, timer, state):
+        self.module = module
+        self.timer = timer
+        self.state = state
+        self.write_calls = 0
+        self.results = []
+        self.missing = []
+        self._creates = {}
+
+    def _write(self, name, func, *args, **kwargs):
+        self.write_calls += 1
+        return self.timer.call(name, func, *args, **kwargs)
+
+    def _default_dvswitch(self):
+        name = self.module.params['default_dvswitch']
+        if name:
+            return name
+        if len(self.state.switches) == 1:
+            return next(iter(self.state.switches))
+        return None
+
+    def plan_distributed(self, desired):
+        entry = {'name': desired['name'], 'type': 'distributed', 'action': 'none', 'changes': {}}
+        existing = self.state.portgroups.get(desired['name'])
+        if existing is None:
+            switch = desired.get('switch') or self._default_dvswitch()
+            if not self.module.params['create_missing'] or switch not in self.state.switches:
+                entry['action'] = 'missing'
+                self.missing.append(desired['name'])
+            else:
+                entry['action'] = 'create'
+                entry['switch'] = switch
+                self._creates.setdefault(switch, []).append(desired)
+            self.results.append(entry)
+            return None
+        obj, props = existing
+        current = distributed_current(props)
+        changes = diff_model(current, desired)
+        entry['changes'] = changes
+        self.results.append(entry)
+        if not changes:
+            return None
+        entry['action'] = 'reconfigure'
+        return obj, distributed_reconfigure_spec(props, current, desired, changes)
+
+    def plan_standard(self, desired):
+        entry = {'name': desired['name'], 'type': 'standard', 'action': 'none', 'changes': {}, 'hosts': []}
+        writes = []
+        present = False
+        desired = dict(desired, switch=desired.get('switch') or self.module.params['default_vswitch'])
+        for host_name, network_system, portgroups in self.state.hosts:
+            portgroup = portgroups.get(desired['name'])
+            if portgroup is None:
+                if self.module.params['create_missing']:
+                    entry['hosts'].append({'host': host_name, 'action': 'create'})
+                    writes.append(('add_portgroup', network_system.AddPortGroup,
+                                   {'portgrp': standard_spec({}, desired)}))
+                continue
+            present = True
+            current = standard_current(portgroup)
+            changes = diff_model(current, desired)
+            if changes:
+                entry['hosts'].append({'host': host_name, 'action': 'update', 'changes': changes})
+                entry['changes'].update(changes)
+                writes.append(('update_portgroup', network_system.UpdatePortGroup,
+                               {'pgName': desired['name'], 'portgrp': standard_spec(current, desired)}))
+        if writes:
+            entry['action'] = 'update'
+        elif not present:
+            entry['action'] = 'missing'
+            self.missing.append(desired['name'])
+        self.results.append(entry)
+        return writes
+
+    def run(self, networks, policy):
+        reconfigures = []
+        host_writes = []
+        for _key, network in sorted(networks.items()):
+            desired = desired_model(network, policy)
+            if desired['type'] == 'distributed':
+                planned = self.plan_distributed(desired)
+                if planned:
+                    reconfigures.append((desired['name'], planned))
+            else:
+                host_writes.extend(self.plan_standard(desired))
+
+        if self.module.check_mode:
+            return
+
+        # Start every write first so vCenter processes the tasks concurrently, then wait
+        tasks = []
+        for name, (obj, spec) in reconfigures:
+            tasks.append((name, self._write('reconfigure_portgroup', obj.ReconfigureDVPortgroup_Task, spec=spec)))
+        for switch, creates in self._creates.items():
+            specs = [distributed_create_spec(desired) for desired in creates]
+            tasks.append((switch, self._write('add_portgroups', self.state.switches[switch].AddDVPortgroup_Task,
+                                              spec=specs)))
+        for name, func, kwargs in host_writes:
+            self._write(name, func, **kwargs)
+        for name, task in tasks:
+            with self.timer.span('wait_for_task', target=name):
+                wait_for_task(task)
+
+
+def run_module():
+    """Main module execution function"""
+
+    module_args = vmware_argument_spec() if HAS_COMMUNITY_VMWARE else {}
+    module_args.update(
+        datacenter=dict(type='str', required=True),
+        cluster=dict(type='str', required=False),
+        networks=dict(type='dict', required=True),
+        policy=dict(type='dict', required=False, default={}),
+        default_dvswitch=dict(type='str', required=False),
+        default_vswitch=dict(type='str', required=False, default='vSwitch0'),
+        create_missing=dict(type='bool', required=False, default=True)
+    )
+
+    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+
+    if not HAS_COMMUNITY_VMWARE:
+        module.fail_json(msg="The community.vmware collection and pyvmomi are required for this module")
+
+    params = module.params
+    timer = SpanTimer()
+
+    for key, network in params['networks'].items():
+        if not isinstance(network, dict) or not network.get('name'):
+            module.fail_json(msg=f"Network '{key}' must be a dict with a name")
+        if network.get('type', 'distributed') not in ('distributed', 'standard'):
+            module.fail_json(msg=f"Network '{key}' has unsupported type '{network.get('type')}'")
+
+    try:
+        pyv = timer.call('connect', PyVmomi, module)
+        datacenter = find_datacenter_by_name(pyv.content, params['datacenter'])
+        if datacenter is None:
+            module.fail_json(msg=f"Datacenter '{params['datacenter']}' not found")
+        cluster = None
+        if params['cluster']:
+            cluster = find_cluster_by_name(pyv.content, params['cluster'], datacenter)
+            if cluster is None:
+                module.fail_json(msg=f"Cluster '{params['cluster']}' not found")
+
+        with timer.span('retrieve_properties'):
+            objects, fetch_calls = retrieve_properties(pyv.content, datacenter, PROPERTY_PATHS)
+        reconciler = PortgroupReconciler(module, timer, NetworkState(objects, cluster))
+        reconciler.run(params['networks'], copy.deepcopy(params['policy']))
+
+    except vmodl.MethodFault as e:
+        module.fail_json(msg=f"Port group reconciliation failed: {e.msg}", **timer.as_result())
+    except Exception as e:
+        module.fail_json(msg=f"Port group reconciliation failed: {str(e)}", **timer.as_result())
+
+    pending = [entry for entry in reconciler.results if entry['action'] not in ('none', 'missing')]
+    module.exit_json(**timer.as_result({
+        'changed': bool(pending),
+        'port_groups': reconciler.results,
+        'missing': reconciler.missing,
+        'fetch_calls': fetch_calls,
+        'write_calls': reconciler.write_calls,
+    }))
+
+
+def main():
+    """Main entry point"""
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ansible Module: VMware VM Info Cache
+
+This Ansible module serves VM facts from a per-run snapshot cache so that the
+provisioning roles share one vCenter property fetch per VM instead of each
+calling vmware_guest_info.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_vm_info_cache
+short_description: Read VM facts through a per-run vCenter snapshot cache
+description:
+    - Returns the same C(instance) facts as vmware_guest_info, fetched once per run and served locally afterwards
+    - Cached reads only contact vCenter on a miss or after the entry expires
+    - Fresh reads always fetch from vCenter and refresh the cache entry
+    - Roles that change a VM invalidate its entry so the next read sees the change
+version_added: "2.0.0"
+author:
+    - VMware Provisioning Team
+options:
+    name:
+        description:
+            - Name of the VM to read or invalidate
+        required: true
+        type: str
+    datacenter:
+        description:
+            - Datacenter of the VM, part of the cache key
+        required: false
+        type: str
+    folder:
+        description:
+            - VM folder, used when several VMs share the same name
+        required: false
+        type: str
+    read_mode:
+        description:
+            - C(cached) serves a live cache entry and only fetches on a miss
+            - C(fresh) always fetches from vCenter and refreshes the entry
+        required: false
+        type: str
+        choices: ['cached', 'fresh']
+        default: 'cached'
+    state:
+        description:
+            - C(present) reads the VM facts
+            - C(invalidated) drops the cache entry without contacting vCenter
+        required: false
+        type: str
+        choices: ['present', 'invalidated']
+        default: 'present'
+    cache_dir:
+        description:
+            - Directory holding the cache files
+        required: false
+        type: str
+        default: '/tmp/ansible_vm_info_cache'
+    run_id:
+        description:
+            - Identifier of the run; entries are only shared within one run
+        required: true
+        type: str
+    ttl_seconds:
+        description:
+            - Maximum age of a cached entry, C(0) disables expiry
+        required: false
+        type: int
+        default: 900
+extends_documentation_fragment:
+    - community.vmware.vmware.documentation
+requirements:
+    - python >= 3.8
+    - pyvmomi
+    - community.vmware
+notes:
+    - Unlike vmware_guest_info, a missing VM is not an error; C(exists) is false and C(instance) is omitted
+    - Missing VMs are cached too, so the role that creates a VM must invalidate its entry
+'''
+
+EXAMPLES = r'''
+# Read through the cache (first read fetches, later reads are local)
+- name: Get VM information
+  vmware_vm_info_cache:
+    hostname: "{{ vcenter.hostname }}"
+    username: "{{ vcenter.username }}"
+    password: "{{ vcenter.password }}"
+    validate_certs: "{{ vcenter.validate_certs }}"
+    name: "{{ vm_name }}"
+    run_id: "{{ vm_info_cache.run_id }}"
+  register: vm_info
+
+# Force a fetch after reconfiguring the VM; refreshes the entry for later readers
+- name: Validate network configuration
+  vmware_vm_info_cache:
+    hostname: "{{ vcenter.hostname }}"
+    username: "{{ vcenter.username }}"
+    password: "{{ vcenter.password }}"
+    validate_certs: "{{ vcenter.validate_certs }}"
+    name: "{{ vm_name }}"
+    run_id: "{{ vm_info_cache.run_id }}"
+    read_mode: fresh
+  register: final_vm_info
+
+# Drop the entry after a write
+- name: Invalidate cached VM information
+  vmware_vm_info_cache:
+    hostname: "{{ vcenter.hostname }}"
+    username: "{{ vcenter.username }}"
+    password: "{{ vcenter.password }}"
+    name: "{{ vm_name }}"
+    run_id: "{{ vm_info_cache.run_id }}"
+    state: invalidated
+'''
+
+RETURN = r'''
+exists:
+    description: Whether the VM exists in vCenter
+    returned: when state is present
+    type: bool
+    sample: true
+instance:
+    description: VM facts in the vmware_guest_info format
+    returned: when state is present and the VM exists
+    type: dict
+    sample:
+        hw_name: "dev-dc1-rhel8-app-001"
+        hw_power_status: "poweredOn"
+        hw_processor_count: 2
+        hw_memtotal_mb: 4096
+        ipv4: "10.0.0.15"
+cache_hit:
+    description: Whether the facts were served from the cache
+    returned: when state is present
+    type: bool
+    sample: true
+cache_age_seconds:
+    description: Age of the returned facts
+    returned: when state is present
+    type: float
+    sample: 12.4
+invalidated:
+    description: Whether an entry was dropped
+    returned: when state is invalidated
+    type: bool
+    sample: true
+vcenter_spans:
+    description: Timing of the vCenter calls made by this run, empty on a cache hit
+    returned: when state is present
+    type: list
+    elements: dict
+    sample:
+        - {id: 0, parent: null, name: "get_vm", category: "vcenter", start: 1705312800.12, duration: 0.284, status: "ok", attributes: {}}
+'''
+
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.span_timer import SpanTimer
+from ansible.module_utils.vm_info_cache import VMInfoCache
+
+try:
+    from ansible_collections.community.vmware.plugins.module_utils.vmware import (
+        PyVmomi, vmware_argument_spec
+    )
+    HAS_COMMUNITY_VMWARE = True
+except ImportError:
+    HAS_COMMUNITY_VMWARE = False
+
+
+def fetch_vm_facts(module, timer):
+    """Fetch VM facts from vCenter, returning (exists, instance)"""
+    pyv = timer.call('connect', PyVmomi, module)
+    vm = timer.call('get_vm', pyv.get_vm)
+    if vm is None:
+        return False, {}
+    return True, timer.call('gather_facts', pyv.gather_facts, vm)
+
+
+def run_module():
+    """Main module execution function"""
+
+    module_args = vmware_argument_spec() if HAS_COMMUNITY_VMWARE else {}
+    module_args.update(
+        name=dict(type='str', required=True),
+        datacenter=dict(type='str', required=False),
+        folder=dict(type='str', required=False),
+        read_mode=dict(type='str', required=False, default='cached',
+                       choices=['cached', 'fresh']),
+        state=dict(type='str', required=False, default='present',
+                   choices=['present', 'invalidated']),
+        cache_dir=dict(type='str', required=False, default='/tmp/ansible_vm_info_cache'),
+        run_id=dict(type='str', required=True),
+        ttl_seconds=dict(type='int', required=False, default=900)
+    )
+
+    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+
+    if not HAS_COMMUNITY_VMWARE:
+        module.fail_json(msg="The community.vmware collection is required for this module")
+
+    params = module.params
+    cache = VMInfoCache(params['cache_dir'], params['run_id'], params['ttl_seconds'])
+    timer = SpanTimer()
+
+    try:
+        if params['state'] == 'invalidated':
+            removed = cache.invalidate(params['name'], params['datacenter'])
+            module.exit_json(changed=removed, invalidated=removed)
+
+        entry = None
+        if params['read_mode'] == 'cached':
+            entry = cache.get(params['name'], params['datacenter'])
+        cache_hit = entry is not None
+
+        if entry is None:
+            exists, instance = fetch_vm_facts(module, timer)
+            entry = cache.put(params['name'], params['datacenter'], exists, instance)
+
+        result = {
+            'changed': False,
+            'exists': entry['exists'],
+            'cache_hit': cache_hit,
+            'cache_age_seconds': round(time.time() - entry['fetched_at'], 3)
+        }
+        if entry['exists']:
+            result['instance'] = entry['instance']
+        module.exit_json(**timer.as_result(result))
+
+    except (IOError, OSError) as e:
+        module.fail_json(msg=f"VM info cache access failed: {str(e)}",
+                         cache_file=cache.path)
+
+
+def main():
+    """Main entry point"""
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Placement Planner
+
+Datastore and host placement for a wave of VMs. Capacity is loaded once per
+wave; every assignment is then booked against an in-memory reservation so
+later VMs in the same wave see the space already promised to earlier ones.
+Datastores of a tier sit in a max-heap keyed on usable free space (worst
+fit), so each decision is O(log n) and load spreads across the tier. A
+file-backed reservation ledger carries bookings across concurrent runs
+against the same datacenter until the VM exists or the booking expires.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import fcntl
+import heapq
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+GB = 1024 ** 3
+MB = 1024 ** 2
+LEDGER_FORMAT_VERSION = 1
+
+
+class PlacementPlanner:
+    """Worst-fit bin packing of VM disks onto tiered datastores"""
+
+    def __init__(self, datastores: Iterable[Dict[str, Any]], hosts: Iterable[Dict[str, Any]] = (),
+                 headroom_percent: float = 10.0, tier_order: Optional[List[str]] = None,
+                 allow_tier_fallback: bool = False):
+        """
+        Initialize the planner
+
+        datastores: dicts with name, tier, capacity and free_space in bytes.
+        hosts: dicts with name, memory_total_mb, memory_used_mb and an
+            optional 'datastores' list.
+        """
+        self.headroom_percent = float(headroom_percent)
+        self.allow_tier_fallback = allow_tier_fallback
+        self.datastores = {}
+        self._free = {}
+        self._heaps = {}
+        for datastore in datastores:
+            name = datastore['name']
+            headroom = int(datastore['capacity'] * self.headroom_percent / 100.0)
+            self.datastores[name] = dict(datastore, headroom=headroom, reserved=0)
+            self._free[name] = int(datastore['free_space']) - headroom
+            self._heaps.setdefault(datastore['tier'], [])
+        self.tier_order = list(tier_order) if tier_order else sorted(self._heaps)
+        for name, datastore in self.datastores.items():
+            self._heaps[datastore['tier']].append((-self._free[name], name))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+        self.hosts = {}
+        self._host_free = {}
+        self._host_heap = []
+        for host in hosts:
+            self.hosts[host['name']] = dict(host, datastores=set(host.get('datastores') or ()))
+            self._host_free[host['name']] = int(host['memory_total_mb']) - int(host.get('memory_used_mb') or 0)
+            self._host_heap.append((-self._host_free[host['name']], host['name']))
+        heapq.heapify(self._host_heap)
+
+    def reserve(self, datastore: str, disk_bytes: int, host: Optional[str] = None, memory_mb: int = 0) -> None:
+        """Book capacity that is promised elsewhere (an earlier run's pending VM)"""
+        if datastore in self.datastores:
+            self._take_datastore(datastore, int(disk_bytes))
+        if host in self.hosts and memory_mb:
+            self._take_host(host, int(memory_mb))
+
+    def _take_datastore(self, name: str, disk_bytes: int) -> None:
+        """Deduct space from a datastore and restore the heap order"""
+        heap = self._heaps[self.datastores[name]['tier']]
+        self._free[name] -= disk_bytes
+        self.datastores[name]['reserved'] += disk_bytes
+        if heap and heap[0][1] == name:
+            heapq.heapreplace(heap, (-self._free[name], name))
+        else:
+            # Bookings loaded from the ledger can hit any entry; rebuild once
+            heap[:] = [(-self._free[entry], entry) for _free, entry in heap]
+            heapq.heapify(heap)
+
+    def _take_host(self, name: str, memory_mb: int) -> None:
+        self._host_free[name] -= memory_mb
+        self._host_heap = [(-self._host_free[entry], entry) for _free, entry in self._host_heap]
+        heapq.heapify(self._host_heap)
+
+    def candidate_tiers(self, tier: str) -> List[str]:
+        """Requested tier first, then lower tiers when fallback is allowed"""
+        if tier not in self._heaps:
+            return []
+        if not self.allow_tier_fallback:
+            return [tier]
+        return self.tier_order[self.tier_order.index(tier):] if tier in self.tier_order else [tier]
+
+    def _pick_host(self, datastore: str, memory_mb: int) -> Optional[str]:
+        """Host with the most free memory that mounts the datastore"""
+        skipped = []
+        chosen = None
+        while self._host_heap:
+            free, name = heapq.heappop(self._host_heap)
+            if -free < memory_mb:
+                skipped.append((free, name))
+                break
+            mounts = self.hosts[name]['datastores']
+            if not mounts or datastore in mounts:
+                chosen = name
+                self._host_free[name] -= memory_mb
+                heapq.heappush(self._host_heap, (-self._host_free[name], name))
+                break
+            skipped.append((free, name))
+        for entry in skipped:
+            heapq.heappush(self._host_heap, entry)
+        return chosen
+
+    def place(self, name: str, disk_gb: float, memory_mb: int = 0, tier: str = 'tier1') -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Place one VM, returning (placement, None) or (None, reason)"""
+        disk_bytes = int(float(disk_gb) * GB)
+        tiers = self.candidate_tiers(tier)
+        if not tiers:
+            return None, "no datastores configured for tier '%s'" % tier
+        no_host = []
+        for candidate_tier in tiers:
+            heap = self._heaps[candidate_tier]
+            # Datastores with room but no eligible host are set aside and
+            # restored, so the common case stays a single heap operation
+            skipped = []
+            chosen = None
+            while heap and -heap[0][0] >= disk_bytes:
+                datastore = heap[0][1]
+                host = self._pick_host(datastore, int(memory_mb)) if self.hosts else None
+                if host is not None or not self.hosts:
+                    chosen = datastore
+                    break
+                no_host.append(datastore)
+                skipped.append(heapq.heappop(heap))
+            if chosen:
+                self._take_datastore(chosen, disk_bytes)
+            for entry in skipped:
+                heapq.heappush(heap, entry)
+            if chosen:
+                return {"name": name, "datastore": chosen, "host": host, "tier": candidate_tier,
+                        "requested_tier": tier, "disk_bytes": disk_bytes, "memory_mb": int(memory_mb)}, None
+        if no_host:
+            return None, "no connected host has %d MB free memory and mounts any of %s" % (
+                memory_mb, ', '.join(no_host))
+        largest = max((-self._heaps[t][0][0] for t in tiers if self._heaps[t]), default=0)
+        return None, "needs %.1f GB but the largest usable free space in %s is %.1f GB" % (
+            disk_bytes / GB, '/'.join(tiers), max(largest, 0) / GB)
+
+    def plan(self, vms: Iterable[Dict[str, Any]], default_tier: str = 'tier1') -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """
+        Place a wave of VMs
+
+        Larger disks are placed first (first-fit decreasing order), which
+        keeps the wave from stranding a big VM behind many small ones.
+        Returns placements and unplaced reasons, both keyed by VM name.
+        """
+        ordered = sorted(vms, key=lambda vm: (-float(vm.get('disk_gb') or 0), vm['name']))
+        placements = {}
+        unplaced = {}
+        for vm in ordered:
+            placement, reason = self.place(vm['name'], vm.get('disk_gb') or 0, vm.get('memory_mb') or 0,
+                                           vm.get('tier') or default_tier)
+            if placement:
+                placements[vm['name']] = placement
+            else:
+                unplaced[vm['name']] = reason
+        return placements, unplaced
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-datastore capacity after the planned and pending bookings"""
+        return {name: {"tier": datastore['tier'],
+                       "capacity_gb": round(datastore['capacity'] / GB, 2),
+                       "free_gb": round(datastore['free_space'] / GB, 2),
+                       "reserved_gb": round(datastore['reserved'] / GB, 2),
+                       "usable_after_gb": round(self._free[name] / GB, 2)}
+                for name, datastore in sorted(self.datastores.items())}
+
+
+class ReservationLedger:
+    """File-backed placement bookings shared by concurrent runs"""
+
+    def __init__(self, ledger_dir: str, scope: str, ttl_seconds: int = 3600):
+        """Initialize the ledger for a datacenter scope"""
+        self.ledger_dir = ledger_dir
+        self.scope = re.sub(r'[^A-Za-z0-9_.-]', '_', str(scope)) or 'default'
+        self.ttl_seconds = ttl_seconds
+        self.path = os.path.join(ledger_dir, "placement_%s.json" % self.scope)
+        self.lock_path = self.path + ".lock"
+
+    @contextmanager
+    def locked(self):
+        """Hold an exclusive lock across read, plan and write"""
+        os.makedirs(self.ledger_dir, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self) -> Dict[str, Any]:
+        """Load the ledger, dropping expired bookings"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+        except (IOError, OSError, ValueError):
+            document = {}
+        if document.get("version") != LEDGER_FORMAT_VERSION:
+            document = {"version": LEDGER_FORMAT_VERSION, "reservations": {}}
+        now = time.time()
+        document["reservations"] = {name: booking for name, booking in document["reservations"].items()
+                                    if now - booking.get("reserved_at", 0) < self.ttl_seconds}
+        return document
+
+    def store(self, document: Dict[str, Any]) -> None:
+        """Atomically replace the ledger"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.ledger_dir, prefix=".placement_")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(document, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def book(document: Dict[str, Any], placements: Dict[str, Dict[str, Any]], run_id: str) -> None:
+        """Record placements in a loaded ledger document"""
+        now = time.time()
+        for name, placement in placements.items():
+            document["reservations"][name] = {
+                "datastore": placement["datastore"], "host": placement.get("host"),
+                "disk_bytes": placement["disk_bytes"], "memory_mb": placement.get("memory_mb", 0),
+                "run_id": run_id, "reserved_at": now}
+
+    def release(self, names: Iterable[str]) -> List[str]:
+        """Drop bookings for VMs that now exist (or were abandoned)"""
+        with self.locked():
+            document = self.load()
+            released = [name for name in names if document["reservations"].pop(name, None) is not None]
+            if released:
+                self.store(document)
+        return released
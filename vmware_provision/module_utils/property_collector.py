@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Property Collector
+
+Single-retrieval inventory reads for the vCenter modules. All objects of the
+requested types below a container are read with one RetrievePropertiesEx call
+over a container view (plus continuation calls for large inventories) instead
+of one API call per object or per info module. PropertyWatch follows property
+changes of a set of objects with WaitForUpdatesEx instead of polling them.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from pyVmomi import vim, vmodl
+except ImportError:
+    pass
+
+
+def retrieve_properties(content, container,
+                        property_paths: Sequence[Tuple[str, List[str]]]) -> Tuple[List[Tuple[Any, Dict[str, Any]]], int]:
+    """
+    Read properties of every object of the given types below a container
+
+    property_paths pairs a vim type name with the property paths to read,
+    e.g. ('Datastore', ['name', 'summary.freeSpace']). Returns a list of
+    (managed object, {path: value}) and the number of round trips made.
+    """
+    types = [getattr(vim, type_name) for type_name, _paths in property_paths]
+    view = content.viewManager.CreateContainerView(container, types, True)
+    try:
+        traversal = vmodl.query.PropertyCollector.TraversalSpec(
+            name='traverseView', path='view', skip=False, type=vim.view.ContainerView)
+        object_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=view, skip=True, selectSet=[traversal])
+        property_specs = [vmodl.query.PropertyCollector.PropertySpec(type=getattr(vim, type_name), pathSet=paths)
+                          for type_name, paths in property_paths]
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[object_spec], propSet=property_specs)
+        collector = content.propertyCollector
+        result = collector.RetrievePropertiesEx([filter_spec], vmodl.query.PropertyCollector.RetrieveOptions())
+        round_trips = 1
+        objects = []
+        while result is not None:
+            for obj_content in result.objects:
+                objects.append((obj_content.obj, {prop.name: prop.val for prop in obj_content.propSet}))
+            if not result.token:
+                break
+            result = collector.ContinueRetrievePropertiesEx(result.token)
+            round_trips += 1
+        return objects, round_trips
+    finally:
+        view.Destroy()
+
+
+class PropertyWatch:
+    """
+    Change feed for properties of a fixed set of objects
+
+    Creates a filter on a private property collector, so other filters of the
+    session do not wake it up. wait() blocks in WaitForUpdatesEx until a watched
+    property changes or max_wait_seconds pass and returns (managed object,
+    kind, {path: value}) for every object that changed, kind being 'enter',
+    'modify' or 'leave' (the object was deleted). The first wait() returns the
+    current values of all objects; paths that became unset map to None.
+    """
+
+    def __init__(self, content, objects: Sequence[Any], type_name: str, paths: List[str]):
+        self._collector = content.propertyCollector.CreatePropertyCollector()
+        try:
+            object_specs = [vmodl.query.PropertyCollector.ObjectSpec(obj=obj, skip=False) for obj in objects]
+            property_spec = vmodl.query.PropertyCollector.PropertySpec(type=getattr(vim, type_name), pathSet=paths)
+            filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=object_specs, propSet=[property_spec])
+            self._filter = self._collector.CreateFilter(filter_spec, partialUpdates=False)
+        except Exception:
+            self._collector.DestroyPropertyCollector()
+            raise
+        self._version = ''
+        self.waits = 0
+
+    def wait(self, max_wait_seconds: Optional[float]) -> List[Tuple[Any, str, Dict[str, Any]]]:
+        """Changed objects with their changed values; empty when max_wait_seconds passed without a change"""
+        options = vmodl.query.PropertyCollector.WaitOptions()
+        if max_wait_seconds is not None:
+            options.maxWaitSeconds = max(1, int(math.ceil(max_wait_seconds)))
+        update_set = self._collector.WaitForUpdatesEx(self._version, options)
+        self.waits += 1
+        if update_set is None:
+            return []
+        self._version = update_set.version
+        changes = []
+        for filter_update in update_set.filterSet or []:
+            for object_update in filter_update.objectSet or []:
+                values = {change.name: None if change.op in ('remove', 'indirectRemove') else change.val
+                          for change in object_update.changeSet or []}
+                changes.append((object_update.obj, object_update.kind, values))
+        return changes
+
+    def close(self) -> None:
+        """Destroy the filter and the private collector"""
+        try:
+            self._filter.DestroyPropertyFilter()
+        finally:
+            self._collector.DestroyPropertyCollector()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
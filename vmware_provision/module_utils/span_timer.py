@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Span Timer
+
+Monotonic-clock timing of individual calls made inside a module (vCenter API
+calls, property fetches, task waits). Modules return the recorded spans under
+the C(vcenter_spans) result key; the span_trace callback plugin nests them
+under the task that ran the module in the exported trace.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+SPAN_RESULT_KEY = 'vcenter_spans'
+
+
+class SpanTimer:
+    """Collects nested spans timed with the monotonic clock"""
+
+    def __init__(self):
+        """Anchor the monotonic clock to wall time once per module run"""
+        self._epoch_origin = time.time()
+        self._mono_origin = time.perf_counter()
+        self._spans: List[Dict[str, Any]] = []
+        self._open: List[int] = []
+
+    def _wall(self, mono: float) -> float:
+        """Convert a monotonic reading to epoch seconds"""
+        return self._epoch_origin + (mono - self._mono_origin)
+
+    @contextmanager
+    def span(self, name: str, category: str = 'vcenter', **attributes: Any):
+        """Time the enclosed block as a child of the innermost open span"""
+        span_id = len(self._spans)
+        record = {
+            'id': span_id,
+            'parent': self._open[-1] if self._open else None,
+            'name': name,
+            'category': category,
+            'start': 0.0,
+            'duration': 0.0,
+            'status': 'ok',
+            'attributes': attributes,
+        }
+        self._spans.append(record)
+        self._open.append(span_id)
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['status'] = 'error'
+            record['attributes']['error'] = str(e)
+            raise
+        finally:
+            ended = time.perf_counter()
+            self._open.pop()
+            record['start'] = round(self._wall(started), 6)
+            record['duration'] = round(ended - started, 6)
+
+    def call(self, name: str, func, *args, **kwargs):
+        """Run a single call inside a span and return its result"""
+        with self.span(name):
+            return func(*args, **kwargs)
+
+    def as_result(self, result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Attach the recorded spans to a module result"""
+        result = {} if result is None else result
+        result[SPAN_RESULT_KEY] = list(self._spans)
+        return result
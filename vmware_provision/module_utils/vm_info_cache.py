@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+VM Info Cache
+
+Per-run, on-disk snapshot of vCenter VM properties. The first read of a VM
+fetches its facts from vCenter and stores them here; later reads in the same
+run are served locally until the entry expires or a provisioning role
+invalidates it after changing the VM.
+
+Version: 2.0.0
+Compatibility: Ansible 2.12+, Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import fcntl
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+CACHE_FORMAT_VERSION = 1
+
+
+class VMInfoCache:
+    """File-backed VM facts cache shared by every role of a run"""
+
+    def __init__(self, cache_dir: str, run_id: str, ttl_seconds: int = 900):
+        """Initialize the cache for a run"""
+        self.cache_dir = cache_dir
+        self.run_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(run_id)) or 'default'
+        self.ttl_seconds = ttl_seconds
+        self.path = os.path.join(cache_dir, "vm_info_%s.json" % self.run_id)
+        self.lock_path = self.path + ".lock"
+
+    @staticmethod
+    def entry_key(name: str, datacenter: Optional[str] = None) -> str:
+        """Build the cache key for a VM"""
+        return "%s/%s" % (datacenter or '', name)
+
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on the cache file for a read-modify-write"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, Any]:
+        """Load the cache document, discarding unreadable or foreign files"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {"version": CACHE_FORMAT_VERSION, "entries": {}}
+        if document.get("version") != CACHE_FORMAT_VERSION:
+            return {"version": CACHE_FORMAT_VERSION, "entries": {}}
+        return document
+
+    def _store(self, document: Dict[str, Any]) -> None:
+        """Atomically replace the cache document"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".vm_info_")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(document, f, default=str)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def get(self, name: str, datacenter: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return a live cache entry, or None on a miss or an expired entry"""
+        with self._locked():
+            entry = self._load()["entries"].get(self.entry_key(name, datacenter))
+        if entry is None:
+            return None
+        if self.ttl_seconds > 0 and time.time() - entry["fetched_at"] > self.ttl_seconds:
+            return None
+        return entry
+
+    def put(self, name: str, datacenter: Optional[str], exists: bool,
+            instance: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Store freshly fetched VM facts and return the new entry"""
+        entry = {
+            "name": name,
+            "datacenter": datacenter or '',
+            "exists": exists,
+            "instance": instance or {},
+            "fetched_at": time.time(),
+        }
+        with self._locked():
+            document = self._load()
+            document["entries"][self.entry_key(name, datacenter)] = entry
+            self._store(document)
+        return entry
+
+    def invalidate(self, name: str, datacenter: Optional[str] = None) -> bool:
+        """Drop a VM's entry; without a datacenter every entry for the name goes"""
+        with self._locked():
+            document = self._load()
+            entries = document["entries"]
+            if datacenter is not None:
+                keys = [self.entry_key(name, datacenter)]
+            else:
+                keys = [key for key, entry in entries.items() if entry.get("name") == name]
+            removed = [key for key in keys if entries.pop(key, None) is not None]
+            if removed:
+                self._store(document)
+        return bool(removed)
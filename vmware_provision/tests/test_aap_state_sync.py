@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+aap_state_sync against the local AAP REST API stub
+
+Starts tools/aap_api_stub.py in-process and runs the module as a fresh
+process, the way Ansible does, then checks the stub's /_stats counters.
+
+Usage:
+    python3 -m pytest -q tests/test_aap_state_sync.py
+
+Version: 2.0.0
+Compatibility: Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import urllib.request
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE_PATH = os.path.join(PROJECT_DIR, 'library', 'aap_state_sync.py')
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'tools'))
+
+from aap_api_stub import make_server  # noqa: E402
+
+JOB_ID = 1234
+EXECUTION_ENVIRONMENTS = 60
+PAGE_SIZE = 25
+
+
+@pytest.fixture
+def stub_server():
+    server = make_server(0, [JOB_ID], [567], EXECUTION_ENVIRONMENTS)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def stub(stub_server):
+    return 'http://127.0.0.1:%d' % stub_server.server_address[1]
+
+
+def stub_stats(base_url, reset=False):
+    """Counters of the stub, without the /_stats request itself"""
+    if reset:
+        urllib.request.urlopen(urllib.request.Request(base_url + '/_stats/reset', data=b'', method='POST')).read()
+        return None
+    stats = json.loads(urllib.request.urlopen(base_url + '/_stats').read())
+    stats['requests'] -= 1
+    stats['connections'] -= 1
+    stats['by_method']['GET'] -= 1
+    stats['by_method'] = {method: count for method, count in stats['by_method'].items() if count}
+    return stats
+
+
+def run_module(tmp_path, **args):
+    """Run aap_state_sync in a fresh interpreter; returns its result"""
+    args.setdefault('snapshot_dir', str(tmp_path / 'state'))
+    args_path = tmp_path / 'args.json'
+    args_path.write_text(json.dumps({'ANSIBLE_MODULE_ARGS': args}))
+    completed = subprocess.run([sys.executable, MODULE_PATH, str(args_path)],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    return json.loads(completed.stdout)
+
+
+def test_second_sync_is_served_from_snapshot(stub, tmp_path):
+    args = {
+        'base_url': stub,
+        'objects': [{'key': 'config', 'path': '/api/v2/config/'},
+                    {'key': 'job', 'path': '/api/v2/jobs/%d/' % JOB_ID}],
+        'collections': [{'key': 'execution_environments', 'path': '/api/v2/execution_environments/'}],
+        'page_size': PAGE_SIZE,
+    }
+
+    first = run_module(tmp_path, **args)
+    first_stats = stub_stats(stub)
+    assert first['errors'] == []
+    assert len(first['collections']['execution_environments']) == EXECUTION_ENVIRONMENTS
+    assert sorted(first['changed_objects']) == ['config', 'job']
+    assert first_stats['not_modified'] == 0
+    assert first_stats['connections'] == 1
+
+    stub_stats(stub, reset=True)
+    second = run_module(tmp_path, **args)
+    second_stats = stub_stats(stub)
+    assert second['errors'] == []
+    assert second['changed_objects'] == []
+    assert second['objects'] == first['objects']
+    assert second['collections'] == first['collections']
+    # Both objects answer 304, the collection only repeats the high-water item
+    # and its one-item count request shows nothing was deleted
+    assert second_stats['not_modified'] == 2
+    assert second['stats']['not_modified'] == 2
+    assert second['stats']['collection_items_changed'] == 0
+    assert second['stats']['collection_items_removed'] == 0
+    assert second_stats['requests'] == 4
+    assert second_stats['connections'] == 1
+    assert second_stats['bytes_sent'] < first_stats['bytes_sent'] / 20
+
+
+def test_queued_updates_become_one_patch(stub, tmp_path):
+    path = '/api/v2/jobs/%d/' % JOB_ID
+    updates = [
+        {'path': path, 'body': {'extra_vars': {'vm_state': 'cloning'}}},
+        {'path': path, 'body': {'extra_vars': {'vm_state': 'configured', 'vm_ip': '10.0.0.10'}}},
+        {'path': path, 'body': {'extra_vars': {'disk_config': 'complete'}}},
+    ]
+
+    first = run_module(tmp_path, base_url=stub, updates=updates, run_id='run-1')
+    stats = stub_stats(stub)
+    assert first['changed'] is True
+    assert first['updates'] == [{'path': path, 'status': 200, 'merged': 3, 'skipped': False}]
+    assert stats['by_method'] == {'PATCH': 1}
+
+    job = json.loads(urllib.request.urlopen(stub + path).read())
+    assert job['extra_vars'] == {'vm_state': 'configured', 'vm_ip': '10.0.0.10', 'disk_config': 'complete'}
+
+    # The same queue again in the same run matches the pushed body and sends nothing
+    stub_stats(stub, reset=True)
+    second = run_module(tmp_path, base_url=stub, updates=updates, run_id='run-1')
+    assert second['changed'] is False
+    assert second['updates'][0]['skipped'] is True
+    assert stub_stats(stub)['by_method'] == {}
+
+    # A later run pushes it again, the job may have been changed in between
+    stub_stats(stub, reset=True)
+    third = run_module(tmp_path, base_url=stub, updates=updates, run_id='run-2')
+    assert third['updates'][0]['skipped'] is False
+    assert stub_stats(stub)['by_method'] == {'PATCH': 1}
+
+
+def test_deleted_collection_items_are_dropped(stub_server, stub, tmp_path):
+    args = {
+        'base_url': stub,
+        'collections': [{'key': 'execution_environments', 'path': '/api/v2/execution_environments/'}],
+        'page_size': PAGE_SIZE,
+    }
+    first = run_module(tmp_path, **args)
+    assert len(first['collections']['execution_environments']) == EXECUTION_ENVIRONMENTS
+
+    state = stub_server.RequestHandlerClass.state
+    with state.lock:
+        del state.execution_environments[2]
+        del state.execution_environments[3]
+
+    second = run_module(tmp_path, **args)
+    assert second['errors'] == []
+    ids = sorted(ee['id'] for ee in second['collections']['execution_environments'])
+    assert len(ids) == EXECUTION_ENVIRONMENTS - 2
+    assert 2 not in ids and 3 not in ids
+    assert second['stats']['collection_items_removed'] == 2
+    assert second['stats']['collection_items_changed'] == 0
+
+
+def test_failed_object_is_left_out(stub, tmp_path):
+    result = run_module(tmp_path, base_url=stub,
+                        objects=[{'key': 'config', 'path': '/api/v2/config/'},
+                                 {'key': 'job', 'path': '/api/v2/jobs/999/'}])
+    assert result['connected'] is True
+    assert list(result['objects']) == ['config']
+    assert result['errors'] == ['GET /api/v2/jobs/999/ returned 404']
+
+    missing = run_module(tmp_path, base_url=stub, objects=[{'key': 'job', 'path': '/api/v2/jobs/999/'}])
+    assert missing['connected'] is False
+    assert missing['objects'] == {}
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AAP REST API Stub
+
+Minimal local stand-in for the AAP controller endpoints used by the
+aap_state_manager role, for developing and checking aap_state_sync without a
+controller. Supports ETag / If-None-Match, modified__gt / modified__gte
+filters, pagination, PATCH on jobs and execution environments and HTTP/1.1
+keep-alive. Request and connection counters are served at /_stats.
+
+Usage:
+    python3 tools/aap_api_stub.py --port 8052 --execution-environments 500
+    curl -s localhost:8052/_stats
+
+Version: 2.0.0
+Compatibility: Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def _timestamp(offset_seconds=0.0):
+    """AAP-style UTC timestamp with microseconds"""
+    moment = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc) + \
+        datetime.timedelta(seconds=offset_seconds)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class AAPState:
+    """In-memory AAP objects"""
+
+    def __init__(self, job_ids, workflow_ids, ee_count):
+        self.lock = threading.Lock()
+        self.clock = 0.0
+        self.config = {"version": "4.4.0", "ansible_version": "2.15.8",
+                       "license_info": {"license_type": "enterprise"},
+                       "project_base_dir": "/var/lib/awx/projects", "custom_virtualenvs": []}
+        self.jobs = {job_id: self._job(job_id) for job_id in job_ids}
+        self.workflow_jobs = {wf_id: {"id": wf_id, "name": "vm_provision_workflow",
+                                      "status": "running", "created": _timestamp(),
+                                      "started": _timestamp(), "finished": None, "elapsed": 0,
+                                      "summary_fields": {"organization": {"name": "Default"},
+                                                         "workflow_job_template": {"name": "VM Provision"}}}
+                              for wf_id in workflow_ids}
+        self.execution_environments = {}
+        for ee_id in range(1, ee_count + 1):
+            name = "default" if ee_id == 1 else "ee-%04d" % ee_id
+            self.execution_environments[ee_id] = {
+                "id": ee_id, "name": name, "description": "", "organization": 1,
+                "image": "registry.example.com/ee/%s:latest" % name, "credential": None,
+                "pull": "missing", "created": self._tick(), "modified": self.clock_stamp()}
+
+    def _tick(self):
+        self.clock += 1.0
+        return _timestamp(self.clock)
+
+    def clock_stamp(self):
+        return _timestamp(self.clock)
+
+    def _job(self, job_id):
+        return {"id": job_id, "name": "vm_provision", "status": "running", "job_type": "run",
+                "created": _timestamp(), "started": _timestamp(), "finished": None, "elapsed": 0,
+                "extra_vars": {}, "execution_environment": 1,
+                "summary_fields": {"organization": {"name": "Default"},
+                                   "project": {"name": "vmware_provision"},
+                                   "inventory": {"name": "vmware_inventory_dev"},
+                                   "execution_environment": {"name": "default"}}}
+
+    def touch_execution_environment(self, ee_id, changes):
+        self.execution_environments[ee_id].update(changes)
+        self.execution_environments[ee_id]["modified"] = self._tick()
+
+
+def _merge(base, update):
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves the AAP endpoints from an AAPState"""
+
+    protocol_version = 'HTTP/1.1'
+    state = None
+    stats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.stats["connections"] += 1
+
+    def _send(self, status, body=None, etag=None):
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(payload)
+        with self.state.lock:
+            self.stats["bytes_sent"] += len(payload)
+
+    def _send_object(self, body):
+        etag = '"%s"' % hashlib.sha1(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            with self.state.lock:
+                self.stats["not_modified"] += 1
+            self._send(304, etag=etag)
+        else:
+            self._send(200, body, etag=etag)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _count(self, method):
+        with self.state.lock:
+            self.stats["requests"] += 1
+            self.stats["by_method"][method] = self.stats["by_method"].get(method, 0) + 1
+
+    def _list_execution_environments(self, query):
+        items = sorted(self.state.execution_environments.values(),
+                       key=lambda ee: (ee["modified"], ee["id"]))
+        if 'modified__gt' in query:
+            items = [ee for ee in items if ee["modified"] > query['modified__gt'][0]]
+        if 'modified__gte' in query:
+            items = [ee for ee in items if ee["modified"] >= query['modified__gte'][0]]
+        if 'name' in query:
+            items = [ee for ee in items if ee["name"] == query['name'][0]]
+        page_size = int(query.get('page_size', ['25'])[0])
+        page = int(query.get('page', ['1'])[0])
+        window = items[(page - 1) * page_size:page * page_size]
+        next_page = None
+        if page * page_size < len(items):
+            params = {key: values[0] for key, values in query.items()}
+            params['page'] = str(page + 1)
+            next_page = '/api/v2/execution_environments/?' + '&'.join(
+                '%s=%s' % (key, value) for key, value in params.items())
+        return {"count": len(items), "next": next_page, "previous": None, "results": window}
+
+    def do_GET(self):
+        self._count('GET')
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        path = parts.path
+        if path == '/_stats':
+            with self.state.lock:
+                snapshot = json.loads(json.dumps(self.stats))
+            return self._send(200, snapshot)
+        if path == '/api/v2/config/':
+            return self._send_object(self.state.config)
+        match = re.match(r'^/api/v2/(jobs|workflow_jobs)/(\d+)/$', path)
+        if match:
+            objects = self.state.jobs if match.group(1) == 'jobs' else self.state.workflow_jobs
+            obj = objects.get(int(match.group(2)))
+            return self._send_object(obj) if obj else self._send(404, {"detail": "Not found."})
+        if path == '/api/v2/execution_environments/':
+            with self.state.lock:
+                listing = json.loads(json.dumps(self._list_execution_environments(query)))
+            return self._send(200, listing)
+        self._send(404, {"detail": "Not found."})
+
+    def do_PATCH(self):
+        self._count('PATCH')
+        path = urlsplit(self.path).path
+        body = self._read_body()
+        match = re.match(r'^/api/v2/jobs/(\d+)/$', path)
+        if match and int(match.group(1)) in self.state.jobs:
+            with self.state.lock:
+                job = self.state.jobs[int(match.group(1))]
+                _merge(job, body)
+                job = json.loads(json.dumps(job))
+            return self._send(200, job)
+        match = re.match(r'^/api/v2/execution_environments/(\d+)/$', path)
+        if match and int(match.group(1)) in self.state.execution_environments:
+            with self.state.lock:
+                self.state.touch_execution_environment(int(match.group(1)), body)
+                ee = dict(self.state.execution_environments[int(match.group(1))])
+            return self._send(200, ee)
+        self._send(404, {"detail": "Not found."})
+
+    def do_POST(self):
+        self._count('POST')
+        if urlsplit(self.path).path == '/_stats/reset':
+            with self.state.lock:
+                self.stats.update(_new_stats())
+            return self._send(200, {"reset": True})
+        self._send(405, {"detail": "Method not allowed."})
+
+
+def _new_stats():
+    return {"requests": 0, "connections": 0, "not_modified": 0, "bytes_sent": 0, "by_method": {}}
+
+
+def make_server(port, job_ids, workflow_ids, ee_count, host='127.0.0.1'):
+    """Build a stub server without starting it"""
+    handler = type('BoundStubHandler', (StubHandler,), {
+        'state': AAPState(job_ids, workflow_ids, ee_count),
+        'stats': _new_stats(),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local AAP REST API stub")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8052)
+    parser.add_argument('--job-id', type=int, action='append', default=None)
+    parser.add_argument('--workflow-id', type=int, action='append', default=None)
+    parser.add_argument('--execution-environments', type=int, default=25)
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.job_id or [1234], args.workflow_id or [567],
+                         args.execution_environments, args.host)
+    print("AAP API stub listening on http://%s:%d" % (args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
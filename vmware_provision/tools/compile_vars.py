@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Variable Precompiler
+
+Merges the layered play variable files (vars/common.yml, vars/<env>/main.yml,
+vars/<env>/<location>/main.yml and vars/os_templates.yml, in site.yml
+precedence order) for each env/location/os combination and resolves every
+expression that only depends on env, location, vm_os and the variable tree
+itself (resource_pools, env_defaults, folder_base, templates, ...). The result
+is written as one compact JSON artifact per combination, which site.yml loads
+instead of the layered files.
+
+Runtime inputs stay templates: the vCenter host and credentials, vm_name,
+domain, the AAP job id and every lookup, fact or variable the tree does not
+define. Anything referencing them, directly or through another variable, is
+deferred as well, so credentials are never written to the artifact. The
+artifact records the sha256 of every source file; the site.yml pre_tasks fail
+when a source changed after compilation.
+
+Usage:
+    python3 tools/compile_vars.py --location dc1
+    python3 tools/compile_vars.py --env prod --location dc1 --location dc2 --os rhel9
+    python3 tools/compile_vars.py --location dc1 --check
+
+Version: 2.0.0
+Compatibility: Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import yaml
+from jinja2 import Environment, TemplateError, meta
+from jinja2.nativetypes import NativeEnvironment
+
+COMPILER_VERSION = 3
+MAX_PASSES = 10
+
+# Variables provided per combination
+COMBINATION_VARS = ('env', 'location', 'vm_os')
+
+# Supplied per run (extra vars, prompts, AAP); never substituted even where the tree defines them
+RUNTIME_VARS = ('vcenter_host', 'vcenter_username', 'vcenter_password', 'vm_name', 'domain',
+                'awx_job_id', 'tower_job_id', 'vm_purpose', 'sequence_number')
+
+
+def _load_filters():
+    """Ansible core filters when available, so vars using them still resolve"""
+    try:
+        from ansible.plugins.filter.core import FilterModule
+        return FilterModule().filters()
+    except Exception:
+        return {}
+
+
+class Resolver:
+    """Resolves static Jinja expressions in a merged variable tree"""
+
+    def __init__(self):
+        filters = _load_filters()
+        self.text_env = Environment()
+        self.native_env = NativeEnvironment()
+        for env in (self.text_env, self.native_env):
+            env.filters.update(filters)
+        self._free_vars = {}
+
+    @staticmethod
+    def is_template(value):
+        return isinstance(value, str) and ('{{' in value or '{%' in value)
+
+    def free_variables(self, source):
+        if source not in self._free_vars:
+            try:
+                self._free_vars[source] = meta.find_undeclared_variables(self.text_env.parse(source))
+            except TemplateError:
+                self._free_vars[source] = None
+        return self._free_vars[source]
+
+    def render(self, source, context):
+        """Render a template if all of its inputs are static, else return it unchanged"""
+        free = self.free_variables(source)
+        if free is None or not free <= set(context):
+            return source
+        stripped = source.strip()
+        single = stripped.startswith('{{') and stripped.endswith('}}') and stripped.count('{{') == 1
+        env = self.native_env if single else self.text_env
+        try:
+            value = env.from_string(source).render(context)
+        except (TemplateError, TypeError, ValueError, KeyError, AttributeError):
+            return source
+        if self._contains_template(value):
+            return source
+        return value
+
+    def _contains_template(self, value):
+        if isinstance(value, dict):
+            return any(self._contains_template(item) for item in value.values())
+        if isinstance(value, list):
+            return any(self._contains_template(item) for item in value)
+        return self.is_template(value)
+
+    def _resolve_node(self, node, context):
+        """One resolution pass over a subtree; returns (node, changed)"""
+        if isinstance(node, dict):
+            changed = False
+            for key, value in node.items():
+                node[key], item_changed = self._resolve_node(value, context)
+                changed = changed or item_changed
+            return node, changed
+        if isinstance(node, list):
+            changed = False
+            for index, value in enumerate(node):
+                node[index], item_changed = self._resolve_node(value, context)
+                changed = changed or item_changed
+            return node, changed
+        if self.is_template(node):
+            value = self.render(node, context)
+            return value, value is not node
+        return node, False
+
+    def resolve(self, variables, combination, runtime=RUNTIME_VARS):
+        """Resolve to a fixpoint; returns the number of passes used
+
+        The inputs are the combination and the top-level variables of the
+        tree except the runtime ones. A value that still contains a template
+        after rendering is left unresolved, so references to deferred
+        variables stay deferred.
+        """
+        def context():
+            values = {name: value for name, value in variables.items() if name not in runtime}
+            values.update(combination)
+            return values
+
+        for passes in range(1, MAX_PASSES + 1):
+            _node, changed = self._resolve_node(variables, context())
+            if not changed:
+                return passes
+        return MAX_PASSES
+
+
+def count_templates(node, resolver):
+    if isinstance(node, dict):
+        return sum(count_templates(value, resolver) for value in node.values())
+    if isinstance(node, list):
+        return sum(count_templates(value, resolver) for value in node)
+    return 1 if resolver.is_template(node) else 0
+
+
+def source_files(vars_dir, env, location):
+    """Variable files in site.yml vars_files order (later files win)"""
+    return [
+        os.path.join(vars_dir, 'common.yml'),
+        os.path.join(vars_dir, env, 'main.yml'),
+        os.path.join(vars_dir, env, location, 'main.yml'),
+        os.path.join(vars_dir, 'os_templates.yml'),
+    ]
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def source_hash(sources):
+    """Combined hash over the per-file hashes, in load order"""
+    digest = hashlib.sha256()
+    for relative_path, file_hash in sources:
+        digest.update(("%s:%s\n" % (relative_path, file_hash)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def compile_combination(base_dir, env, location, vm_os, resolver, loaded, runtime=RUNTIME_VARS):
+    """Merge and resolve the variables of one combination"""
+    vars_dir = os.path.join(base_dir, 'vars')
+    variables = {}
+    sources = []
+    for path in source_files(vars_dir, env, location):
+        if not os.path.exists(path):
+            continue
+        if path not in loaded:
+            with open(path, 'r', encoding='utf-8') as f:
+                loaded[path] = (yaml.safe_load(f) or {}, file_sha256(path))
+        data, file_hash = loaded[path]
+        variables.update(json.loads(json.dumps(data)))
+        sources.append((os.path.relpath(path, base_dir), file_hash))
+
+    templates_before = count_templates(variables, resolver)
+    passes = resolver.resolve(variables, dict(zip(COMBINATION_VARS, (env, location, vm_os))), runtime)
+    variables['compiled_vars_meta'] = {
+        'compiler_version': COMPILER_VERSION,
+        'env': env,
+        'location': location,
+        'vm_os': vm_os,
+        'sources': [{'path': relative_path, 'sha256': file_hash} for relative_path, file_hash in sources],
+        'source_hash': source_hash(sources),
+        'templates_total': templates_before,
+        'templates_deferred': count_templates(variables, resolver),
+        'passes': passes,
+    }
+    return variables
+
+
+def artifact_path(output_dir, env, location, vm_os):
+    return os.path.join(output_dir, '%s_%s_%s.json' % (env, location, vm_os))
+
+
+def write_artifact(path, variables):
+    """Write compact JSON, atomically"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(variables, f, separators=(',', ':'), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def discover(vars_dir, envs, locations, os_names):
+    """Fill in combinations not given on the command line"""
+    if not envs:
+        envs = sorted(name for name in os.listdir(vars_dir)
+                      if os.path.isfile(os.path.join(vars_dir, name, 'main.yml')))
+    if not os_names:
+        with open(os.path.join(vars_dir, 'os_templates.yml'), 'r', encoding='utf-8') as f:
+            os_names = sorted((yaml.safe_load(f) or {}).get('templates', {}))
+    combinations = []
+    for env in envs:
+        env_locations = locations or sorted(
+            name for name in os.listdir(os.path.join(vars_dir, env))
+            if os.path.isfile(os.path.join(vars_dir, env, name, 'main.yml')))
+        for location in env_locations:
+            for vm_os in os_names:
+                combinations.append((env, location, vm_os))
+    return combinations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompile layered play variables per env/location/os")
+    parser.add_argument('--base-dir', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help="Project directory holding vars/ (default: this tool's parent)")
+    parser.add_argument('--env', action='append', default=None, help="Environment (default: every vars/<env>)")
+    parser.add_argument('--location', action='append', default=None,
+                        help="Location (default: every vars/<env>/<location>)")
+    parser.add_argument('--os', dest='os_names', action='append', default=None,
+                        help="OS template key (default: every key in os_templates.yml)")
+    parser.add_argument('--output-dir', default=None, help="Artifact directory (default: vars/compiled)")
+    parser.add_argument('--check', action='store_true',
+                        help="Only report artifacts that are missing or stale, exit 1 if any")
+    args = parser.parse_args()
+
+    vars_dir = os.path.join(args.base_dir, 'vars')
+    output_dir = args.output_dir or os.path.join(vars_dir, 'compiled')
+    combinations = discover(vars_dir, args.env, args.location, args.os_names)
+    if not combinations:
+        parser.error("no env/location combinations found; pass --location for locations without a vars directory")
+
+    resolver = Resolver()
+    loaded = {}
+    stale = []
+    os.makedirs(output_dir, exist_ok=True)
+    for env, location, vm_os in combinations:
+        variables = compile_combination(args.base_dir, env, location, vm_os, resolver, loaded)
+        path = artifact_path(output_dir, env, location, vm_os)
+        info = variables['compiled_vars_meta']
+        if args.check:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    current = json.load(f).get('compiled_vars_meta', {})
+            except (IOError, OSError, ValueError):
+                current = {}
+            if (current.get('source_hash') != info['source_hash']
+                    or current.get('compiler_version') != COMPILER_VERSION):
+                stale.append(path)
+                print("stale   %s" % os.path.relpath(path, args.base_dir))
+            continue
+        write_artifact(path, variables)
+        print("%s  %s  %d/%d expressions resolved" % (
+            info['source_hash'][:12], os.path.relpath(path, args.base_dir),
+            info['templates_total'] - info['templates_deferred'], info['templates_total']))
+    if args.check:
+        sys.exit(1 if stale else 0)
+
+
+if __name__ == '__main__':
+    main()
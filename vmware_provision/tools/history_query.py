@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deployment History Query
+
+Command-line access to the deployment history database that the
+deployment_history action plugin maintains: the same named queries the
+plugin runs, compaction, and a one-off import of the deployment report
+artifacts that status_tracking wrote before the history existed.
+
+Usage:
+    python3 tools/history_query.py failures --env prod --since 7d
+    python3 tools/history_query.py summary --since 30d
+    python3 tools/history_query.py steps --since 7d --json
+    python3 tools/history_query.py deployment web-01
+    python3 tools/history_query.py compact --retention-days 90 --vacuum
+    python3 tools/history_query.py import '/tmp/deployment_*.json'
+
+Version: 2.0.0
+Compatibility: Python 3.8+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'action_plugins'))
+
+from deployment_history import DEFAULT_DB_PATH, DEFAULT_LIMIT, QUERIES, HistoryStore  # noqa: E402
+
+FINAL_STEP = 'inventory_update'
+
+
+def print_table(rows):
+    """Rows as aligned columns"""
+    if not rows:
+        print("(no rows)")
+        return
+    columns = list(rows[0].keys())
+    cells = [['' if row[column] is None else str(row[column]) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[index]) for line in cells)) for index, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    print('  '.join('-' * width for width in widths))
+    for line in cells:
+        print('  '.join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+def print_deployment(rows):
+    """Deployment detail with its steps, retries and errors"""
+    for row in rows:
+        sections = {key: row.pop(key) for key in ('steps', 'retries', 'errors')}
+        row.pop('details', None)
+        for key, value in row.items():
+            print("%-18s %s" % (key, '' if value is None else value))
+        for key, value in sections.items():
+            print("\n%s:" % key)
+            print_table(value)
+        print()
+
+
+def import_artifacts(store, pattern):
+    """Record every deployment report artifact matching pattern; returns the number imported"""
+    imported = 0
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            print("skipped %s: %s" % (path, e), file=sys.stderr)
+            continue
+        if not isinstance(report, dict) or 'vm_name' not in report:
+            continue
+        timeline = report.get('deployment_timeline') or {}
+        steps = report.get('steps_completed') or []
+        step_times = report.get('step_times') or {}
+        status = report.get('deployment_status') or 'unknown'
+        store.record_deployment({
+            'vm_name': report['vm_name'],
+            'environment': report.get('environment') or 'unknown',
+            'location': report.get('location') or 'unknown',
+            'os_type': report.get('os_type'),
+            'status': status,
+            'succeeded': status == 'complete' or (steps and steps[-1] == FINAL_STEP),
+            'started_at': timeline.get('start_time'),
+            'finished_at': timeline.get('end_time') or os.path.getmtime(path),
+            'artifact_path': path,
+            'details': {key: report[key] for key in ('vm_details', 'network_config', 'disk_config')
+                        if report.get(key)},
+        }, steps, [], [], step_times)
+        imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and maintain the deployment history database")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="History database (default: %(default)s)")
+    parser.add_argument('--json', action='store_true', help="Print rows as JSON")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name in QUERIES:
+        command = commands.add_parser(name, help="Run the %s query" % name)
+        if name == 'deployment':
+            command.add_argument('vm_name')
+        else:
+            command.add_argument('--vm', dest='vm_name', default=None)
+        command.add_argument('--env', dest='environment', default=None)
+        command.add_argument('--location', default=None)
+        command.add_argument('--os', dest='os_type', default=None)
+        command.add_argument('--status', default=None)
+        command.add_argument('--step', default=None, help="Step name (steps query)")
+        command.add_argument('--since', default=None, help="ISO 8601 time, epoch seconds or age such as 7d or 24h")
+        command.add_argument('--until', default=None)
+        command.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+
+    compact = commands.add_parser('compact', help="Roll up and delete deployments older than the retention")
+    compact.add_argument('--retention-days', type=float, required=True)
+    compact.add_argument('--vacuum', action='store_true', help="Reclaim free space afterwards")
+
+    backfill = commands.add_parser('import', help="Record existing deployment report artifacts")
+    backfill.add_argument('pattern', nargs='?', default='/tmp/deployment_*.json')
+    args = parser.parse_args()
+
+    try:
+        store = HistoryStore(args.db)
+    except Exception as e:
+        parser.error("cannot open %s: %s" % (args.db, e))
+
+    try:
+        if args.command == 'compact':
+            result = store.compact(args.retention_days, args.vacuum)
+            print(json.dumps(result, indent=2) if args.json else
+                  "%(deployments_compacted)d deployments rolled up, %(outputs_deleted)d outputs deleted "
+                  "(before %(cutoff)s)" % result)
+            return
+        if args.command == 'import':
+            print("imported %d deployment reports" % import_artifacts(store, args.pattern))
+            return
+
+        filters = {key: getattr(args, key) for key in
+                   ('environment', 'location', 'os_type', 'vm_name', 'status', 'step', 'since', 'until')}
+        started = time.perf_counter()
+        try:
+            rows = store.query(args.command, filters, args.limit)
+        except ValueError as e:
+            parser.error(str(e))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if args.json:
+            print(json.dumps(rows, indent=2, default=str))
+        elif args.command == 'deployment':
+            print_deployment(rows)
+        else:
+            print_table(rows)
+            print("\n%d rows in %.1f ms" % (len(rows), elapsed_ms), file=sys.stderr)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mock vCenter
+
+Local vSphere SOAP stand-in (in the spirit of vcsim) for measuring the
+provisioning playbooks without a vCenter. pyVmomi's own SOAP adapter
+deserializes the requests and serializes the responses, so modules connect
+through the regular SmartConnect / community.vmware code path.
+
+The inventory is built from the project variables of one environment
+(datacenter, cluster, datastores, networks, resource pool, one template per
+entry in os_templates.yml) plus --hosts ESXi hosts. Supported calls: session
+login and logout, property collector retrievals with container views,
+traversal specs and paging, property filters with WaitForUpdatesEx change
+feeds on private collectors, SearchIndex lookups, folder creation, VM clone,
+reconfigure, power and destroy tasks, and standard / distributed port group
+changes. Other methods are answered with NotSupported and counted.
+
+Guests report VMware Tools running --tools-seconds and an IP address
+--guest-ip-seconds after power-on, plus a per-VM random delay of up to
+--boot-spread-seconds.
+
+Latency (--latency-ms, --method-latency, --task-seconds) and failures
+(--fail, --task-fail) can be injected per method. Every request is appended to
+--log-file as a JSON line (time, method, object, session user, status,
+duration); counters are served at /_stats and reset with POST /_stats/reset.
+
+Usage:
+    python3 tools/mock_vcenter.py --env dev --hosts 4
+    python3 tools/mock_vcenter.py --latency-ms 25 --fail CloneVM_Task=0.1 --log-file /tmp/mock_vcenter.jsonl
+    python3 tools/mock_vcenter.py --guest-ip-seconds 30 --boot-spread-seconds 60
+    curl -sk https://127.0.0.1:8989/_stats
+
+Version: 2.0.0
+Compatibility: Python 3.8+, pyVmomi 8.0+
+Author: VMware Provisioning Team
+Last Updated: 2024-01-15
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import os
+import random
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pyVmomi import SoapAdapter, VmomiSupport, vim, vmodl
+
+from compile_vars import Resolver, compile_combination
+
+VIM_NS = 'urn:vim25'
+SOAP_BODY = '{http://schemas.xmlsoap.org/soap/envelope/}Body'
+API_VERSION = VmomiSupport.newestVersions.Get('vim')
+PRODUCT_VERSION = '8.0.2'
+SESSION_COOKIE = 'vmware_soap_session'
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+# Methods that only open or close a session; '*' failure rates skip them
+HANDSHAKE_METHODS = ('RetrieveServiceContent', 'Login', 'Logout')
+
+# How often a waiting WaitForUpdatesEx re-evaluates its filters; guest state is time based
+UPDATE_POLL_SECONDS = 0.1
+
+ET.register_namespace('', VIM_NS)
+
+PC = vmodl.query.PropertyCollector
+ManagedObject = VmomiSupport.GetVmodlType('vmodl.ManagedObject')
+ManagedObjectArray = ManagedObject.Array
+StringArray = VmomiSupport.GetVmodlType('string[]')
+LinkArray = VmomiSupport.GetVmodlType('Link[]')
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _default(kind):
+    """Zero value of a vmodl type, for required fields the mock does not model"""
+    if issubclass(kind, bool):
+        return False
+    if issubclass(kind, VmomiSupport.Enum):
+        return kind.values[0]
+    if issubclass(kind, (str, bytes)):
+        return kind()
+    if issubclass(kind, (int, float)):
+        return kind(0)
+    if issubclass(kind, datetime.datetime):
+        return _now()
+    if issubclass(kind, VmomiSupport.DataObject):
+        return complete(kind())
+    return None
+
+
+def complete(obj):
+    """Fill the unset required fields of a data object (recursively) with zero values"""
+    for prop in obj._GetPropertyList():
+        value = getattr(obj, prop.name)
+        if value is None and not prop.flags & VmomiSupport.F_OPTIONAL:
+            value = _default(prop.type)
+            if value is not None:
+                setattr(obj, prop.name, value)
+        elif isinstance(value, VmomiSupport.DataObject):
+            complete(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, VmomiSupport.DataObject):
+                    complete(item)
+    return obj
+
+
+def data(kind, **fields):
+    return complete(kind(**fields))
+
+
+def refs(items):
+    return ManagedObjectArray([item.ref if isinstance(item, Entity) else item for item in items])
+
+
+class Computed:
+    """Property value evaluated on every read"""
+
+    __slots__ = ('func',)
+
+    def __init__(self, func):
+        self.func = func
+
+
+class Entity:
+    """One managed object: its reference, properties and mock-side state"""
+
+    def __init__(self, ref, props):
+        self.ref = ref
+        self.props = props
+        self.state = {}
+
+    @property
+    def moid(self):
+        return self.ref._moId
+
+
+class RequestContext:
+    """Per-request data handlers may need"""
+
+    def __init__(self, session_id, session):
+        self.session_id = session_id
+        self.session = session
+
+
+class MockVCenter:
+    """In-memory vSphere inventory and SOAP method handlers"""
+
+    def __init__(self, options):
+        self.options = options
+        self.lock = threading.RLock()
+        self.updated = threading.Condition(self.lock)
+        self.rng = random.Random(options.seed)
+        self.objects = {}
+        self.sequence = {}
+        self.sessions = {}
+        self.retrievals = {}
+        self.pending = []
+        self.ip_sequence = 10
+        self.method_cache = {}
+        self.reset_stats()
+
+    # Inventory construction
+
+    def add(self, type_name, prefix, parent=None, moid=None, **props):
+        if moid is None:
+            self.sequence[prefix] = self.sequence.get(prefix, 0) + 1
+            moid = '%s-%d' % (prefix, self.sequence[prefix])
+        entity = Entity(VmomiSupport.GetWsdlType(VIM_NS, type_name)(moid), props)
+        if parent is not None:
+            props['parent'] = parent.ref
+            if isinstance(parent.ref, vim.Folder):
+                parent.props.setdefault('childEntity', refs([])).append(entity.ref)
+        self.objects[moid] = entity
+        return entity
+
+    def entity(self, ref):
+        return None if ref is None else self.objects.get(ref._moId)
+
+    def build(self, variables, templates):
+        options = self.options
+        content = {}
+        for type_name, moid in (('SessionManager', 'SessionManager'), ('PropertyCollector', 'propertyCollector'),
+                                ('ViewManager', 'ViewManager'), ('SearchIndex', 'SearchIndex'),
+                                ('CustomFieldsManager', 'CustomFieldsManager'), ('TaskManager', 'TaskManager'),
+                                ('EventManager', 'EventManager'), ('OptionManager', 'VpxSettings'),
+                                ('UserDirectory', 'UserDirectory'), ('AuthorizationManager', 'AuthorizationManager'),
+                                ('PerformanceManager', 'PerfMgr'), ('LicenseManager', 'LicenseManager'),
+                                ('OvfManager', 'OvfManager'), ('VirtualDiskManager', 'virtualDiskManager'),
+                                ('FileManager', 'FileManager')):
+            content[moid] = self.add(type_name, None, moid=moid)
+        self.objects['SessionManager'].props['currentSession'] = Computed(lambda ctx: ctx.session)
+        self.objects['CustomFieldsManager'].props['field'] = vim.CustomFieldsManager.FieldDef.Array()
+
+        self.root = self.add('Folder', 'group-d', name='Datacenters', childType=StringArray(['Folder', 'Datacenter']))
+        self.about = data(vim.AboutInfo, name='VMware vCenter Server',
+                          fullName='VMware vCenter Server %s (mock)' % PRODUCT_VERSION,
+                          vendor='VMware, Inc.', version=PRODUCT_VERSION, build='22617221', osType='linux-x64',
+                          productLineId='vpx', apiType='VirtualCenter', apiVersion=PRODUCT_VERSION + '.0',
+                          instanceUuid=str(uuid.UUID(int=self.rng.getrandbits(128))),
+                          localeVersion='INTL', localeBuild='000')
+        self.content = data(
+            vim.ServiceInstanceContent, rootFolder=self.root.ref, about=self.about,
+            propertyCollector=content['propertyCollector'].ref, viewManager=content['ViewManager'].ref,
+            sessionManager=content['SessionManager'].ref, searchIndex=content['SearchIndex'].ref,
+            customFieldsManager=content['CustomFieldsManager'].ref, taskManager=content['TaskManager'].ref,
+            eventManager=content['EventManager'].ref, setting=content['VpxSettings'].ref,
+            userDirectory=content['UserDirectory'].ref, authorizationManager=content['AuthorizationManager'].ref,
+            perfManager=content['PerfMgr'].ref, licenseManager=content['LicenseManager'].ref,
+            ovfManager=content['OvfManager'].ref, virtualDiskManager=content['virtualDiskManager'].ref,
+            fileManager=content['FileManager'].ref)
+        self.add('ServiceInstance', None, moid='ServiceInstance', content=self.content,
+                 serverClock=Computed(lambda ctx: _now()))
+
+        datacenter = self.add('Datacenter', 'datacenter', parent=self.root, name=variables['datacenter'],
+                              datastore=refs([]), network=refs([]))
+        self.datacenter = datacenter
+        folders = (('vmFolder', 'vm', ['Folder', 'VirtualMachine', 'VirtualApp']),
+                   ('hostFolder', 'host', ['Folder', 'ComputeResource']),
+                   ('datastoreFolder', 'datastore', ['Folder', 'Datastore', 'StoragePod']),
+                   ('networkFolder', 'network', ['Folder', 'Network', 'DistributedVirtualSwitch']))
+        for prop, name, child_types in folders:
+            folder = self.add('Folder', 'group-%s' % name[0], parent=datacenter, name=name,
+                              childType=StringArray(child_types), childEntity=refs([]))
+            datacenter.props[prop] = folder.ref
+
+        cluster = self.add('ClusterComputeResource', 'domain-c', parent=self.entity(datacenter.props['hostFolder']),
+                           name=variables['cluster'], host=refs([]), datastore=refs([]), network=refs([]))
+        self.cluster = cluster
+        self.root_pool = self.add('ResourcePool', 'resgroup', parent=cluster, name='Resources', owner=cluster.ref,
+                                  resourcePool=refs([]), vm=refs([]))
+        cluster.props['resourcePool'] = self.root_pool.ref
+        self.pools = {'Resources': self.root_pool}
+        pool_name = variables.get('resource_pool')
+        if isinstance(pool_name, str) and pool_name and not Resolver.is_template(pool_name):
+            self.pools[pool_name] = self.add_pool(pool_name, self.root_pool)
+
+        self.hosts = []
+        for index in range(1, options.hosts + 1):
+            self.hosts.append(self.add_host('esx%02d.%s.mock.local' % (index, options.env), index))
+
+        self.datastores = {}
+        for name in datastore_names(variables.get('datastores')):
+            self.datastores[name] = self.add_datastore(name)
+
+        self.networks = {}
+        self.switch = None
+        for network in (variables.get('networks') or {}).values():
+            if isinstance(network, dict) and network.get('name'):
+                self.add_network(network['name'], network.get('type', 'distributed'), network.get('vlan'))
+
+        template_folder = self.create_folder(self.entity(datacenter.props['vmFolder']), 'Templates')
+        first_datastore = next(iter(self.datastores.values()), None)
+        for name, guest_id in templates:
+            self.create_vm(name, template_folder, self.root_pool, self.hosts[0] if self.hosts else None,
+                           first_datastore, template=True, guest_id=guest_id)
+
+    def add_pool(self, name, parent):
+        pool = self.add('ResourcePool', 'resgroup', parent=parent, name=name, owner=self.cluster.ref,
+                        resourcePool=refs([]), vm=refs([]))
+        parent.props['resourcePool'].append(pool.ref)
+        return pool
+
+    def add_host(self, name, index):
+        host = self.add('HostSystem', 'host', parent=self.cluster, name=name, datastore=refs([]), network=refs([]),
+                        vm=refs([]))
+        network_system = self.add('HostNetworkSystem', 'networkSystem')
+        network_system.state['host'] = host
+        host.state.update(portgroups={}, memory_bytes=self.options.host_memory_gb * GB,
+                          base_usage_mb=int(self.options.host_memory_gb * 1024 * self.rng.uniform(0.1, 0.4)),
+                          hardware_uuid=str(uuid.UUID(int=self.rng.getrandbits(128))))
+        host.props.update(
+            runtime=Computed(lambda ctx: data(vim.host.RuntimeInfo, connectionState='connected',
+                                              powerState='poweredOn', inMaintenanceMode=False)),
+            summary=Computed(lambda ctx: self.host_summary(host)),
+            config=Computed(lambda ctx: self.host_config(host)),
+            configManager=data(vim.host.ConfigManager, networkSystem=network_system.ref),
+            overallStatus='green')
+        network_system.props['networkInfo'] = Computed(lambda ctx: self.host_config(host).network)
+        self.cluster.props['host'].append(host.ref)
+        return host
+
+    def host_summary(self, host):
+        used_mb = host.state['base_usage_mb'] + sum(
+            vm.state['memory_mb'] for vm in self.vms() if vm.state['host'] is host and vm.state['power'] == 'poweredOn')
+        return data(vim.host.Summary, host=host.ref, overallStatus='green',
+                    runtime=data(vim.host.RuntimeInfo, connectionState='connected', powerState='poweredOn',
+                                 inMaintenanceMode=False),
+                    hardware=data(vim.host.Summary.HardwareSummary, vendor='VMware, Inc.', model='Mock ESXi',
+                                  uuid=host.state['hardware_uuid'], memorySize=host.state['memory_bytes'],
+                                  cpuModel='Mock CPU', cpuMhz=2600, numCpuPkgs=2, numCpuCores=32,
+                                  numCpuThreads=64, numNics=4, numHBAs=2),
+                    quickStats=data(vim.host.Summary.QuickStats, overallMemoryUsage=used_mb, overallCpuUsage=0),
+                    config=data(vim.host.Summary.ConfigSummary, name=host.props['name'], port=443,
+                                product=self.about))
+
+    def host_config(self, host):
+        portgroups = [data(vim.host.PortGroup, key='key-vim.host.PortGroup-%s' % name, spec=copy.deepcopy(spec))
+                      for name, spec in sorted(host.state['portgroups'].items())]
+        switch = data(vim.host.VirtualSwitch, name='vSwitch0', key='key-vim.host.VirtualSwitch-vSwitch0',
+                      numPorts=1024, numPortsAvailable=1000, mtu=1500,
+                      portgroup=LinkArray([portgroup.key for portgroup in portgroups]))
+        return data(vim.host.ConfigInfo, host=host.ref, product=self.about,
+                    network=data(vim.host.NetworkInfo, portgroup=vim.host.PortGroup.Array(portgroups),
+                                 vswitch=vim.host.VirtualSwitch.Array([switch])))
+
+    def add_datastore(self, name):
+        datastore = self.add('Datastore', 'datastore', parent=self.entity(self.datacenter.props['datastoreFolder']),
+                             name=name, vm=refs([]))
+        capacity = self.options.datastore_capacity_gb * GB
+        datastore.state.update(capacity=capacity, used=int(capacity * self.rng.uniform(0.2, 0.5)),
+                               url='ds:///vmfs/volumes/%s/' % uuid.UUID(int=self.rng.getrandbits(128)).hex)
+        datastore.props.update(
+            summary=Computed(lambda ctx: data(
+                vim.Datastore.Summary, datastore=datastore.ref, name=name, url=datastore.state['url'],
+                capacity=datastore.state['capacity'], freeSpace=datastore.state['capacity'] - datastore.state['used'],
+                type='VMFS', accessible=True, multipleHostAccess=True, maintenanceMode='normal')),
+            host=vim.Datastore.HostMount.Array([
+                data(vim.Datastore.HostMount, key=host.ref,
+                     mountInfo=data(vim.host.MountInfo, accessMode='readWrite', mounted=True, accessible=True))
+                for host in self.hosts]),
+            overallStatus='green')
+        self.datacenter.props['datastore'].append(datastore.ref)
+        self.cluster.props['datastore'].append(datastore.ref)
+        for host in self.hosts:
+            host.props['datastore'].append(datastore.ref)
+        return datastore
+
+    def add_network(self, name, network_type, vlan=None):
+        folder = self.entity(self.datacenter.props['networkFolder'])
+        if network_type == 'standard':
+            network = self.add('Network', 'network', parent=folder, name=name, host=refs(self.hosts), vm=refs([]))
+            for host in self.hosts:
+                host.state['portgroups'][name] = data(
+                    vim.host.PortGroup.Specification, name=name, vlanId=int(vlan or 0), vswitchName='vSwitch0',
+                    policy=data(vim.host.NetworkPolicy))
+        else:
+            switch = self.distributed_switch()
+            network = self.add('DistributedVirtualPortgroup', 'dvportgroup', parent=folder, name=name,
+                               host=refs(self.hosts), vm=refs([]))
+            network.state.update(switch=switch, version=1, num_ports=8, vlan=int(vlan or 0), port_config=None)
+            network.props.update(key=network.moid, config=Computed(lambda ctx: self.portgroup_config(network)))
+            switch.props['portgroup'].append(network.ref)
+        for entity in [self.datacenter, self.cluster] + self.hosts:
+            entity.props['network'].append(network.ref)
+        self.networks[name] = network
+        return network
+
+    def distributed_switch(self):
+        if self.switch is None:
+            folder = self.entity(self.datacenter.props['networkFolder'])
+            self.switch = self.add('VmwareDistributedVirtualSwitch', 'dvs', parent=folder,
+                                   name='DSwitch-%s' % self.options.env, portgroup=refs([]),
+                                   uuid=str(uuid.UUID(int=self.rng.getrandbits(128))))
+        return self.switch
+
+    def portgroup_config(self, network):
+        state = network.state
+        port_config = state['port_config'] or data(
+            vim.dvs.VmwareDistributedVirtualSwitch.VmwarePortConfigPolicy,
+            vlan=data(vim.dvs.VmwareDistributedVirtualSwitch.VlanIdSpec, vlanId=state['vlan'], inherited=False))
+        return data(vim.dvs.DistributedVirtualPortgroup.ConfigInfo, key=network.moid, name=network.props['name'],
+                    numPorts=state['num_ports'], distributedVirtualSwitch=state['switch'].ref, type='earlyBinding',
+                    configVersion=str(state['version']), uplink=False, defaultPortConfig=port_config,
+                    policy=data(vim.dvs.VmwareDistributedVirtualSwitch.VMwarePortgroupPolicy))
+
+    def create_folder(self, parent, name):
+        for ref in parent.props.get('childEntity') or []:
+            child = self.entity(ref)
+            if isinstance(ref, vim.Folder) and child.props.get('name') == name:
+                raise fault(vim.fault.DuplicateName, "Folder '%s' already exists" % name, name=name, object=ref)
+        return self.add('Folder', 'group-v', parent=parent, name=name, childType=parent.props.get('childType'),
+                        childEntity=refs([]))
+
+    # Virtual machines
+
+    def vms(self):
+        return [entity for entity in self.objects.values() if isinstance(entity.ref, vim.VirtualMachine)]
+
+    def create_vm(self, name, folder, pool, host, datastore, template=False, guest_id='otherGuest64',
+                  source=None, config_spec=None):
+        vm = self.add('VirtualMachine', 'vm', parent=folder, name=name)
+        if source is not None:
+            state = copy.deepcopy({key: value for key, value in source.state.items()
+                                   if key not in ('host', 'pool', 'datastore')})
+        else:
+            state = {'guest_id': guest_id, 'cpu': 2, 'memory_mb': 4096, 'annotation': '',
+                     'devices': self.default_devices(name, datastore)}
+        state.update(template=template, host=host, pool=pool, datastore=datastore, power='poweredOff',
+                     powered_on_at=None, ip_address=None, uuid=str(uuid.UUID(int=self.rng.getrandbits(128))),
+                     instance_uuid=str(uuid.UUID(int=self.rng.getrandbits(128))), change_version=1)
+        vm.state.update(state)
+        if source is not None:
+            for device in vm.state['devices']:
+                if isinstance(device, vim.vm.device.VirtualDisk) and datastore is not None:
+                    device.backing.fileName = '[%s] %s/%s' % (datastore.props['name'], name,
+                                                              device.backing.fileName.rsplit('/', 1)[-1])
+                    device.backing.datastore = datastore.ref
+                if isinstance(device, vim.vm.device.VirtualEthernetCard):
+                    device.macAddress = self.mac_address()
+        if config_spec is not None:
+            self.apply_config(vm, config_spec)
+        vm.props.update(
+            config=Computed(lambda ctx: self.vm_config(vm)),
+            runtime=Computed(lambda ctx: self.vm_runtime(vm)),
+            guest=Computed(lambda ctx: self.vm_guest(vm)),
+            summary=Computed(lambda ctx: self.vm_summary(vm)),
+            datastore=Computed(lambda ctx: refs([vm.state['datastore']] if vm.state['datastore'] else [])),
+            network=Computed(lambda ctx: refs(self.vm_networks(vm))),
+            resourcePool=Computed(lambda ctx: None if vm.state['template'] else vm.state['pool'].ref),
+            layoutEx=Computed(lambda ctx: data(vim.vm.FileLayoutEx, timestamp=_now())),
+            guestHeartbeatStatus=Computed(lambda ctx: 'green' if self.tools_running(vm) else 'gray'),
+            customValue=vim.CustomFieldsManager.Value.Array(), availableField=vim.CustomFieldsManager.FieldDef.Array(),
+            overallStatus='green', configStatus='green')
+        if pool is not None:
+            pool.props['vm'].append(vm.ref)
+        if host is not None:
+            host.props['vm'].append(vm.ref)
+        if datastore is not None:
+            datastore.props['vm'].append(vm.ref)
+            datastore.state['used'] += self.disk_bytes(vm)
+        return vm
+
+    def default_devices(self, name, datastore):
+        datastore_name = datastore.props['name'] if datastore else 'datastore'
+        controller = data(vim.vm.device.ParaVirtualSCSIController, key=1000, busNumber=0, sharedBus='noSharing',
+                          device=[2000], unitNumber=3, controllerKey=100)
+        disk = data(vim.vm.device.VirtualDisk, key=2000, controllerKey=1000, unitNumber=0,
+                    capacityInKB=self.options.template_disk_gb * 1024 * 1024,
+                    capacityInBytes=self.options.template_disk_gb * GB,
+                    backing=data(vim.vm.device.VirtualDisk.FlatVer2BackingInfo,
+                                 fileName='[%s] %s/%s.vmdk' % (datastore_name, name, name), diskMode='persistent',
+                                 thinProvisioned=True, datastore=datastore.ref if datastore else None))
+        nic = data(vim.vm.device.VirtualVmxnet3, key=4000, controllerKey=100, unitNumber=7,
+                   macAddress=self.mac_address(), addressType='assigned',
+                   backing=data(vim.vm.device.VirtualEthernetCard.NetworkBackingInfo, deviceName=''),
+                   connectable=data(vim.vm.device.VirtualDevice.ConnectInfo, startConnected=True, connected=False,
+                                    allowGuestControl=True))
+        return [data(vim.vm.device.VirtualPCIController, key=100, busNumber=0), controller, disk, nic]
+
+    def mac_address(self):
+        return '00:50:56:%02x:%02x:%02x' % tuple(self.rng.randrange(256) for _ in range(3))
+
+    def disk_bytes(self, vm):
+        return sum(device.capacityInKB * 1024 for device in vm.state['devices']
+                   if isinstance(device, vim.vm.device.VirtualDisk))
+
+    def vm_networks(self, vm):
+        networks = []
+        for device in vm.state['devices']:
+            backing = getattr(device, 'backing', None)
+            if isinstance(backing, vim.vm.device.VirtualEthernetCard.NetworkBackingInfo) and backing.network:
+                networks.append(backing.network)
+            elif isinstance(backing, vim.vm.device.VirtualEthernetCard.DistributedVirtualPortBackingInfo):
+                network = self.objects.get(backing.port.portgroupKey)
+                if network is not None:
+                    networks.append(network.ref)
+        return networks
+
+    def power_on(self, vm):
+        vm.state.update(power='poweredOn', powered_on_at=time.time(), ip_address=None,
+                        boot_delay=self.rng.uniform(0, self.options.boot_spread_seconds))
+
+    def booted_for(self, vm):
+        """Seconds the guest has been booting past its random delay, None while powered off"""
+        started = vm.state['powered_on_at']
+        if started is None:
+            return None
+        return time.time() - started - vm.state.get('boot_delay', 0.0)
+
+    def tools_running(self, vm):
+        booted = self.booted_for(vm)
+        return booted is not None and booted >= self.options.tools_seconds
+
+    def guest_ip(self, vm):
+        booted = self.booted_for(vm)
+        if booted is None or booted < self.options.guest_ip_seconds:
+            return None
+        if vm.state['ip_address'] is None:
+            self.ip_sequence += 1
+            vm.state['ip_address'] = '10.%d.%d.%d' % (self.options.seed % 200, self.ip_sequence // 250,
+                                                      self.ip_sequence % 250 + 2)
+        return vm.state['ip_address']
+
+    def vm_config(self, vm):
+        state = vm.state
+        datastore_name = state['datastore'].props['name'] if state['datastore'] else 'datastore'
+        name = vm.props['name']
+        return data(vim.vm.ConfigInfo, name=name, guestFullName=state['guest_id'], guestId=state['guest_id'],
+                    version='vmx-19', uuid=state['uuid'], instanceUuid=state['instance_uuid'],
+                    template=state['template'], annotation=state['annotation'],
+                    changeVersion=str(state['change_version']), modified=_now(),
+                    files=data(vim.vm.FileInfo, vmPathName='[%s] %s/%s.vmx' % (datastore_name, name, name)),
+                    hardware=data(vim.vm.VirtualHardware, numCPU=state['cpu'], numCoresPerSocket=1,
+                                  memoryMB=state['memory_mb'],
+                                  device=vim.vm.device.VirtualDevice.Array(copy.deepcopy(state['devices']))))
+
+    def vm_runtime(self, vm):
+        state = vm.state
+        return data(vim.vm.RuntimeInfo, host=state['host'].ref if state['host'] else None, powerState=state['power'],
+                    connectionState='connected',
+                    bootTime=datetime.datetime.fromtimestamp(state['powered_on_at'], datetime.timezone.utc)
+                    if state['powered_on_at'] else None)
+
+    def vm_guest(self, vm):
+        running = self.tools_running(vm)
+        ip_address = self.guest_ip(vm)
+        nets = []
+        for device in vm.state['devices']:
+            if isinstance(device, vim.vm.device.VirtualEthernetCard):
+                nets.append(data(vim.vm.GuestInfo.NicInfo, macAddress=device.macAddress, connected=running,
+                                 deviceConfigId=device.key,
+                                 ipAddress=StringArray([ip_address] if ip_address and not nets else [])))
+        return data(vim.vm.GuestInfo, toolsStatus='toolsOk' if running else 'toolsNotRunning',
+                    toolsRunningStatus='guestToolsRunning' if running else 'guestToolsNotRunning',
+                    toolsVersionStatus2='guestToolsCurrent', guestState='running' if running else 'notRunning',
+                    guestId=vm.state['guest_id'], hostName=vm.props['name'] if running else None,
+                    ipAddress=ip_address, net=vim.vm.GuestInfo.NicInfo.Array(nets))
+
+    def vm_summary(self, vm):
+        state = vm.state
+        running = self.tools_running(vm)
+        devices = state['devices']
+        return data(vim.vm.Summary, vm=vm.ref, runtime=self.vm_runtime(vm), overallStatus='green',
+                    guest=data(vim.vm.Summary.GuestSummary, guestId=state['guest_id'], ipAddress=self.guest_ip(vm),
+                               toolsRunningStatus='guestToolsRunning' if running else 'guestToolsNotRunning',
+                               hostName=vm.props['name'] if running else None),
+                    config=data(vim.vm.Summary.ConfigSummary, name=vm.props['name'], template=state['template'],
+                                vmPathName=self.vm_config(vm).files.vmPathName, memorySizeMB=state['memory_mb'],
+                                numCpu=state['cpu'],
+                                numEthernetCards=sum(isinstance(device, vim.vm.device.VirtualEthernetCard)
+                                                     for device in devices),
+                                numVirtualDisks=sum(isinstance(device, vim.vm.device.VirtualDisk)
+                                                    for device in devices),
+                                uuid=state['uuid'], instanceUuid=state['instance_uuid'], guestId=state['guest_id'],
+                                guestFullName=state['guest_id'], annotation=state['annotation']),
+                    storage=data(vim.vm.Summary.StorageSummary, committed=self.disk_bytes(vm), uncommitted=0,
+                                 unshared=self.disk_bytes(vm), timestamp=_now()),
+                    quickStats=data(vim.vm.Summary.QuickStats, guestHeartbeatStatus='green'))
+
+    def apply_config(self, vm, spec):
+        """Apply the parts of a ConfigSpec the mock models"""
+        state = vm.state
+        if spec.numCPUs:
+            state['cpu'] = spec.numCPUs
+        if spec.memoryMB:
+            state['memory_mb'] = spec.memoryMB
+        if spec.annotation is not None:
+            state['annotation'] = spec.annotation
+        devices = state['devices']
+        used_before = self.disk_bytes(vm)
+        next_key = max([device.key for device in devices] + [0]) + 1
+        for change in spec.deviceChange or []:
+            device = copy.deepcopy(change.device)
+            if change.operation == 'add':
+                if device.key is None or device.key < 0 or any(existing.key == device.key for existing in devices):
+                    old_key = device.key
+                    device.key, next_key = next_key, next_key + 1
+                    for other in spec.deviceChange:
+                        if other.device.controllerKey == old_key and old_key is not None:
+                            other.device.controllerKey = device.key
+                if isinstance(device, vim.vm.device.VirtualDisk):
+                    self.place_disk(vm, device, change.fileOperation)
+                if isinstance(device, vim.vm.device.VirtualEthernetCard) and not device.macAddress:
+                    device.macAddress = self.mac_address()
+                devices.append(device)
+            elif change.operation == 'edit':
+                for index, existing in enumerate(devices):
+                    if existing.key == device.key:
+                        if isinstance(device, vim.vm.device.VirtualDisk) and device.capacityInKB:
+                            device.capacityInBytes = device.capacityInKB * 1024
+                        devices[index] = complete(device)
+                        break
+                else:
+                    raise fault(vim.fault.InvalidDeviceSpec, "Device %s not found" % device.key, deviceIndex=0)
+            elif change.operation == 'remove':
+                state['devices'] = devices = [existing for existing in devices if existing.key != device.key]
+        for device in devices:
+            if isinstance(device, vim.vm.device.VirtualSCSIController):
+                device.device = [other.key for other in devices
+                                 if getattr(other, 'controllerKey', None) == device.key]
+        if state['datastore'] is not None:
+            state['datastore'].state['used'] += self.disk_bytes(vm) - used_before
+        state['change_version'] += 1
+
+    def place_disk(self, vm, device, file_operation):
+        backing = device.backing
+        if backing is None:
+            backing = device.backing = data(vim.vm.device.VirtualDisk.FlatVer2BackingInfo, diskMode='persistent')
+        datastore = self.entity(getattr(backing, 'datastore', None)) or vm.state['datastore']
+        if file_operation == 'create' or not backing.fileName or backing.fileName.endswith('] '):
+            count = sum(1 for device in vm.state['devices'] if isinstance(device, vim.vm.device.VirtualDisk))
+            backing.fileName = '[%s] %s/%s_%d.vmdk' % (datastore.props['name'] if datastore else 'datastore',
+                                                      vm.props['name'], vm.props['name'], count)
+        if datastore is not None:
+            backing.datastore = datastore.ref
+        if device.capacityInKB is None and device.capacityInBytes:
+            device.capacityInKB = device.capacityInBytes // 1024
+        device.capacityInBytes = (device.capacityInKB or 0) * 1024
+        complete(device)
+
+    def destroy(self, entity):
+        for ref_list_owner in list(self.objects.values()):
+            for key in ('childEntity', 'vm'):
+                values = ref_list_owner.props.get(key)
+                if isinstance(values, list) and entity.ref in values:
+                    values.remove(entity.ref)
+        if isinstance(entity.ref, vim.VirtualMachine) and entity.state.get('datastore') is not None:
+            entity.state['datastore'].state['used'] -= self.disk_bytes(entity)
+        del self.objects[entity.moid]
+
+    # Tasks
+
+    def start_task(self, method, entity, apply):
+        """Create a task that runs apply() once --task-seconds have passed"""
+        task = self.add('Task', 'task')
+        now = time.time()
+        duration = self.options.task_durations.get(method, self.options.task_seconds)
+        task.state.update(method=method, entity=entity, queued=now, due=now + duration, state='running',
+                          result=None, error=None)
+        task.props['info'] = Computed(lambda ctx: self.task_info(task))
+        self.stats['tasks'][method] = self.stats['tasks'].get(method, 0) + 1
+        self.pending.append((task, apply))
+        if duration <= 0:
+            self.advance()
+        return task.ref
+
+    def advance(self):
+        """Complete every task that is due"""
+        now = time.time()
+        remaining = []
+        for task, apply in self.pending:
+            if task.state['due'] > now:
+                remaining.append((task, apply))
+                continue
+            rate = self.options.task_failures.get(task.state['method'], 0.0)
+            try:
+                if rate and self.rng.random() < rate:
+                    self.stats['injected_task_failures'] += 1
+                    raise fault(vmodl.fault.SystemError, "Injected task failure", reason='Injected by mock_vcenter')
+                task.state.update(state='success', result=apply())
+            except vmodl.MethodFault as e:
+                task.state.update(state='error', error=e)
+        self.pending = remaining
+
+    def task_info(self, task):
+        state = task.state
+        entity = state['entity']
+        error = None
+        if state['error'] is not None:
+            error = data(vmodl.LocalizedMethodFault, fault=state['error'], localizedMessage=state['error'].msg)
+        return data(vim.TaskInfo, key=task.moid, task=task.ref, descriptionId='%s.%s' % (
+            type(entity.ref).__name__.split('.')[-1], state['method']),
+            entity=entity.ref if entity else None, entityName=entity.props.get('name') if entity else None,
+            state=state['state'], cancelled=False, cancelable=False, result=state['result'], error=error,
+            queueTime=datetime.datetime.fromtimestamp(state['queued'], datetime.timezone.utc),
+            startTime=datetime.datetime.fromtimestamp(state['queued'], datetime.timezone.utc),
+            completeTime=None if state['state'] == 'running' else _now(), eventChainId=0,
+            reason=data(vim.TaskReasonUser, userName='mock'))
+
+    # Property collector
+
+    def read(self, entity, path, ctx):
+        head, _sep, rest = path.partition('.')
+        if head not in entity.props:
+            return None
+        value = entity.props[head]
+        if isinstance(value, Computed):
+            value = value.func(ctx)
+        for part in rest.split('.') if rest else ():
+            if value is None:
+                return None
+            value = getattr(value, part, None)
+        return value
+
+    def children(self, entity):
+        props = entity.props
+        if isinstance(entity.ref, vim.Datacenter):
+            return [props[key] for key in ('vmFolder', 'hostFolder', 'datastoreFolder', 'networkFolder')]
+        if isinstance(entity.ref, vim.ComputeResource):
+            return list(props.get('host') or []) + [props['resourcePool']]
+        if isinstance(entity.ref, vim.ResourcePool):
+            return list(props.get('resourcePool') or []) + list(props.get('vm') or [])
+        return list(props.get('childEntity') or [])
+
+    def view_members(self, container, types, recursive):
+        members = {}
+        stack = list(reversed(self.children(container)))
+        while stack:
+            child = self.entity(stack.pop())
+            if child is None or child.moid in members:
+                continue
+            members[child.moid] = child.ref if not types or any(isinstance(child.ref, kind) for kind in types) else None
+            if recursive:
+                stack.extend(reversed(self.children(child)))
+        return [ref for ref in members.values() if ref is not None]
+
+    def select(self, filter_spec, ctx):
+        """Objects selected by a filter spec, in traversal order"""
+        named = {}
+
+        def collect(specs):
+            for spec in specs or []:
+                if isinstance(spec, PC.TraversalSpec):
+                    if spec.name:
+                        named[spec.name] = spec
+                    collect(spec.selectSet)
+
+        for object_spec in filter_spec.objectSet:
+            collect(object_spec.selectSet)
+
+        selected = {}
+        seen = set()
+
+        def traverse(entity, specs):
+            for spec in specs or []:
+                if not isinstance(spec, PC.TraversalSpec):
+                    spec = named.get(spec.name)
+                    if spec is None:
+                        continue
+                if not isinstance(entity.ref, spec.type):
+                    continue
+                key = (entity.moid, spec.name or id(spec))
+                if key in seen:
+                    continue
+                seen.add(key)
+                targets = self.read(entity, spec.path, ctx)
+                if targets is None:
+                    continue
+                for target_ref in targets if isinstance(targets, list) else [targets]:
+                    target = self.entity(target_ref)
+                    if target is None:
+                        continue
+                    if not spec.skip:
+                        selected.setdefault(target.moid, target)
+                    traverse(target, spec.selectSet)
+
+        for object_spec in filter_spec.objectSet:
+            start = self.entity(object_spec.obj)
+            if start is None:
+                raise fault(vmodl.fault.ManagedObjectNotFound, "The object '%s' has already been deleted" % (
+                    object_spec.obj._moId), obj=object_spec.obj)
+            if not object_spec.skip:
+                selected.setdefault(start.moid, start)
+            traverse(start, object_spec.selectSet)
+        return list(selected.values())
+
+    def retrieve(self, spec_set, ctx):
+        contents = []
+        for filter_spec in spec_set:
+            for entity in self.select(filter_spec, ctx):
+                paths = []
+                matched = False
+                for prop_spec in filter_spec.propSet:
+                    if isinstance(entity.ref, prop_spec.type):
+                        matched = True
+                        paths.extend(sorted(entity.props) if prop_spec.all else prop_spec.pathSet or [])
+                if not matched:
+                    continue
+                props = []
+                for path in dict.fromkeys(paths):
+                    value = self.read(entity, path, ctx)
+                    if value is None or (isinstance(value, list) and not isinstance(value, VmomiSupport.Array)):
+                        continue
+                    props.append(vmodl.DynamicProperty(name=path, val=value))
+                contents.append(PC.ObjectContent(obj=entity.ref, propSet=props))
+        return contents
+
+    def page(self, contents, max_objects):
+        size = max_objects or self.options.page_size
+        if len(contents) <= size:
+            return PC.RetrieveResult(objects=contents)
+        token = uuid.uuid4().hex
+        self.retrievals[token] = contents[size:]
+        return PC.RetrieveResult(objects=contents[:size], token=token)
+
+    # SOAP methods; each takes (ctx, this, args) and returns the result value
+
+    def m_Fetch(self, ctx, this, args):
+        return self.read(this, args['prop'], ctx)
+
+    def m_RetrieveServiceContent(self, ctx, this, args):
+        return self.content
+
+    def m_Login(self, ctx, this, args):
+        options = self.options
+        if (options.username and args.get('userName') != options.username) or \
+                (options.password and args.get('password') != options.password):
+            raise fault(vim.fault.InvalidLogin, "Cannot complete login due to an incorrect user name or password.")
+        now = _now()
+        session = data(vim.UserSession, key=ctx.session_id, userName=args.get('userName'),
+                       fullName=args.get('userName'),
+                       loginTime=now, lastActiveTime=now, locale='en', messageLocale='en', ipAddress='127.0.0.1',
+                       userAgent='pyvmomi', callCount=0)
+        self.sessions[ctx.session_id] = session
+        ctx.session = session
+        self.stats['logins'] += 1
+        user = args.get('userName') or ''
+        self.stats['logins_by_user'][user] = self.stats['logins_by_user'].get(user, 0) + 1
+        return session
+
+    def m_Logout(self, ctx, this, args):
+        self.sessions.pop(ctx.session_id, None)
+        self.stats['logouts'] += 1
+
+    def m_SessionIsActive(self, ctx, this, args):
+        return args.get('sessionID') in self.sessions
+
+    def m_CurrentTime(self, ctx, this, args):
+        return _now()
+
+    def m_CreateContainerView(self, ctx, this, args):
+        container = self.entity(args['container'])
+        types = tuple(args.get('type') or ())
+        recursive = bool(args.get('recursive'))
+        view = self.add('ContainerView', 'session[%s]' % ctx.session_id[:8])
+        view.props.update(container=container.ref, type=StringArray([kind._wsdlName for kind in types]),
+                          recursive=recursive,
+                          view=Computed(lambda ctx: refs(self.view_members(container, types, recursive))))
+        return view.ref
+
+    def m_DestroyView(self, ctx, this, args):
+        self.destroy(this)
+
+    def m_RetrievePropertiesEx(self, ctx, this, args):
+        options = args.get('options')
+        return self.page(self.retrieve(args['specSet'], ctx), options.maxObjects if options else None)
+
+    def m_ContinueRetrievePropertiesEx(self, ctx, this, args):
+        contents = self.retrievals.pop(args['token'], None)
+        if contents is None:
+            raise fault(vmodl.fault.InvalidArgument, "Unknown token", invalidProperty='token')
+        return self.page(contents, None)
+
+    def m_CancelRetrievePropertiesEx(self, ctx, this, args):
+        self.retrievals.pop(args['token'], None)
+
+    def m_RetrieveProperties(self, ctx, this, args):
+        return PC.ObjectContent.Array(self.retrieve(args['specSet'], ctx))
+
+    def m_CreatePropertyCollector(self, ctx, this, args):
+        collector = self.add('PropertyCollector', 'session[%s]' % ctx.session_id[:8])
+        collector.state.update(filters=[], version=0)
+        return collector.ref
+
+    def m_DestroyPropertyCollector(self, ctx, this, args):
+        for filter_ref in list(this.state.get('filters', [])):
+            self.destroy(self.objects[filter_ref._moId])
+        self.destroy(this)
+
+    def m_CreateFilter(self, ctx, this, args):
+        property_filter = self.add('PropertyFilter', 'session[%s]' % ctx.session_id[:8],
+                                   spec=args['spec'], partialUpdates=bool(args.get('partialUpdates')))
+        property_filter.state.update(collector=this, reported={}, refs={})
+        this.state.setdefault('filters', []).append(property_filter.ref)
+        return property_filter.ref
+
+    def m_DestroyPropertyFilter(self, ctx, this, args):
+        collector = this.state['collector']
+        if this.ref in collector.state.get('filters', []):
+            collector.state['filters'].remove(this.ref)
+        self.destroy(this)
+
+    def filter_updates(self, property_filter, ctx):
+        """Object updates of a filter since its last report; records the new values as reported"""
+        reported = property_filter.state['reported']
+        current = {}
+        updates = []
+        spec = property_filter.props['spec']
+        # Objects deleted since the filter was created leave it instead of failing the wait
+        live = PC.FilterSpec(objectSet=[object_spec for object_spec in spec.objectSet if self.entity(object_spec.obj)],
+                             propSet=spec.propSet)
+        for content in self.retrieve([live], ctx):
+            values = {prop.name: prop.val for prop in content.propSet}
+            current[content.obj._moId] = {name: repr(value) for name, value in values.items()}
+            property_filter.state['refs'][content.obj._moId] = content.obj
+            previous = reported.get(content.obj._moId)
+            if previous is None:
+                changes = [data(PC.Change, name=name, op='assign', val=value) for name, value in values.items()]
+                updates.append(complete(PC.ObjectUpdate(kind='enter', obj=content.obj,
+                                                    changeSet=PC.Change.Array(changes))))
+                continue
+            changes = [data(PC.Change, name=name, op='assign', val=value) for name, value in values.items()
+                       if previous.get(name) != current[content.obj._moId][name]]
+            changes.extend(data(PC.Change, name=name, op='remove') for name in previous if name not in values)
+            if changes:
+                updates.append(complete(PC.ObjectUpdate(kind='modify', obj=content.obj,
+                                                    changeSet=PC.Change.Array(changes))))
+        for moid in reported:
+            if moid not in current:
+                updates.append(complete(PC.ObjectUpdate(kind='leave', obj=property_filter.state['refs'].pop(moid))))
+        property_filter.state['reported'] = current
+        return updates
+
+    def m_WaitForUpdatesEx(self, ctx, this, args):
+        """Long poll: changes of the collector's filters, or None once maxWaitSeconds pass without any"""
+        options = args.get('options')
+        max_wait = options.maxWaitSeconds if options is not None else None
+        deadline = None if max_wait is None else time.time() + max_wait
+        while True:
+            self.advance()
+            filter_updates = []
+            for filter_ref in this.state.get('filters', []):
+                property_filter = self.objects.get(filter_ref._moId)
+                updates = self.filter_updates(property_filter, ctx) if property_filter is not None else []
+                if updates:
+                    filter_updates.append(data(PC.FilterUpdate, filter=filter_ref,
+                                               objectSet=PC.ObjectUpdate.Array(updates)))
+            if filter_updates:
+                this.state['version'] = this.state.get('version', 0) + 1
+                return data(PC.UpdateSet, version=str(this.state['version']),
+                            filterSet=PC.FilterUpdate.Array(filter_updates))
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            # Releases the mock lock so other sessions proceed while this one waits
+            self.updated.wait(UPDATE_POLL_SECONDS if remaining is None else min(UPDATE_POLL_SECONDS, remaining))
+
+    def _find_path(self, path):
+        entity = self.root
+        for part in [part for part in path.split('/') if part]:
+            entity = self._find_child(entity, part)
+            if entity is None:
+                return None
+        return entity
+
+    def _find_child(self, entity, name):
+        if isinstance(entity.ref, vim.Datacenter):
+            key = {'vm': 'vmFolder', 'host': 'hostFolder', 'datastore': 'datastoreFolder',
+                   'network': 'networkFolder'}.get(name)
+            return self.entity(entity.props[key]) if key else None
+        for ref in self.children(entity):
+            child = self.entity(ref)
+            if child is not None and child.props.get('name') == name:
+                return child
+        return None
+
+    def m_FindByInventoryPath(self, ctx, this, args):
+        found = self._find_path(args['inventoryPath'])
+        return found.ref if found else None
+
+    def m_FindChild(self, ctx, this, args):
+        found = self._find_child(self.entity(args['entity']), args['name'])
+        return found.ref if found else None
+
+    def _find_vms(self, match):
+        return [vm.ref for vm in self.vms() if match(vm)]
+
+    def m_FindByUuid(self, ctx, this, args):
+        key = 'instance_uuid' if args.get('instanceUuid') else 'uuid'
+        found = self._find_vms(lambda vm: vm.state[key] == args['uuid'])
+        return found[0] if found else None
+
+    def m_FindAllByUuid(self, ctx, this, args):
+        key = 'instance_uuid' if args.get('instanceUuid') else 'uuid'
+        return refs(self._find_vms(lambda vm: vm.state[key] == args['uuid']))
+
+    def m_FindByDnsName(self, ctx, this, args):
+        found = self._find_vms(lambda vm: self.tools_running(vm) and vm.props['name'] == args['dnsName'])
+        return found[0] if found else None
+
+    def m_FindByIp(self, ctx, this, args):
+        found = self._find_vms(lambda vm: self.guest_ip(vm) == args['ip'])
+        return found[0] if found else None
+
+    def m_CreateFolder(self, ctx, this, args):
+        return self.create_folder(this, args['name']).ref
+
+    def m_CloneVM_Task(self, ctx, this, args):
+        spec = args['spec']
+        folder = self.entity(args['folder'])
+        location = spec.location or vim.vm.RelocateSpec()
+        datastore = self.entity(location.datastore) or this.state['datastore']
+        pool = self.entity(location.pool) or self.root_pool
+        host = self.entity(location.host) or min(
+            self.hosts, key=lambda host: len(host.props['vm'])) if self.hosts else None
+
+        def clone():
+            if self._find_child(folder, args['name']) is not None:
+                raise fault(vim.fault.DuplicateName, "The name '%s' already exists." % args['name'],
+                            name=args['name'], object=folder.ref)
+            vm = self.create_vm(args['name'], folder, pool, host, datastore, template=bool(spec.template),
+                                source=this, config_spec=spec.config)
+            if spec.powerOn:
+                self.power_on(vm)
+            return vm.ref
+        return self.start_task('CloneVM_Task', this, clone)
+
+    def m_ReconfigVM_Task(self, ctx, this, args):
+        return self.start_task('ReconfigVM_Task', this, lambda: self.apply_config(this, args['spec']))
+
+    def _power(self, method, this, power):
+        def apply():
+            if this.state['template']:
+                raise fault(vim.fault.InvalidState, "Templates cannot be powered on")
+            if this.state['power'] == power:
+                raise fault(vim.fault.InvalidPowerState,
+                            "The attempted operation cannot be performed in the current state (%s)." % power,
+                            requestedState=power, existingState=power)
+            if power == 'poweredOn':
+                self.power_on(this)
+            else:
+                this.state.update(power=power, powered_on_at=None, ip_address=None)
+        return self.start_task(method, this, apply)
+
+    def m_PowerOnVM_Task(self, ctx, this, args):
+        return self._power('PowerOnVM_Task', this, 'poweredOn')
+
+    def m_PowerOffVM_Task(self, ctx, this, args):
+        return self._power('PowerOffVM_Task', this, 'poweredOff')
+
+    def m_ShutdownGuest(self, ctx, this, args):
+        this.state.update(power='poweredOff', powered_on_at=None, ip_address=None)
+
+    def m_Destroy_Task(self, ctx, this, args):
+        def apply():
+            if isinstance(this.ref, vim.VirtualMachine) and this.state['power'] == 'poweredOn':
+                raise fault(vim.fault.InvalidPowerState, "The VM must be powered off", requestedState='poweredOff',
+                            existingState='poweredOn')
+            self.destroy(this)
+        return self.start_task('Destroy_Task', this, apply)
+
+    def m_AddPortGroup(self, ctx, this, args):
+        host = this.state['host']
+        spec = args['portgrp']
+        if spec.name in host.state['portgroups']:
+            raise fault(vim.fault.AlreadyExists, "Port group %s exists" % spec.name, name=spec.name)
+        host.state['portgroups'][spec.name] = complete(copy.deepcopy(spec))
+        if spec.name not in self.networks:
+            network = self.add('Network', 'network', parent=self.entity(self.datacenter.props['networkFolder']),
+                               name=spec.name, host=refs([]), vm=refs([]))
+            self.networks[spec.name] = network
+            for entity in (self.datacenter, self.cluster):
+                entity.props['network'].append(network.ref)
+        network = self.networks[spec.name]
+        if host.ref not in network.props['host']:
+            network.props['host'].append(host.ref)
+            host.props['network'].append(network.ref)
+
+    def m_UpdatePortGroup(self, ctx, this, args):
+        host = this.state['host']
+        if args['pgName'] not in host.state['portgroups']:
+            raise fault(vim.fault.NotFound, "Port group %s not found" % args['pgName'])
+        spec = complete(copy.deepcopy(args['portgrp']))
+        del host.state['portgroups'][args['pgName']]
+        host.state['portgroups'][spec.name] = spec
+
+    def m_AddDVPortgroup_Task(self, ctx, this, args):
+        def apply():
+            for spec in args['spec']:
+                network = self.add_network(spec.name, 'distributed')
+                network.state.update(num_ports=spec.numPorts or 8, port_config=spec.defaultPortConfig)
+        return self.start_task('AddDVPortgroup_Task', this, apply)
+
+    def m_ReconfigureDVPortgroup_Task(self, ctx, this, args):
+        spec = args['spec']
+
+        def apply():
+            if spec.configVersion and spec.configVersion != str(this.state['version']):
+                raise fault(vim.fault.ConcurrentAccess, "Cannot complete operation due to concurrent modification")
+            if spec.numPorts:
+                this.state['num_ports'] = spec.numPorts
+            if spec.defaultPortConfig is not None:
+                this.state['port_config'] = complete(copy.deepcopy(spec.defaultPortConfig))
+            this.state['version'] += 1
+        return self.start_task('ReconfigureDVPortgroup_Task', this, apply)
+
+    # Dispatch
+
+    def method_info(self, method):
+        if method not in self.method_cache:
+            try:
+                self.method_cache[method] = VmomiSupport.GetWsdlMethod(VIM_NS, method).info
+            except (KeyError, AttributeError):
+                self.method_cache[method] = None
+        return self.method_cache[method]
+
+    def fetch_info(self, this_ref, call):
+        """Call info of Fetch, the accessor pyVmomi uses to read a single property"""
+        entity = self.objects.get(this_ref)
+        prop = call.findtext('{%s}prop' % VIM_NS)
+        if entity is None or not prop:
+            return None
+        try:
+            prop_info = type(entity.ref)._GetPropertyInfo(prop)
+        except AttributeError:
+            return None
+        result = prop_info.type
+        if issubclass(result, list) and issubclass(result.Item, VmomiSupport.ManagedObject):
+            result = ManagedObjectArray
+        return VmomiSupport.Object(name='Fetch', wsdlName='Fetch', result=result, resultFlags=prop_info.flags,
+                                   params=(VmomiSupport.Object(name='prop', type=str, version=API_VERSION, flags=0),))
+
+    def call(self, method, this_ref, args, ctx):
+        with self.lock:
+            self.advance()
+            this = self.objects.get(this_ref)
+            if this is None:
+                raise fault(vmodl.fault.ManagedObjectNotFound, "The object '%s' has already been deleted or has not "
+                            "been completely created" % this_ref)
+            if method != 'RetrieveServiceContent' and method != 'Login' and ctx.session is None:
+                raise fault(vim.fault.NotAuthenticated, "The session is not authenticated.", privilegeId='System.View')
+            handler = getattr(self, 'm_' + method, None)
+            if handler is None:
+                self.stats['unsupported'][method] = self.stats['unsupported'].get(method, 0) + 1
+                raise fault(vmodl.fault.NotSupported, "%s is not supported by mock_vcenter" % method)
+            return handler(ctx, this, args)
+
+    def injected_failure(self, method):
+        failures = self.options.failures
+        rate = failures.get(method)
+        if rate is None and method not in HANDSHAKE_METHODS:
+            rate = failures.get('*', 0.0)
+        if rate and self.rng.random() < rate:
+            self.stats['injected_failures'] += 1
+            return fault(vmodl.fault.SystemError, "Injected failure", reason='Injected by mock_vcenter')
+        return None
+
+    def latency(self, method):
+        options = self.options
+        delay = options.method_latency.get(method, options.latency_ms)
+        if options.jitter_ms:
+            delay += self.rng.uniform(0, options.jitter_ms)
+        return delay / 1000.0
+
+    def reset_stats(self):
+        self.stats = {'requests': 0, 'methods': {}, 'faults': 0, 'injected_failures': 0,
+                      'injected_task_failures': 0, 'logins': 0, 'logouts': 0, 'logins_by_user': {},
+                      'tasks': {}, 'unsupported': {}, 'started_at': time.time()}
+
+    def snapshot(self):
+        with self.lock:
+            stats = copy.deepcopy(self.stats)
+            stats.update(sessions_open=len(self.sessions),
+                         vms=len([vm for vm in self.vms() if not vm.state['template']]),
+                         uptime_seconds=round(time.time() - stats.pop('started_at'), 3))
+        return stats
+
+
+def fault(kind, msg, **fields):
+    error = kind(msg=msg, **fields)
+    return complete(error)
+
+
+def datastore_names(datastores):
+    """Datastore names of the environment C(datastores) tier dict"""
+    names = []
+    for definition in (datastores or {}).values():
+        for entry in definition if isinstance(definition, list) else [definition]:
+            name = entry.get('name') if isinstance(entry, dict) else entry
+            if isinstance(name, str) and name and name not in names:
+                names.append(name)
+    return names
+
+
+def load_environment(base_dir, env, location, vm_os='rhel9'):
+    """Project variables of one environment with every resolvable expression resolved"""
+    variables = compile_combination(base_dir, env, location, vm_os, Resolver(), {}, runtime=())
+    templates = []
+    for name, template in sorted((variables.get('templates') or {}).items()):
+        if isinstance(template, dict) and template.get('template_name'):
+            templates.append((template['template_name'], template.get('guest_id') or 'otherGuest64'))
+    return variables, templates
+
+
+class SoapHandler(BaseHTTPRequestHandler):
+    """vSphere SOAP endpoint at /sdk plus the /_stats and /_stats/reset control endpoints"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'mock_vcenter/2.0'
+
+    def log_message(self, format, *args):
+        if self.server.mock.options.verbose:
+            sys.stderr.write("%s - %s\n" % (self.address_string(), format % args))
+
+    def _send(self, status, body, content_type='text/xml; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path.startswith('/_stats'):
+            self._send(200, json.dumps(mock.snapshot(), sort_keys=True).encode(), 'application/json')
+        elif self.path.endswith('/vimServiceVersions.xml'):
+            body = ('<?xml version="1.0" encoding="UTF-8" ?><namespaces version="1.0"><namespace>'
+                    '<name>urn:vim25</name><version>%s</version></namespace></namespaces>'
+                    % SoapAdapter.versionIdMap[API_VERSION]).encode()
+            self._send(200, body)
+        else:
+            self._send(404, b'')
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = self.rfile.read(length)
+        if self.path.startswith('/_stats/reset'):
+            with mock.lock:
+                mock.reset_stats()
+            self._send(200, b'{"reset": true}', 'application/json')
+            return
+        if not self.path.startswith('/sdk'):
+            self._send(404, b'')
+            return
+
+        started = time.time()
+        try:
+            call = ET.fromstring(payload).find(SOAP_BODY)[0]
+        except (ET.ParseError, TypeError, IndexError):
+            self._send(400, b'')
+            return
+        method = call.tag.split('}', 1)[-1]
+        this = call.find('{%s}_this' % VIM_NS)
+        this_ref = this.text if this is not None else None
+
+        session_id = self._session_id()
+        headers = {}
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+            headers['Set-Cookie'] = '%s="%s"; Path=/; HttpOnly; Secure' % (SESSION_COOKIE, session_id)
+        ctx = RequestContext(session_id, mock.sessions.get(session_id))
+
+        time.sleep(mock.latency(method))
+        info = mock.fetch_info(this_ref, call) if method == 'Fetch' else mock.method_info(method)
+        status = 'ok'
+        try:
+            if info is None:
+                raise fault(vmodl.fault.MethodNotFound, "Unknown method %s" % method, method=method,
+                            receiver=ManagedObject(this_ref or 'ServiceInstance'))
+            error = mock.injected_failure(method)
+            if error is not None:
+                status = 'injected'
+                raise error
+            result = mock.call(method, this_ref, self._arguments(call, info), ctx)
+            body = self._response(info, result)
+            code = 200
+        except vmodl.MethodFault as e:
+            if status == 'ok':
+                status = 'unsupported' if isinstance(e, vmodl.fault.NotSupported) else 'fault'
+            body = self._fault(e)
+            code = 500
+        except Exception as e:
+            # A mock bug must not look like a dropped connection to the client
+            traceback.print_exc()
+            status = 'error'
+            body = self._fault(fault(vmodl.RuntimeFault, "mock_vcenter error: %s" % e))
+            code = 500
+
+        user = ctx.session.userName if ctx.session is not None else None
+        with mock.lock:
+            stats = mock.stats
+            stats['requests'] += 1
+            stats['methods'][method] = stats['methods'].get(method, 0) + 1
+            if code != 200:
+                stats['faults'] += 1
+            if mock.log is not None:
+                mock.log.write(json.dumps({'time': round(started, 6), 'method': method, 'object': this_ref,
+                                           'session': session_id[:12], 'user': user, 'status': status,
+                                           'duration': round(time.time() - started, 6)}) + '\n')
+                mock.log.flush()
+        self._send(code, body, headers=headers)
+
+    def _session_id(self):
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            name, _sep, value = part.strip().partition('=')
+            if name == SESSION_COOKIE:
+                return value.strip('"')
+        return None
+
+    @staticmethod
+    def _arguments(call, info):
+        args = {}
+        for param in info.params:
+            elements = call.findall('{%s}%s' % (VIM_NS, param.name))
+            if not elements:
+                continue
+            if issubclass(param.type, list):
+                args[param.name] = [SoapAdapter.Deserialize(ET.tostring(element), param.type.Item)
+                                    for element in elements]
+            else:
+                args[param.name] = SoapAdapter.Deserialize(ET.tostring(elements[0]), param.type)
+        return args
+
+    @staticmethod
+    def _namespaces():
+        namespaces = SoapAdapter.SOAP_NSMAP.copy()
+        namespaces[VIM_NS] = ''
+        return namespaces
+
+    def _response(self, info, result):
+        body = ''
+        if result is not None:
+            body = SoapAdapter.SerializeToStr(
+                result, VmomiSupport.Object(name='returnval', type=info.result, version=API_VERSION,
+                                            flags=info.resultFlags), API_VERSION, self._namespaces())
+        return ''.join([SoapAdapter.XML_HEADER, SoapAdapter.SOAP_ENVELOPE_START, SoapAdapter.SOAP_BODY_START,
+                        '<%sResponse xmlns="%s">%s</%sResponse>' % (info.wsdlName, VIM_NS, body, info.wsdlName),
+                        SoapAdapter.SOAP_BODY_END, SoapAdapter.SOAP_ENVELOPE_END]).encode('utf-8')
+
+    def _fault(self, error):
+        detail = SoapAdapter.SerializeFaultDetail(
+            error, VmomiSupport.Object(name=error._wsdlName + 'Fault', type=type(error), version=API_VERSION, flags=0),
+            API_VERSION, self._namespaces())
+        return ''.join([SoapAdapter.XML_HEADER, SoapAdapter.SOAP_ENVELOPE_START, SoapAdapter.SOAP_BODY_START,
+                        '<soapenv:Fault><faultcode>ServerFaultCode</faultcode><faultstring>%s</faultstring>'
+                        '<detail xmlns="%s">%s</detail></soapenv:Fault>' % (
+                            SoapAdapter.XmlEscape(error.msg or ''), VIM_NS, detail),
+                        SoapAdapter.SOAP_BODY_END, SoapAdapter.SOAP_ENVELOPE_END]).encode('utf-8')
+
+
+def self_signed_context(directory):
+    """TLS context with a throwaway self-signed certificate (needs the openssl CLI)"""
+    cert = os.path.join(directory, 'mock_vcenter.crt')
+    key = os.path.join(directory, 'mock_vcenter.key')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '2', '-subj',
+                    '/CN=mock-vcenter.local', '-keyout', key, '-out', cert],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+def parse_rates(values, option):
+    """['Method=0.1', ...] -> {'Method': 0.1}"""
+    rates = {}
+    for value in values or []:
+        method, sep, number = value.partition('=')
+        try:
+            rates[method] = float(number)
+        except ValueError:
+            sep = None
+        if not sep or not method:
+            raise SystemExit("%s expects METHOD=NUMBER, got '%s'" % (option, value))
+    return rates
+
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Local vSphere SOAP stand-in for playbook measurements")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8989)
+    parser.add_argument('--no-tls', action='store_true', help="Serve plain HTTP instead of HTTPS")
+    parser.add_argument('--cert', default=None, help="TLS certificate (default: generated self-signed)")
+    parser.add_argument('--key', default=None, help="TLS key for --cert")
+    parser.add_argument('--base-dir', default=base_dir, help="Project directory holding vars/")
+    parser.add_argument('--env', default='dev', help="Environment whose vars/<env> define the inventory")
+    parser.add_argument('--location', default='dc1')
+    parser.add_argument('--hosts', type=int, default=4, help="ESXi hosts in the cluster")
+    parser.add_argument('--host-memory-gb', type=int, default=512)
+    parser.add_argument('--datastore-capacity-gb', type=int, default=8192)
+    parser.add_argument('--template-disk-gb', type=int, default=60)
+    parser.add_argument('--username', default=None, help="Accepted user (default: any)")
+    parser.add_argument('--password', default=None, help="Accepted password (default: any)")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Added to every request")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Random extra latency, 0..N ms")
+    parser.add_argument('--method-latency', action='append', default=None, metavar='METHOD=MS',
+                        help="Latency for one method instead of --latency-ms (repeatable)")
+    parser.add_argument('--task-seconds', type=float, default=1.0, help="Time until a task completes")
+    parser.add_argument('--task-duration', action='append', default=None, metavar='METHOD=SECONDS',
+                        help="Task duration for one method (repeatable)")
+    parser.add_argument('--fail', action='append', default=None, metavar='METHOD=RATE',
+                        help="Fault rate per method, '*' for every method except the session handshake (repeatable)")
+    parser.add_argument('--task-fail', action='append', default=None, metavar='METHOD=RATE',
+                        help="Rate at which tasks of a method end in error (repeatable)")
+    parser.add_argument('--tools-seconds', type=float, default=5.0, help="Power-on to VMware Tools running")
+    parser.add_argument('--guest-ip-seconds', type=float, default=8.0, help="Power-on to guest IP address")
+    parser.add_argument('--boot-spread-seconds', type=float, default=0.0,
+                        help="Random extra boot time per VM, 0..N seconds, before tools and IP appear")
+    parser.add_argument('--page-size', type=int, default=100, help="Objects per RetrievePropertiesEx page")
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--log-file', default=None, help="Append one JSON line per request")
+    parser.add_argument('--verbose', action='store_true')
+    options = parser.parse_args()
+    options.method_latency = parse_rates(options.method_latency, '--method-latency')
+    options.task_durations = parse_rates(options.task_duration, '--task-duration')
+    options.failures = parse_rates(options.fail, '--fail')
+    options.task_failures = parse_rates(options.task_fail, '--task-fail')
+
+    variables, templates = load_environment(options.base_dir, options.env, options.location)
+    mock = MockVCenter(options)
+    mock.build(variables, templates)
+    mock.log = open(options.log_file, 'a', encoding='utf-8') if options.log_file else None
+
+    server = ThreadingHTTPServer((options.host, options.port), SoapHandler)
+    server.daemon_threads = True
+    server.mock = mock
+    scheme = 'http'
+    if not options.no_tls:
+        with tempfile.TemporaryDirectory(prefix='mock_vcenter_') as tmp:
+            cert, key = (options.cert, options.key) if options.cert else self_signed_context(tmp)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+
+    print("mock_vcenter: %s://%s:%d/sdk  datacenter=%s cluster=%s hosts=%d datastores=%d networks=%d templates=%d" % (
+        scheme, options.host, server.server_address[1], variables['datacenter'], variables['cluster'],
+        len(mock.hosts), len(mock.datastores), len(mock.networks), len(templates)), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if mock.log is not None:
+            mock.log.close()
+
+
+if __name__ == '__main__':
+    main()